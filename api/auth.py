@@ -2,12 +2,20 @@ from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel
 from typing import Dict, Any, Optional
-from datetime import datetime, timedelta
-from jose import JWTError, jwt
-import os
+from datetime import datetime
+from jose import JWTError
+import asyncio
 from dotenv import load_dotenv
 
-from services.supabase_client import get_supabase_client
+from services.supabase_client import supabase_clients
+from services.repository import SupabaseRepository, repository, maybe_await
+from services.profile_cache import profile_cache
+from services.write_behind import write_behind
+from services.metrics import metrics
+from services.tokens import (
+    create_access_token, create_user_token, decode_access_token, claims_enabled,
+    issued_at, user_from_claims, token_revocations,
+)
 
 # Carregando variáveis de ambiente
 load_dotenv()
@@ -33,35 +41,46 @@ class Token(BaseModel):
     user: Dict[str, Any]
 
 # Funções de autenticação
-def create_access_token(data: dict):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60")))
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, os.getenv("SECRET_KEY"), algorithm=os.getenv("ALGORITHM", "HS256"))
-    return encoded_jwt
-
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Credenciais inválidas",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+async def authenticate_token(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Retorna o usuário do token, ou None se o token for inválido, revogado ou
+    de um usuário inexistente. Tokens com claims recentes dispensam o banco.
+    """
     try:
-        payload = jwt.decode(token, os.getenv("SECRET_KEY"), algorithms=[os.getenv("ALGORITHM", "HS256")])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
+        payload = decode_access_token(token)
     except JWTError:
-        raise credentials_exception
+        return None
+    user_id = payload.get("sub")
+    if user_id is None or token_revocations.is_revoked(user_id, issued_at(payload)):
+        return None
+    
+    user = user_from_claims(payload)
+    if user is not None:
+        metrics.increment("auth_user_lookups", source="claims")
+        return user
     
-    # Verificar se o usuário existe no Supabase
-    supabase = get_supabase_client()
-    user = supabase.table("profiles").select("*").eq("id", user_id).execute()
+    # Verificar se o usuário existe no Supabase (perfil em cache por alguns segundos)
+    metrics.increment("auth_user_lookups", source="database")
+    return await profile_cache.get(user_id, repository.get_profile)
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    user = await authenticate_token(token)
     
-    if not user.data or len(user.data) == 0:
-        raise credentials_exception
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Credenciais inválidas",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     
-    return user.data[0]
+    return user
+
+async def _issue_token(user_repository: SupabaseRepository, user: Dict[str, Any]) -> str:
+    """
+    Gera o token de login; no modo de claims, inclui o plano atual do usuário
+    """
+    subscription = await user_repository.get_subscription(user["id"]) if claims_enabled() else None
+    return create_user_token(user, subscription)
 
 # Rotas de autenticação
 @router.post("/signup", response_model=Token)
@@ -69,43 +88,50 @@ async def signup(user: UserCreate):
     """
     Registra um novo usuário no sistema
     """
-    supabase = get_supabase_client()
+    # Cliente isolado: a sessão do usuário não pode vazar para o cliente compartilhado
+    supabase = supabase_clients.async_auth_client()
+    # Consultas com a sessão do usuário recém-autenticado
+    user_repository = SupabaseRepository(lambda: supabase)
     
     try:
         # Registrar usuário no Supabase Auth
-        auth_response = supabase.auth.sign_up({
+        auth_response = await maybe_await(supabase.auth.sign_up({
             "email": user.email,
             "password": user.password
-        })
+        }))
         
         user_id = auth_response.user.id
         
         # O trigger do Supabase cria automaticamente o perfil do usuário e o registro de uso
         # Vamos esperar um pouco e então buscar o perfil criado
-        import time
-        time.sleep(1)  # Pequena pausa para garantir que o trigger tenha tempo de executar
+        await asyncio.sleep(1)  # Pequena pausa para garantir que o trigger tenha tempo de executar
         
         # Buscar perfil criado pelo trigger
-        profile = supabase.table("profiles").select("*").eq("id", user_id).execute()
+        profile = await user_repository.get_profile(user_id)
         
-        if profile.data and len(profile.data) > 0:
+        if profile:
             # Se o nome foi fornecido, atualizar o perfil
             if user.nome:
-                supabase.table("profiles").update({"nome": user.nome}).eq("id", user_id).execute()
-                profile.data[0]["nome"] = user.nome
+                await user_repository.update_profile(user_id, {"nome": user.nome})
+                profile["nome"] = user.nome
+        
+        # O id pode ter ficado em cache como desconhecido antes do cadastro
+        await profile_cache.invalidate(user_id)
+        
+        user_data = profile or {
+            "id": user_id,
+            "email": user.email,
+            "nome": user.nome or "",
+            "created_at": datetime.utcnow().isoformat()
+        }
         
         # Gerar token JWT
-        access_token = create_access_token({"sub": user_id})
+        access_token = await _issue_token(user_repository, user_data)
         
         return {
             "access_token": access_token,
             "token_type": "bearer",
-            "user": profile.data[0] if profile.data else {
-                "id": user_id,
-                "email": user.email,
-                "nome": user.nome or "",
-                "created_at": datetime.utcnow().isoformat()
-            }
+            "user": user_data
         }
     
     except Exception as e:
@@ -119,15 +145,18 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     """
     Autentica um usuário e retorna um token JWT (usado pelo Swagger e OAuth2)
     """
-    supabase = get_supabase_client()
+    # Cliente isolado: a sessão do usuário não pode vazar para o cliente compartilhado
+    supabase = supabase_clients.async_auth_client()
+    # Consultas com a sessão do usuário recém-autenticado
+    user_repository = SupabaseRepository(lambda: supabase)
     
     try:
         # Autenticar usuário no Supabase
         try:
-            auth_response = supabase.auth.sign_in_with_password({
+            auth_response = await maybe_await(supabase.auth.sign_in_with_password({
                 "email": form_data.username,
                 "password": form_data.password
-            })
+            }))
             
             user_id = auth_response.user.id
         except Exception as auth_error:
@@ -147,9 +176,9 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
             )
         
         # Buscar dados do perfil
-        profile = supabase.table("profiles").select("*").eq("id", user_id).execute()
+        profile = await user_repository.get_profile(user_id)
         
-        if not profile.data or len(profile.data) == 0:
+        if profile is None:
             # Se o perfil não existir, vamos criá-lo
             profile_data = {
                 "id": user_id,
@@ -157,39 +186,44 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
                 "nome": "",
                 "created_at": datetime.utcnow().isoformat()
             }
-            supabase.table("profiles").insert(profile_data).execute()
+            await user_repository.insert_profile(profile_data)
             
             # Também criar o registro de uso
-            supabase.table("usages").insert({
+            await user_repository.insert_usage({
                 "user_id": user_id,
                 "devotional_count": 0,
                 "last_used": datetime.utcnow().isoformat()
-            }).execute()
+            })
+            
+            await profile_cache.invalidate(user_id)
             
             # Buscar novamente o perfil
-            profile = supabase.table("profiles").select("*").eq("id", user_id).execute()
+            profile = await user_repository.get_profile(user_id)
         
-        # Atualizar último acesso
+        # Atualizar último acesso (gravado em segundo plano, fora do caminho da resposta)
         try:
-            supabase.table("usages").update({
+            await write_behind.add("usages", {
+                "user_id": user_id,
                 "last_used": datetime.utcnow().isoformat()
-            }).eq("user_id", user_id).execute()
+            })
         except Exception:
             # Se falhar a atualização de uso, não é crítico
             pass
         
+        user = profile or {
+            "id": user_id,
+            "email": form_data.username,
+            "nome": "",
+            "created_at": datetime.utcnow().isoformat()
+        }
+        
         # Gerar token JWT
-        access_token = create_access_token({"sub": user_id})
+        access_token = await _issue_token(user_repository, user)
         
         return {
             "access_token": access_token,
             "token_type": "bearer",
-            "user": profile.data[0] if profile.data and len(profile.data) > 0 else {
-                "id": user_id,
-                "email": form_data.username,
-                "nome": "",
-                "created_at": datetime.utcnow().isoformat()
-            }
+            "user": user
         }
     
     except HTTPException:
@@ -208,15 +242,18 @@ async def login_json(user_data: UserLogin):
     """
     Autentica um usuário via JSON e retorna um token JWT (usado pelo frontend)
     """
-    supabase = get_supabase_client()
+    # Cliente isolado: a sessão do usuário não pode vazar para o cliente compartilhado
+    supabase = supabase_clients.async_auth_client()
+    # Consultas com a sessão do usuário recém-autenticado
+    user_repository = SupabaseRepository(lambda: supabase)
     
     try:
         # Autenticar usuário no Supabase
         try:
-            auth_response = supabase.auth.sign_in_with_password({
+            auth_response = await maybe_await(supabase.auth.sign_in_with_password({
                 "email": user_data.email,
                 "password": user_data.password
-            })
+            }))
             
             user_id = auth_response.user.id
         except Exception as auth_error:
@@ -230,7 +267,7 @@ async def login_json(user_data: UserLogin):
             
             # Se não for erro de confirmação, verificar se as credenciais estão corretas
             # tentando buscar o usuário diretamente
-            users_response = supabase.auth.admin.list_users()
+            users_response = await maybe_await(supabase.auth.admin.list_users())
             for user in users_response.users:
                 if user.email == user_data.email:
                     # Usuário existe, então a senha deve estar incorreta
@@ -246,9 +283,9 @@ async def login_json(user_data: UserLogin):
             )
         
         # Buscar dados do perfil
-        profile = supabase.table("profiles").select("*").eq("id", user_id).execute()
+        profile = await user_repository.get_profile(user_id)
         
-        if not profile.data or len(profile.data) == 0:
+        if profile is None:
             # Se o perfil não existir, vamos criá-lo
             profile_data = {
                 "id": user_id,
@@ -256,39 +293,44 @@ async def login_json(user_data: UserLogin):
                 "nome": "",
                 "created_at": datetime.utcnow().isoformat()
             }
-            supabase.table("profiles").insert(profile_data).execute()
+            await user_repository.insert_profile(profile_data)
             
             # Também criar o registro de uso
-            supabase.table("usages").insert({
+            await user_repository.insert_usage({
                 "user_id": user_id,
                 "devotional_count": 0,
                 "last_used": datetime.utcnow().isoformat()
-            }).execute()
+            })
+            
+            await profile_cache.invalidate(user_id)
             
             # Buscar novamente o perfil
-            profile = supabase.table("profiles").select("*").eq("id", user_id).execute()
+            profile = await user_repository.get_profile(user_id)
         
-        # Atualizar último acesso
+        # Atualizar último acesso (gravado em segundo plano, fora do caminho da resposta)
         try:
-            supabase.table("usages").update({
+            await write_behind.add("usages", {
+                "user_id": user_id,
                 "last_used": datetime.utcnow().isoformat()
-            }).eq("user_id", user_id).execute()
+            })
         except Exception:
             # Se falhar a atualização de uso, não é crítico
             pass
         
+        user = profile or {
+            "id": user_id,
+            "email": user_data.email,
+            "nome": "",
+            "created_at": datetime.utcnow().isoformat()
+        }
+        
         # Gerar token JWT
-        access_token = create_access_token({"sub": user_id})
+        access_token = await _issue_token(user_repository, user)
         
         return {
             "access_token": access_token,
             "token_type": "bearer",
-            "user": profile.data[0] if profile.data and len(profile.data) > 0 else {
-                "id": user_id,
-                "email": user_data.email,
-                "nome": "",
-                "created_at": datetime.utcnow().isoformat()
-            }
+            "user": user
         }
     
     except HTTPException:
@@ -307,4 +349,13 @@ async def read_users_me(current_user: Dict[str, Any] = Depends(get_current_user)
     """
     Retorna os dados do usuário autenticado
     """
-    return current_user 
\ No newline at end of file
+    return current_user
+
+@router.post("/logout")
+async def logout(current_user: Dict[str, Any] = Depends(get_current_user)):
+    """
+    Encerra a sessão: os tokens já emitidos para o usuário deixam de ser aceitos
+    """
+    token_revocations.revoke(current_user["id"])
+    await profile_cache.invalidate(current_user["id"])
+    return {"success": True}
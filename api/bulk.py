@@ -0,0 +1,210 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Dict, Any, List, Optional, AsyncIterator
+import asyncio
+import json
+import os
+
+from api.auth import get_current_user
+from services.repository import SupabaseRepository, admin_repository
+from services.admission import AdmissionRejected
+from services.metrics import metrics
+from chains.devotional_cache import normalize_feeling
+from chains.devotional_chain import generate_devotional_async
+
+router = APIRouter()
+
+class BulkItem(BaseModel):
+    sentimento: str
+    user_id: Optional[str] = None
+
+class BulkRequest(BaseModel):
+    sentimentos: List[str] = Field(default_factory=list)
+    itens: List[BulkItem] = Field(default_factory=list)
+
+class BulkSettings:
+    """
+    Limites da geração em lote, lidos do .env
+    """
+    def __init__(self, concurrency: int = 4, batch_size: int = 50, max_items: int = 500, admission_retries: int = 3, admins: Optional[List[str]] = None):
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.max_items = max_items
+        self.admission_retries = admission_retries
+        self.admins = set(admins or [])
+
+    @classmethod
+    def from_env(cls) -> "BulkSettings":
+        return cls(
+            concurrency=int(os.getenv("BULK_CONCURRENCY", "4")),
+            batch_size=int(os.getenv("BULK_INSERT_BATCH_SIZE", "50")),
+            max_items=int(os.getenv("BULK_MAX_ITEMS", "500")),
+            admission_retries=int(os.getenv("BULK_ADMISSION_RETRIES", "3")),
+            admins=[user_id.strip() for user_id in os.getenv("BULK_ADMIN_USER_IDS", "").split(",") if user_id.strip()],
+        )
+
+bulk_settings = BulkSettings.from_env()
+
+class BulkWriter:
+    """
+    Acumula devocionais e incrementos de uso e os grava em lotes:
+    um insert por lote em devotionals e um incremento por lote em usages
+    """
+    def __init__(self, repository: SupabaseRepository, batch_size: int):
+        self.repository = repository
+        self.batch_size = batch_size
+        self.rows: List[Dict[str, Any]] = []
+        self.failed_rows = 0
+
+    def add(self, user_id: str, sentimento: str, devotional: Dict[str, Any]) -> None:
+        self.rows.append({
+            "user_id": user_id,
+            "sentimento": sentimento,
+            "texto": devotional["texto"],
+            "versiculos": devotional["versiculos"],
+            "reflexao": devotional["reflexao"],
+            "oracao": devotional["oracao"],
+            "modelo": devotional.get("modelo"),
+            "nivel_modelo": devotional.get("nivel_modelo"),
+            "motivo_roteamento": devotional.get("motivo_roteamento"),
+            # Só usado na contagem de uso; removido antes do insert
+            "_fallback": bool(devotional.get("fallback")),
+        })
+
+    @property
+    def full(self) -> bool:
+        return len(self.rows) >= self.batch_size
+
+    async def flush(self) -> None:
+        rows, self.rows = self.rows, []
+        if not rows:
+            return
+        try:
+            await self._write(rows)
+            metrics.increment("bulk_rows_written", len(rows))
+        except Exception as e:
+            print(f"Erro ao gravar lote de {len(rows)} devocionais: {e}")
+            self.failed_rows += len(rows)
+
+    async def _write(self, rows: List[Dict[str, Any]]) -> None:
+        # Devocionais de contingência não consomem a cota
+        increments: Dict[str, int] = {}
+        for row in rows:
+            if not row["_fallback"]:
+                increments[row["user_id"]] = increments.get(row["user_id"], 0) + 1
+
+        await self.repository.insert_devotionals([
+            {key: value for key, value in row.items() if key != "_fallback"} for row in rows
+        ])
+
+        # Soma no banco: reservas concorrentes do mesmo usuário não são sobrescritas
+        if increments:
+            await self.repository.increment_usages(increments)
+
+def _bulk_items(request: BulkRequest, default_user_id: str) -> List[BulkItem]:
+    items = [BulkItem(sentimento=sentimento) for sentimento in request.sentimentos] + list(request.itens)
+    return [BulkItem(sentimento=item.sentimento, user_id=item.user_id or default_user_id) for item in items]
+
+async def _generate(sentimento: str, settings: BulkSettings) -> Dict[str, Any]:
+    # O lote entra na fila gratuita e sem limite por usuário: quem limita é o teto de concorrência
+    for attempt in range(settings.admission_retries + 1):
+        try:
+            return await generate_devotional_async(sentimento, endpoint="bulk")
+        except AdmissionRejected as e:
+            if attempt >= settings.admission_retries:
+                raise
+            await asyncio.sleep(e.retry_after)
+
+def _line(data: Dict[str, Any]) -> str:
+    return json.dumps(data, ensure_ascii=False) + "\n"
+
+async def run_bulk(items: List[BulkItem], repository: SupabaseRepository, settings: BulkSettings) -> AsyncIterator[str]:
+    """
+    Gera os devocionais do lote e produz uma linha NDJSON por item, na ordem de conclusão.
+    Sentimentos idênticos (após normalização) são gerados uma única vez.
+    """
+    # Usuários inexistentes violariam a chave estrangeira e derrubariam o lote inteiro
+    known_users = await repository.get_existing_profile_ids(sorted({item.user_id for item in items}))
+
+    groups: Dict[str, List[int]] = {}
+    failed = 0
+    for index, item in enumerate(items):
+        if item.user_id not in known_users:
+            failed += 1
+            yield _line({"index": index, "user_id": item.user_id, "sentimento": item.sentimento, "status": "failed", "error": "Usuário não encontrado"})
+            continue
+        groups.setdefault(normalize_feeling(item.sentimento) or item.sentimento, []).append(index)
+
+    semaphore = asyncio.Semaphore(settings.concurrency)
+
+    async def generate_group(key: str):
+        async with semaphore:
+            try:
+                return key, await _generate(items[groups[key][0]].sentimento, settings), None
+            except Exception as e:
+                return key, None, e
+
+    writer = BulkWriter(repository, settings.batch_size)
+    tasks = [asyncio.create_task(generate_group(key)) for key in groups]
+    metrics.increment("bulk_items", len(items))
+    metrics.increment("bulk_unique_feelings", len(groups))
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            key, devotional, error = await next_done
+            for index in groups[key]:
+                item = items[index]
+                line = {"index": index, "user_id": item.user_id, "sentimento": item.sentimento}
+                if error is not None:
+                    failed += 1
+                    yield _line({**line, "status": "failed", "error": f"Erro ao gerar devocional: {str(error)}"})
+                    continue
+                writer.add(item.user_id, item.sentimento, devotional)
+                yield _line({**line, "status": "done", "result": devotional})
+            if writer.full:
+                await writer.flush()
+    finally:
+        # Cliente desconectado: gerações pendentes são canceladas, as concluídas ainda são gravadas
+        for task in tasks:
+            task.cancel()
+        await writer.flush()
+
+    yield _line({
+        "status": "finished",
+        "total": len(items),
+        "unique_feelings": len(groups),
+        "failed": failed,
+        "unsaved": writer.failed_rows,
+    })
+
+@router.post("/devotionals")
+async def bulk_devotionals(
+    request: BulkRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Gera devocionais em lote para uma lista de sentimentos ou pares (usuário, sentimento).
+    Restrito aos usuários listados em BULK_ADMIN_USER_IDS. A resposta é NDJSON:
+    uma linha por item conforme termina e uma linha final de resumo.
+    """
+    settings = bulk_settings
+    if current_user["id"] not in settings.admins:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Acesso restrito a parceiros autorizados"
+        )
+
+    items = _bulk_items(request, current_user["id"])
+    if not items:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nenhum sentimento informado")
+    if len(items) > settings.max_items:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"O lote aceita no máximo {settings.max_items} itens"
+        )
+
+    return StreamingResponse(
+        run_bulk(items, admin_repository, settings),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,12 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Dict, Any, Optional
-import os
+import json
 
 from api.auth import get_current_user
-from services.supabase_client import get_supabase_client
-from chains.devotional_chain import generate_devotional
+from services.repository import repository
+from services import entitlements
+from services.write_behind import write_behind
+from services.devotional_bodies import body_hash
+from services.admission import AdmissionRejected
+from services.jobs import job_queue, FINISHED_STATUSES
+from services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, decode_cursor, paginate
+from chains.devotional_chain import generate_devotional_async, stream_devotional_async
 
 router = APIRouter()
 
@@ -16,8 +22,7 @@ class FeelingRequest(BaseModel):
 class DevotionalSaveRequest(BaseModel):
     sentimento: str
     greeting: str
-    verse: Dict[str, str]
-    content: str
+    body_hash: str
     date: str
 
 class DevotionalResponse(BaseModel):
@@ -26,6 +31,73 @@ class DevotionalResponse(BaseModel):
     reflexao: str
     oracao: str
 
+async def reserve_usage(user_id: str):
+    """
+    Verifica o direito de uso e reserva um devocional em no máximo uma ida ao
+    banco (função reserve_usage, em migrations/0004_cota_de_uso.sql).
+    Retorna (is_subscribed, resposta_402), onde resposta_402 é None quando a
+    reserva foi feita e o usuário pode gerar o devocional.
+    """
+    reservation = await entitlements.reserve_usage(user_id)
+    
+    if not reservation["allowed"]:
+        return False, JSONResponse(
+            status_code=status.HTTP_402_PAYMENT_REQUIRED,
+            content={
+                "detail": "Limite de uso gratuito atingido. Por favor, assine o serviço para continuar.",
+                "subscription_required": True
+            }
+        )
+    
+    return reservation["subscribed"], None
+
+async def release_usage(user_id: str):
+    """
+    Devolve a reserva de uso quando a geração falha ou o cliente desiste
+    """
+    try:
+        await entitlements.release_usage(user_id)
+    except Exception as e:
+        print(f"Erro ao devolver a reserva de uso de {user_id}: {str(e)}")
+
+async def record_devotional(user_id: str, sentimento: str, devotional: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Salva o devocional gerado; o uso já foi reservado em reserve_usage.
+    Devocionais da biblioteca de contingência (modelo indisponível) não consomem a cota.
+    Retorna uma cópia do devocional com body_hash, a referência usada para salvá-lo
+    pelo painel (/devotional/save).
+    """
+    if devotional.get("fallback"):
+        await release_usage(user_id)
+    
+    # Salvar o devocional no histórico (em lote, depois da resposta)
+    await write_behind.add("devotionals", {
+        "user_id": user_id,
+        "sentimento": sentimento,
+        "texto": devotional["texto"],
+        "versiculos": devotional["versiculos"],
+        "reflexao": devotional["reflexao"],
+        "oracao": devotional["oracao"],
+        "modelo": devotional.get("modelo"),
+        "nivel_modelo": devotional.get("nivel_modelo"),
+        "motivo_roteamento": devotional.get("motivo_roteamento")
+    })
+    
+    return {**devotional, "body_hash": body_hash(devotional)}
+
+def _admission_error(error: AdmissionRejected) -> HTTPException:
+    """
+    Converte a recusa do controle de admissão em 429/503 com Retry-After
+    """
+    return HTTPException(
+        status_code=error.status_code,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+def _sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @router.post("/feelings", response_model=Dict[str, Any])
 async def process_feeling(
     request: FeelingRequest, 
@@ -36,64 +108,165 @@ async def process_feeling(
     Verifica se o usuário tem usos gratuitos disponíveis ou assinatura ativa.
     """
     user_id = current_user["id"]
-    supabase = get_supabase_client()
-    
-    # Verificar status da assinatura e contagem de uso
-    subscription = supabase.table("subscriptions").select("*").eq("user_id", user_id).execute()
-    usage = supabase.table("usages").select("*").eq("user_id", user_id).execute()
-    
-    is_subscribed = False
-    usage_count = 0
-    
-    # Verificar se o usuário tem assinatura ativa
-    if subscription.data and len(subscription.data) > 0:
-        is_subscribed = subscription.data[0].get("is_active", False)
-    
-    # Verificar contagem de uso
-    if usage.data and len(usage.data) > 0:
-        usage_count = usage.data[0].get("devotional_count", 0)
-    else:
-        # Criar registro de uso se não existir
-        supabase.table("usages").insert({"user_id": user_id, "devotional_count": 0}).execute()
-    
-    # Verificar se o usuário pode gerar um devocional
-    free_usage_limit = int(os.getenv("FREE_USAGE_LIMIT", "5"))
-    if not is_subscribed and usage_count >= free_usage_limit:
-        return JSONResponse(
-            status_code=status.HTTP_402_PAYMENT_REQUIRED,
-            content={
-                "detail": "Limite de uso gratuito atingido. Por favor, assine o serviço para continuar.",
-                "subscription_required": True
-            }
-        )
+    
+    is_subscribed, limit_response = await reserve_usage(user_id)
+    if limit_response is not None:
+        return limit_response
     
     # Gerar o devocional
     try:
-        devotional = generate_devotional(request.sentimento)
-        
-        # Salvar o devocional no banco de dados
-        supabase.table("devotionals").insert({
-            "user_id": user_id,
-            "sentimento": request.sentimento,
-            "texto": devotional["texto"],
-            "versiculos": devotional["versiculos"],
-            "reflexao": devotional["reflexao"],
-            "oracao": devotional["oracao"]
-        }).execute()
-        
-        # Atualizar contagem de uso
-        if usage.data and len(usage.data) > 0:
-            supabase.table("usages").update({"devotional_count": usage_count + 1}).eq("user_id", user_id).execute()
-        else:
-            supabase.table("usages").insert({"user_id": user_id, "devotional_count": 1}).execute()
-        
-        return devotional
+        devotional = await generate_devotional_async(request.sentimento, user_id=user_id, subscriber=is_subscribed, endpoint="feelings")
+    except AdmissionRejected as e:
+        await release_usage(user_id)
+        raise _admission_error(e)
+    except Exception as e:
+        await release_usage(user_id)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao gerar devocional: {str(e)}"
+        )
     
+    try:
+        return await record_devotional(user_id, request.sentimento, devotional)
     except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao salvar devocional: {str(e)}"
+        )
+
+@router.post("/feelings/stream")
+async def stream_feeling(
+    request: FeelingRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Gera o devocional em streaming (Server-Sent Events).
+    Emite eventos "token" com o texto parcial, "section" a cada seção concluída
+    e "done" com o devocional completo, no mesmo formato de /feelings.
+    """
+    user_id = current_user["id"]
+    
+    is_subscribed, limit_response = await reserve_usage(user_id)
+    if limit_response is not None:
+        return limit_response
+    
+    events = stream_devotional_async(request.sentimento, user_id=user_id, subscriber=is_subscribed, endpoint="feelings_stream")
+    
+    # O primeiro evento é aguardado antes de abrir o stream para que uma recusa
+    # do controle de admissão ainda possa ser respondida com 429/503
+    try:
+        first_event = await events.__anext__()
+    except AdmissionRejected as e:
+        await release_usage(user_id)
+        raise _admission_error(e)
+    except Exception as e:
+        await release_usage(user_id)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao gerar devocional: {str(e)}"
         )
+    
+    async def event_stream():
+        event = first_event
+        recorded = False
+        try:
+            while True:
+                if event["event"] == "done":
+                    # Persistência roda uma única vez, ao final
+                    recorded = True
+                    event = {**event, "data": await record_devotional(user_id, request.sentimento, event["data"])}
+                yield _sse_event(event["event"], event["data"])
+                event = await events.__anext__()
+        except StopAsyncIteration:
+            pass
+        except Exception as e:
+            yield _sse_event("error", {"detail": f"Erro ao gerar devocional: {str(e)}"})
+        finally:
+            await events.aclose()
+            # Erro ou cliente desconectado antes do fim: a reserva de uso é devolvida
+            if not recorded:
+                await release_usage(user_id)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _run_devotional_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Executa um job de geração: gera o devocional e o salva ao concluir
+    """
+    user_id = payload["user_id"]
+    try:
+        devotional = await generate_devotional_async(
+            payload["sentimento"], user_id=user_id, subscriber=payload.get("subscriber", False), endpoint="jobs", wait=True
+        )
+    except Exception:
+        # O uso foi reservado ao enfileirar o job
+        await release_usage(user_id)
+        raise
+    
+    return await record_devotional(user_id, payload["sentimento"], devotional)
+
+job_queue.register("devotional", _run_devotional_job)
+
+def _job_response(job: Dict[str, Any]) -> Dict[str, Any]:
+    response = {"job_id": job["id"], "status": job["status"]}
+    if job["status"] in FINISHED_STATUSES:
+        response["result"] = job["result"]
+        response["error"] = job["error"]
+    return response
+
+@router.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def create_devotional_job(
+    request: FeelingRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Enfileira a geração de um devocional e retorna o id do job imediatamente.
+    O resultado é consultado em GET /api/jobs/{job_id}.
+    """
+    user_id = current_user["id"]
+    
+    # A cota é reservada já na criação do job, para que jobs concorrentes não a excedam
+    is_subscribed, limit_response = await reserve_usage(user_id)
+    if limit_response is not None:
+        return limit_response
+    
+    try:
+        job_id = await job_queue.enqueue("devotional", {
+            "user_id": user_id,
+            "sentimento": request.sentimento,
+            "subscriber": is_subscribed
+        })
+    except Exception:
+        await release_usage(user_id)
+        raise
+    
+    return {"job_id": job_id, "status": "pending"}
+
+@router.get("/jobs/{job_id}")
+async def get_devotional_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=60, description="Segundos para aguardar a conclusão (long-poll)"),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Retorna o status do job e, quando concluído, o devocional gerado
+    """
+    # O dono é verificado antes do long-poll: ninguém segura a conexão esperando o job de outro usuário
+    job = await job_queue.get(job_id)
+    if job is None or job["payload"].get("user_id") != current_user["id"]:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job não encontrado"
+        )
+    
+    if wait:
+        job = await job_queue.wait(job_id, wait) or job
+    
+    return _job_response(job)
 
 @router.post("/devotional/save")
 async def save_devotional(
@@ -104,29 +277,35 @@ async def save_devotional(
     Salva um devocional gerado pelo usuário
     """
     user_id = current_user["id"]
-    supabase = get_supabase_client()
     
     try:
-        devotional_data = {
+        # Só um devocional gerado para o usuário pode ser salvo; o do último
+        # pedido pode ainda estar no buffer do histórico ou em um lote sendo gravado
+        generated = await repository.find_devotional_by_body(user_id, request.body_hash)
+        if generated is None and (write_behind.pending or write_behind.flushing):
+            await write_behind.flush()
+            generated = await repository.find_devotional_by_body(user_id, request.body_hash)
+        if generated is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Devocional não encontrado"
+            )
+        
+        # Salvar de novo o mesmo devocional mantém a linha já salva
+        saved = await repository.save_devotional({
             "user_id": user_id,
             "sentimento": request.sentimento,
             "greeting": request.greeting,
-            "verse_text": request.verse.get("text", ""),
-            "verse_reference": request.verse.get("reference", ""),
-            "content": request.content,
+            "body_hash": request.body_hash,
             "created_at": request.date
-        }
-        
-        result = supabase.table("saved_devotionals").insert(devotional_data).execute()
+        })
         
-        if result.data:
+        if saved:
             return {"success": True, "message": "Devocional salvo com sucesso"}
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Erro ao salvar devocional"
-            )
-            
+        return {"success": True, "message": "Devocional já estava salvo"}
+    
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -138,59 +317,86 @@ async def get_user_status(current_user: Dict[str, Any] = Depends(get_current_use
     """
     Retorna o status do usuário: usos restantes, assinatura ativa, validade
     """
-    user_id = current_user["id"]
-    supabase = get_supabase_client()
-    
-    # Obter dados de assinatura e uso
-    subscription = supabase.table("subscriptions").select("*").eq("user_id", user_id).execute()
-    usage = supabase.table("usages").select("*").eq("user_id", user_id).execute()
-    
-    is_subscribed = False
-    valid_until = None
-    usage_count = 0
-    
-    if subscription.data and len(subscription.data) > 0:
-        is_subscribed = subscription.data[0].get("is_active", False)
-        valid_until = subscription.data[0].get("valid_until")
-    
-    if usage.data and len(usage.data) > 0:
-        usage_count = usage.data[0].get("devotional_count", 0)
-    
-    free_usage_limit = int(os.getenv("FREE_USAGE_LIMIT", "5"))
-    usos_restantes = max(0, free_usage_limit - usage_count) if not is_subscribed else "ilimitado"
+    # Assinatura (com a validade aplicada) e uso em uma única consulta, ou do cache
+    user_entitlements = await entitlements.get_entitlements(current_user["id"])
     
     return {
-        "usos_restantes": usos_restantes,
-        "assinatura_ativa": is_subscribed,
-        "validade": valid_until
+        "usos_restantes": "ilimitado" if user_entitlements["subscribed"] else user_entitlements["remaining_free"],
+        "assinatura_ativa": user_entitlements["subscribed"],
+        "validade": user_entitlements["valid_until"]
     }
 
+def _page_cursor(cursor: Optional[str]) -> Optional[str]:
+    """
+    Valida o cursor recebido antes de montar a consulta
+    """
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return cursor
+
 @router.get("/devotionals")
-async def get_user_devotionals(current_user: Dict[str, Any] = Depends(get_current_user)):
+async def get_user_devotionals(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
     """
-    Retorna todos os devocionais gerados pelo usuário
+    Retorna uma página dos devocionais gerados pelo usuário, do mais recente ao
+    mais antigo, em versão resumida (id, data, sentimento, primeiro versículo e
+    trecho). Para a próxima página, envie o next_cursor recebido.
     """
-    user_id = current_user["id"]
-    supabase = get_supabase_client()
+    rows = await repository.list_devotionals(current_user["id"], limit, _page_cursor(cursor))
+    return paginate(rows, limit)
+
+@router.get("/devotionals/{devotional_id}")
+async def get_user_devotional(devotional_id: str, current_user: Dict[str, Any] = Depends(get_current_user)):
+    """
+    Retorna um devocional gerado pelo usuário, completo
+    """
+    devotional = await repository.get_devotional(current_user["id"], devotional_id)
     
-    devotionals = supabase.table("devotionals").select("*").eq("user_id", user_id).execute()
+    if devotional is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Devocional não encontrado"
+        )
     
-    return devotionals.data
+    return devotional
 
 @router.get("/devotional/saved")
-async def get_saved_devotionals(current_user: Dict[str, Any] = Depends(get_current_user)):
+async def get_saved_devotionals(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
     """
-    Retorna todos os devocionais salvos pelo usuário
+    Retorna uma página dos devocionais salvos pelo usuário, em versão resumida
     """
-    user_id = current_user["id"]
-    supabase = get_supabase_client()
-    
+    cursor = _page_cursor(cursor)
     try:
-        result = supabase.table("saved_devotionals").select("*").eq("user_id", user_id).order("created_at", desc=True).execute()
-        return {"devotionals": result.data}
+        rows = await repository.list_saved_devotionals(current_user["id"], limit, cursor)
+        return paginate(rows, limit)
         
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao buscar devocionais salvos: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.get("/devotional/saved/{devotional_id}")
+async def get_saved_devotional(devotional_id: str, current_user: Dict[str, Any] = Depends(get_current_user)):
+    """
+    Retorna um devocional salvo pelo usuário, completo
+    """
+    devotional = await repository.get_saved_devotional(current_user["id"], devotional_id)
+    
+    if devotional is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Devocional não encontrado"
+        )
+    
+    return devotional
\ No newline at end of file
@@ -6,7 +6,9 @@ from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from pydantic import BaseModel
 
-from services.supabase_client import get_supabase_client
+from services.repository import repository
+from services.tokens import token_revocations
+from services.entitlements import entitlement_cache
 
 # Carregando variáveis de ambiente
 load_dotenv()
@@ -54,33 +56,34 @@ async def process_webhook(request: Request):
                 # O external_reference deve conter o ID do usuário
                 user_id = external_reference
                 
-                # Atualizar assinatura no Supabase
-                supabase = get_supabase_client()
-                
                 # Calcular data de validade (30 dias a partir de agora)
                 valid_until = (datetime.utcnow() + timedelta(days=30)).isoformat()
                 
                 # Verificar se já existe assinatura
-                subscription = supabase.table("subscriptions").select("*").eq("user_id", user_id).execute()
+                subscription = await repository.get_subscription(user_id)
                 
-                if subscription.data and len(subscription.data) > 0:
+                if subscription:
                     # Atualizar assinatura existente
-                    supabase.table("subscriptions").update({
+                    await repository.update_subscription(user_id, {
                         "is_active": True,
                         "valid_until": valid_until,
                         "last_payment_id": payment_id,
                         "updated_at": datetime.utcnow().isoformat()
-                    }).eq("user_id", user_id).execute()
+                    })
                 else:
                     # Criar nova assinatura
-                    supabase.table("subscriptions").insert({
+                    await repository.insert_subscription({
                         "user_id": user_id,
                         "is_active": True,
                         "valid_until": valid_until,
                         "last_payment_id": payment_id,
                         "created_at": datetime.utcnow().isoformat(),
                         "updated_at": datetime.utcnow().isoformat()
-                    }).execute()
+                    })
+                
+                # Claims de plano emitidas antes do pagamento deixam de valer
+                token_revocations.mark_changed(user_id)
+                await entitlement_cache.invalidate(user_id)
                 
                 return {"status": "success", "message": "subscription_updated"}
             
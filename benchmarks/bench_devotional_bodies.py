@@ -0,0 +1,251 @@
+"""
+Armazenamento e latência de escrita dos devocionais com os corpos endereçados
+pelo conteúdo (devotional_bodies) contra o texto repetido em cada linha.
+
+Os dados semeados imitam a produção: parte dos devocionais gerados vem do
+cache/pool (o mesmo texto para vários usuários) e cada usuário salva alguns
+dos seus devocionais pelo painel, às vezes mais de uma vez. Antes o salvo
+repetia o texto exibido; agora referencia o corpo do devocional gerado.
+
+Sempre mede os bytes de texto gravados e o tempo de gravação dos lotes contra
+um PostgREST local falso (corpo da requisição e serialização). Com
+TEST_DATABASE_URL definido (e psycopg instalado), mede também o tamanho das
+tabelas e a latência dos inserts num Postgres descartável, com as migrações aplicadas.
+
+Uso: python -m benchmarks.bench_devotional_bodies [usuários]
+"""
+import asyncio
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from supabase import acreate_client
+
+from migrations.runner import apply as apply_migrations
+from services.devotional_bodies import BODY_FIELDS, body_hash, split_body, unique_bodies
+from services.repository import SupabaseRepository
+
+GENERATED_PER_USER = 20
+SAVED_PER_USER = 5
+# Fração dos devocionais servidos pelo cache/pool e quantos textos distintos o pool tem
+POOL_SHARE = 0.6
+POOL_SIZE = 200
+BATCH_SIZE = 200
+
+def _devotional(seed: str):
+    text = f"Devocional {seed}: " + "Lança sobre o Senhor o teu cuidado, e ele te susterá. " * 30
+    return {
+        "texto": text,
+        "versiculos": ["Salmos 55:22 - Lança sobre o Senhor o teu cuidado", "1 Pedro 5:7 - Lançando sobre ele toda a vossa ansiedade"],
+        "reflexao": text[:900],
+        "oracao": "Senhor, entrego a ti as minhas preocupações. " * 6,
+    }
+
+def seed(users: int, rng: random.Random):
+    """Devocionais gerados (linhas de devotionals) e salvos (linhas de saved_devotionals)"""
+    pool = [_devotional(f"pool-{index}") for index in range(POOL_SIZE)]
+    generated, saved = [], []
+    for _ in range(users):
+        user_id = str(uuid.uuid4())
+        mine = []
+        for index in range(GENERATED_PER_USER):
+            body = rng.choice(pool) if rng.random() < POOL_SHARE else _devotional(f"{user_id}-{index}")
+            mine.append({"user_id": user_id, "sentimento": "ansioso", **body, "modelo": "gemini"})
+        generated.extend(mine)
+        # Alguns são salvos duas vezes; a linha antiga repetia o texto exibido
+        for devotional in rng.sample(mine, SAVED_PER_USER) + rng.sample(mine, 1):
+            saved.append({
+                "user_id": user_id, "sentimento": "ansioso", "greeting": "Olá!",
+                "body_hash": body_hash(devotional),
+                "legacy": {"verse_text": devotional["versiculos"][0], "verse_reference": "Salmos 55:22", "content": devotional["texto"]},
+            })
+    return generated, saved
+
+def _saved_row(row):
+    """Linha de saved_devotionals: a referência ao corpo e a saudação"""
+    return {key: row[key] for key in ("user_id", "sentimento", "greeting", "body_hash")}
+
+def _legacy_saved_row(row):
+    """Linha de saved_devotionals antes dos corpos, com o texto repetido"""
+    return {key: row[key] for key in ("user_id", "sentimento", "greeting")} | row["legacy"]
+
+def _text_bytes(row):
+    size = 0
+    for field in BODY_FIELDS + ("greeting", "verse_text", "verse_reference", "content"):
+        value = row.get(field)
+        if isinstance(value, list):
+            size += sum(len(item.encode()) for item in value)
+        elif isinstance(value, str):
+            size += len(value.encode())
+    return size
+
+def report_text_bytes(generated, saved):
+    inline = sum(_text_bytes(row) for row in generated) + sum(_text_bytes(_legacy_saved_row(row)) for row in saved)
+    bodies = unique_bodies([split_body(row)[0] for row in generated])
+    distinct_saved = {(row["user_id"], row["body_hash"]): _saved_row(row) for row in saved}
+    # Cada linha passa a guardar só a referência (64 caracteres hex); o salvo, também a saudação
+    addressed = (
+        sum(_text_bytes(body) for body in bodies) + 64 * len(generated)
+        + sum(64 + _text_bytes(row) for row in distinct_saved.values())
+    )
+
+    print(f"Texto gravado ({len(generated)} gerados, {len(saved)} salvamentos)")
+    print(f"  repetido em cada linha   {inline / 1e6:8.2f} MB")
+    print(f"  endereçado pelo conteúdo {addressed / 1e6:8.2f} MB ({len(bodies)} corpos, {len(distinct_saved)} salvos)")
+    print(f"  economia                 {100 * (1 - addressed / inline):7.1f} %")
+
+class FakePostgREST(BaseHTTPRequestHandler):
+    """PostgREST falso: aceita qualquer insert/upsert e conta os bytes recebidos"""
+    protocol_version = "HTTP/1.1"
+    received = 0
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        FakePostgREST.received += len(body)
+        self.send_response(201)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"[]")
+
+    def log_message(self, *args):
+        pass
+
+def bench_postgrest(generated):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakePostgREST)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    batches = [generated[index:index + BATCH_SIZE] for index in range(0, len(generated), BATCH_SIZE)]
+
+    async def run():
+        client = await acreate_client(f"http://127.0.0.1:{server.server_address[1]}", "service-key")
+        repository = SupabaseRepository(lambda: client)
+
+        async def timed(write):
+            FakePostgREST.received = 0
+            start = time.perf_counter()
+            for batch in batches:
+                await write(batch)
+            return (time.perf_counter() - start) / len(batches) * 1000, FakePostgREST.received
+
+        inline = await timed(lambda batch: client.table("devotionals").insert(batch).execute())
+        addressed = await timed(repository.insert_devotionals)
+        return inline, addressed
+
+    try:
+        (inline_ms, inline_bytes), (addressed_ms, addressed_bytes) = asyncio.run(run())
+    finally:
+        server.shutdown()
+
+    print(f"PostgREST falso: lotes de {BATCH_SIZE} devocionais gerados (write-behind)")
+    print(f"  texto em cada linha        {inline_ms:7.2f} ms/lote | {inline_bytes / 1e6:7.2f} MB enviados")
+    print(f"  corpos + referências       {addressed_ms:7.2f} ms/lote | {addressed_bytes / 1e6:7.2f} MB enviados")
+
+LEGACY_TABLES = """
+CREATE TEMP TABLE legacy_devotionals (
+  id UUID DEFAULT uuid_generate_v4() PRIMARY KEY, user_id UUID NOT NULL, sentimento TEXT NOT NULL,
+  texto TEXT NOT NULL, versiculos TEXT[] NOT NULL, reflexao TEXT, oracao TEXT, modelo TEXT,
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL
+);
+CREATE TEMP TABLE legacy_saved_devotionals (
+  id UUID DEFAULT uuid_generate_v4() PRIMARY KEY, user_id UUID NOT NULL, sentimento TEXT NOT NULL,
+  greeting TEXT, verse_text TEXT, verse_reference TEXT, content TEXT NOT NULL,
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL
+);
+"""
+
+SIZE_QUERY = "SELECT sum(pg_total_relation_size(name::regclass)) FROM unnest(%s::text[]) name"
+
+def bench_postgres(database_url, generated, saved):
+    import psycopg
+
+    print("Postgres (tamanho das tabelas e inserts em lote)")
+    with psycopg.connect(database_url, autocommit=True) as conn:
+        apply_migrations(conn)
+        users = sorted({row["user_id"] for row in generated})
+        for user_id in users:
+            conn.execute("INSERT INTO auth.users (id, email) VALUES (%s, %s)", (user_id, f"{user_id}@bench.test"))
+        conn.execute(LEGACY_TABLES)
+
+        tables = ["public.devotionals", "public.saved_devotionals", "public.devotional_bodies"]
+        before = conn.execute(SIZE_QUERY, (tables,)).fetchone()[0]
+        legacy_ms, addressed_ms = [], []
+        try:
+            for index in range(0, len(generated), BATCH_SIZE):
+                batch = generated[index:index + BATCH_SIZE]
+                with conn.cursor() as cursor:
+                    start = time.perf_counter()
+                    with conn.transaction():
+                        cursor.executemany(
+                            "INSERT INTO legacy_devotionals (user_id, sentimento, texto, versiculos, reflexao, oracao, modelo)"
+                            " VALUES (%(user_id)s, %(sentimento)s, %(texto)s, %(versiculos)s, %(reflexao)s, %(oracao)s, %(modelo)s)",
+                            batch,
+                        )
+                    legacy_ms.append((time.perf_counter() - start) * 1000)
+
+                    bodies, rows = zip(*(split_body(row) for row in batch))
+                    start = time.perf_counter()
+                    with conn.transaction():
+                        cursor.executemany(
+                            "INSERT INTO public.devotional_bodies (hash, texto, versiculos, reflexao, oracao)"
+                            " VALUES (%(hash)s, %(texto)s, %(versiculos)s, %(reflexao)s, %(oracao)s)"
+                            " ON CONFLICT (hash) DO NOTHING",
+                            unique_bodies(list(bodies)),
+                        )
+                        cursor.executemany(
+                            "INSERT INTO public.devotionals (user_id, sentimento, modelo, body_hash)"
+                            " VALUES (%(user_id)s, %(sentimento)s, %(modelo)s, %(body_hash)s)",
+                            rows,
+                        )
+                    addressed_ms.append((time.perf_counter() - start) * 1000)
+
+            with conn.cursor() as cursor:
+                cursor.executemany(
+                    "INSERT INTO legacy_saved_devotionals (user_id, sentimento, greeting, verse_text, verse_reference, content)"
+                    " VALUES (%(user_id)s, %(sentimento)s, %(greeting)s, %(verse_text)s, %(verse_reference)s, %(content)s)",
+                    [_legacy_saved_row(row) for row in saved],
+                )
+                # O corpo já foi gravado com o devocional gerado
+                cursor.executemany(
+                    "INSERT INTO public.saved_devotionals (user_id, sentimento, greeting, body_hash)"
+                    " VALUES (%(user_id)s, %(sentimento)s, %(greeting)s, %(body_hash)s)"
+                    " ON CONFLICT (user_id, body_hash) DO NOTHING",
+                    [_saved_row(row) for row in saved],
+                )
+
+            conn.execute("VACUUM ANALYZE legacy_devotionals, legacy_saved_devotionals")
+            legacy = conn.execute(SIZE_QUERY, (["legacy_devotionals", "legacy_saved_devotionals"],)).fetchone()[0]
+            addressed = conn.execute(SIZE_QUERY, (tables,)).fetchone()[0] - before
+            legacy_ms.sort()
+            addressed_ms.sort()
+            median = len(legacy_ms) // 2
+            print(f"  texto em cada linha  {legacy / 1e6:8.2f} MB | insert de {BATCH_SIZE}: mediana {legacy_ms[median]:6.2f} ms")
+            print(f"  corpos + referências {addressed / 1e6:8.2f} MB | insert de {BATCH_SIZE}: mediana {addressed_ms[median]:6.2f} ms")
+            print(f"  economia             {100 * (1 - addressed / legacy):7.1f} %")
+        finally:
+            conn.execute("DELETE FROM auth.users WHERE email LIKE '%@bench.test'")
+            conn.execute(
+                "DELETE FROM public.devotional_bodies b WHERE b.hash = ANY(%s)"
+                " AND NOT EXISTS (SELECT 1 FROM public.devotionals d WHERE d.body_hash = b.hash)"
+                " AND NOT EXISTS (SELECT 1 FROM public.saved_devotionals s WHERE s.body_hash = b.hash)",
+                ([split_body(row)[0]["hash"] for row in generated],),
+            )
+
+def main(users: int = 500):
+    generated, saved = seed(users, random.Random(7))
+    report_text_bytes(generated, saved)
+    bench_postgrest(generated)
+    database_url = os.getenv("TEST_DATABASE_URL")
+    if database_url:
+        bench_postgres(database_url, generated, saved)
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
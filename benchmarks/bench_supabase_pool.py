@@ -0,0 +1,98 @@
+"""
+Compara um cliente do Supabase novo por chamada com os clientes compartilhados,
+contra um PostgREST local falso que conta conexões TCP e requisições.
+
+Cada "requisição" repete as idas ao banco de /api/feelings: perfil em
+get_current_user, assinatura e uso em _check_usage, insert do devocional e
+update do uso em _record_devotional.
+
+Uso: python -m benchmarks.bench_supabase_pool [requisições] [latência_ms]
+"""
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from supabase import create_client
+
+from services.supabase_client import SupabaseClients
+
+class FakePostgREST(BaseHTTPRequestHandler):
+    """PostgREST falso: responde a qualquer tabela com uma linha e simula latência"""
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    requests = 0
+    latency = 0.0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        # Sem Nagle: cabeçalho e corpo saem em escritas separadas
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with FakePostgREST.lock:
+            FakePostgREST.connections += 1
+
+    def _respond(self):
+        with FakePostgREST.lock:
+            FakePostgREST.requests += 1
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        time.sleep(FakePostgREST.latency)
+        body = json.dumps([{"id": "user-1", "user_id": "user-1", "is_active": True, "devotional_count": 1}]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PATCH = _respond
+
+    def log_message(self, *args):
+        pass
+
+def feelings_round_trips(get_client):
+    # get_current_user
+    get_client().table("profiles").select("*").eq("id", "user-1").execute()
+    # process_feeling: _check_usage e _record_devotional
+    supabase = get_client()
+    supabase.table("subscriptions").select("*").eq("user_id", "user-1").execute()
+    supabase.table("usages").select("*").eq("user_id", "user-1").execute()
+    supabase.table("devotionals").insert({"user_id": "user-1", "sentimento": "ansioso"}).execute()
+    supabase.table("usages").update({"devotional_count": 2}).eq("user_id", "user-1").execute()
+
+def run(label, get_client, requests):
+    FakePostgREST.connections = FakePostgREST.requests = 0
+    start = time.perf_counter()
+    for _ in range(requests):
+        feelings_round_trips(get_client)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<22} | {elapsed / requests * 1000:7.2f} ms/requisição"
+        f" | {FakePostgREST.requests / requests:.1f} idas ao banco/requisição"
+        f" | {FakePostgREST.connections:4} conexões TCP"
+    )
+
+def main(requests: int = 200, latency_ms: float = 1.0):
+    FakePostgREST.latency = latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakePostgREST)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["SUPABASE_KEY"] = "anon-key"
+
+    try:
+        run("cliente por chamada", lambda: create_client(os.environ["SUPABASE_URL"], "anon-key"), requests)
+        clients = SupabaseClients()
+        run("clientes compartilhados", clients.anon, requests)
+        clients.close()
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 1.0,
+    )
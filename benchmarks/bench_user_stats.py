@@ -0,0 +1,143 @@
+"""
+Latência de /api/user/stats conforme o histórico do usuário cresce: a listagem
+antiga (todas as linhas de saved_devotionals para contar em Python) contra a
+contagem exata em HEAD e a função get_user_stats (totais mantidos por triggers).
+
+Contra um PostgREST local falso, mede transferência e parse das respostas.
+Com TEST_DATABASE_URL definido (e psycopg instalado), mede também as consultas
+num Postgres descartável, com as migrações aplicadas.
+
+Uso: python -m benchmarks.bench_user_stats [repetições]
+"""
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from supabase import create_client
+
+from migrations.runner import apply as apply_migrations
+
+HISTORY_SIZES = (10, 100, 1000, 5000)
+
+class FakePostgREST(BaseHTTPRequestHandler):
+    """PostgREST falso: devolve o histórico inteiro, só a contagem ou a linha de estatísticas"""
+    protocol_version = "HTTP/1.1"
+    history = 0
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _send(self, body: bytes, headers=None):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_GET(self):
+        rows = [{"id": str(uuid.UUID(int=index))} for index in range(FakePostgREST.history)]
+        self._send(json.dumps(rows).encode())
+
+    def do_HEAD(self):
+        self._send(b"", {"Content-Range": f"*/{FakePostgREST.history}"})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        row = {"generated_count": FakePostgREST.history, "saved_count": FakePostgREST.history, "streak": 7}
+        self._send(json.dumps([row]).encode())
+
+    def log_message(self, *args):
+        pass
+
+def timed(call, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        call()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def bench_postgrest(repeat):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakePostgREST)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = create_client(f"http://127.0.0.1:{server.server_address[1]}", "anon-key")
+    saved = lambda *args, **kwargs: client.table("saved_devotionals").select(*args, **kwargs).eq("user_id", "user-1")
+
+    print("PostgREST falso (transferência e parse)")
+    try:
+        for size in HISTORY_SIZES:
+            FakePostgREST.history = size
+            listing = timed(lambda: len(saved("id").execute().data), repeat)
+            head = timed(lambda: saved("id", count="exact", head=True).execute().count, repeat)
+            stats = timed(lambda: client.rpc("get_user_stats", {"p_user_id": "user-1"}).execute(), repeat)
+            print(
+                f"{size:>6} linhas | listagem {listing:7.2f} ms"
+                f" | contagem HEAD {head:6.2f} ms | get_user_stats {stats:6.2f} ms"
+            )
+    finally:
+        server.shutdown()
+
+def bench_postgres(database_url, repeat):
+    import psycopg
+
+    print("Postgres (consultas no banco)")
+    with psycopg.connect(database_url, autocommit=True) as conn:
+        apply_migrations(conn)
+
+        for size in HISTORY_SIZES:
+            user_id = str(uuid.uuid4())
+            conn.execute("INSERT INTO auth.users (id, email) VALUES (%s, %s)", (user_id, f"{user_id}@bench.test"))
+            # Um devocional salvo por dia, o mais recente hoje (cada um com o seu corpo)
+            conn.execute(
+                "CREATE TEMP TABLE bench_bodies AS"
+                " SELECT t, public.devotional_body_hash(t, NULL, NULL, NULL) AS hash"
+                " FROM (SELECT %s::text || ':' || n || repeat(' texto', 200) AS t FROM generate_series(1, %s) n) b",
+                (user_id, size),
+            )
+            conn.execute("INSERT INTO public.devotional_bodies (hash, texto) SELECT hash, t FROM bench_bodies")
+            conn.execute(
+                "INSERT INTO public.saved_devotionals (user_id, sentimento, body_hash)"
+                " SELECT %s, 'grato', hash FROM bench_bodies",
+                (user_id,),
+            )
+            conn.execute("DROP TABLE bench_bodies")
+            today = conn.execute("SELECT public.activity_day(now())").fetchone()[0]
+            conn.execute(
+                "INSERT INTO public.user_activity_days (user_id, day, saved_count)"
+                " SELECT %s, d::date, 1 FROM generate_series(%s::date, %s::date, '1 day') d"
+                " ON CONFLICT (user_id, day) DO NOTHING",
+                (user_id, today - timedelta(days=size - 1), today - timedelta(days=1)),
+            )
+            try:
+                listing = timed(lambda: len(conn.execute(
+                    "SELECT id FROM public.saved_devotionals WHERE user_id = %s", (user_id,)
+                ).fetchall()), repeat)
+                stats = timed(lambda: conn.execute(
+                    "SELECT * FROM public.get_user_stats(%s)", (user_id,)
+                ).fetchone(), repeat)
+                # A sequência cobre todo o histórico aqui (pior caso do percurso dia a dia)
+                streak = conn.execute("SELECT streak FROM public.get_user_stats(%s)", (user_id,)).fetchone()[0]
+                print(
+                    f"{size:>6} linhas | listagem {listing:7.2f} ms"
+                    f" | get_user_stats {stats:6.2f} ms (sequência de {streak} dias)"
+                )
+            finally:
+                conn.execute("DELETE FROM auth.users WHERE id = %s", (user_id,))
+                conn.execute("DELETE FROM public.devotional_bodies WHERE texto LIKE %s", (f"{user_id}:%",))
+
+def main(repeat: int = 50):
+    bench_postgrest(repeat)
+    database_url = os.getenv("TEST_DATABASE_URL")
+    if database_url:
+        bench_postgres(database_url, repeat)
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,43 @@
+"""
+Compara o extrator de referências bíblicas com o regex genérico antigo em saídas longas.
+
+Uso: python -m benchmarks.bench_verse_extraction [repetições]
+"""
+import re
+import sys
+import time
+from pathlib import Path
+
+from chains.bible_references import extract_verses
+
+FIXTURES = Path(__file__).resolve().parent.parent / "tests" / "fixtures" / "gemini_outputs"
+LEGACY_PATTERN = re.compile(r'([1-3]?\s*[A-ZÀ-Úa-zà-ú]+)\s+(\d+)[:]\s*(\d+)(?:\s*[-]\s*(\d+))?')
+
+def legacy_extract(text):
+    verses = []
+    for book, chapter, verse_start, verse_end in LEGACY_PATTERN.findall(text):
+        if verse_end:
+            verses.append(f"{book} {chapter}:{verse_start}-{verse_end}")
+        else:
+            verses.append(f"{book} {chapter}:{verse_start}")
+    return verses
+
+def bench(extractor, text, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = extractor(text)
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+def main(repeat: int = 20):
+    corpus = "\n".join(path.read_text(encoding="utf-8") for path in sorted(FIXTURES.iterdir()))
+    for copies in (1, 10, 100):
+        text = corpus * copies
+        legacy_ms, legacy = bench(legacy_extract, text, repeat)
+        index_ms, verses = bench(extract_verses, text, repeat)
+        print(
+            f"{len(text):>8} chars | regex antigo {legacy_ms:8.2f} ms, {len(legacy):5} itens ({len(set(legacy))} distintos)"
+            f" | índice {index_ms:8.2f} ms, {len(verses):3} referências"
+        )
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
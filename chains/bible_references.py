@@ -0,0 +1,358 @@
+import re
+import unicodedata
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Livros na ordem canônica: (id USFM, nome em português, apelidos, versículos por capítulo).
+# Nos livros numerados os apelidos vêm sem o número; os prefixos (1, 1ª, I...) são gerados.
+# A contagem segue a versificação da Almeida, igual à da KJV exceto em 3 João (15 versículos).
+BOOKS: Tuple[Tuple[str, str, Tuple[str, ...], Tuple[int, ...]], ...] = (
+    ("GEN", "Gênesis", ("gênesis", "gn", "gên"), (
+        31, 25, 24, 26, 32, 22, 24, 22, 29, 32, 32, 20, 18, 24, 21, 16, 27, 33, 38, 18, 34, 24, 20, 67,
+        34, 35, 46, 22, 35, 43, 55, 32, 20, 31, 29, 43, 36, 30, 23, 23, 57, 38, 34, 34, 28, 34, 31, 22,
+        33, 26
+    )),
+    ("EXO", "Êxodo", ("êxodo", "êx"), (
+        22, 25, 22, 31, 23, 30, 25, 32, 35, 29, 10, 51, 22, 31, 27, 36, 16, 27, 25, 26, 36, 31, 33, 18,
+        40, 37, 21, 43, 46, 38, 18, 35, 23, 35, 35, 38, 29, 31, 43, 38
+    )),
+    ("LEV", "Levítico", ("levítico", "lv", "lev"), (
+        17, 16, 17, 35, 19, 30, 38, 36, 24, 20, 47, 8, 59, 57, 33, 34, 16, 30, 37, 27, 24, 33, 44, 23,
+        55, 46, 34
+    )),
+    ("NUM", "Números", ("números", "nm", "núm"), (
+        54, 34, 51, 49, 31, 27, 89, 26, 23, 36, 35, 16, 33, 45, 41, 50, 13, 32, 22, 29, 35, 41, 30, 25,
+        18, 65, 23, 31, 40, 16, 54, 42, 56, 29, 34, 13
+    )),
+    ("DEU", "Deuteronômio", ("deuteronômio", "dt", "deut"), (
+        46, 37, 29, 49, 33, 25, 26, 20, 29, 22, 32, 32, 18, 29, 23, 22, 20, 22, 21, 20, 23, 30, 25, 22,
+        19, 19, 26, 68, 29, 20, 30, 52, 29, 12
+    )),
+    ("JOS", "Josué", ("josué", "js", "jos"), (
+        18, 24, 17, 24, 15, 27, 26, 35, 27, 43, 23, 24, 33, 15, 63, 10, 18, 28, 51, 9, 45, 34, 16, 33
+    )),
+    ("JDG", "Juízes", ("juízes", "jz"), (
+        36, 23, 31, 24, 31, 40, 25, 35, 57, 18, 40, 15, 25, 20, 20, 31, 13, 31, 30, 48, 25
+    )),
+    ("RUT", "Rute", ("rute", "rt"), (22, 23, 18, 22)),
+    ("1SA", "1 Samuel", ("samuel", "sm", "sam"), (
+        28, 36, 21, 22, 12, 21, 17, 22, 27, 27, 15, 25, 23, 52, 35, 23, 58, 30, 24, 42, 15, 23, 29, 22,
+        44, 25, 12, 25, 11, 31, 13
+    )),
+    ("2SA", "2 Samuel", ("samuel", "sm", "sam"), (
+        27, 32, 39, 12, 25, 23, 29, 18, 13, 19, 27, 31, 39, 33, 37, 23, 29, 33, 43, 26, 22, 51, 39, 25
+    )),
+    ("1KI", "1 Reis", ("reis", "rs"), (
+        53, 46, 28, 34, 18, 38, 51, 66, 28, 29, 43, 33, 34, 31, 34, 34, 24, 46, 21, 43, 29, 53
+    )),
+    ("2KI", "2 Reis", ("reis", "rs"), (
+        18, 25, 27, 44, 27, 33, 20, 29, 37, 36, 21, 21, 25, 29, 38, 20, 41, 37, 37, 21, 26, 20, 37, 20,
+        30
+    )),
+    ("1CH", "1 Crônicas", ("crônicas", "cr", "crôn"), (
+        54, 55, 24, 43, 26, 81, 40, 40, 44, 14, 47, 40, 14, 17, 29, 43, 27, 17, 19, 8, 30, 19, 32, 31,
+        31, 32, 34, 21, 30
+    )),
+    ("2CH", "2 Crônicas", ("crônicas", "cr", "crôn"), (
+        17, 18, 17, 22, 14, 42, 22, 18, 31, 19, 23, 16, 22, 15, 19, 14, 19, 34, 11, 37, 20, 12, 21, 27,
+        28, 23, 9, 27, 36, 27, 21, 33, 25, 33, 27, 23
+    )),
+    ("EZR", "Esdras", ("esdras", "ed", "esd"), (11, 70, 13, 24, 17, 22, 28, 36, 15, 44)),
+    ("NEH", "Neemias", ("neemias", "ne", "nee"), (11, 20, 32, 23, 19, 19, 73, 18, 38, 39, 36, 47, 31)),
+    ("EST", "Ester", ("ester", "et", "est"), (22, 23, 15, 17, 14, 14, 10, 17, 32, 3)),
+    ("JOB", "Jó", ("jó", "jb"), (
+        22, 13, 26, 21, 27, 30, 21, 22, 35, 22, 20, 25, 28, 22, 35, 22, 16, 21, 29, 29, 34, 30, 17, 25,
+        6, 14, 23, 28, 25, 31, 40, 22, 33, 37, 16, 33, 24, 41, 30, 24, 34, 17
+    )),
+    ("PSA", "Salmos", ("salmos", "salmo", "sl", "sal"), (
+        6, 12, 8, 8, 12, 10, 17, 9, 20, 18, 7, 8, 6, 7, 5, 11, 15, 50, 14, 9, 13, 31, 6, 10, 22, 12, 14,
+        9, 11, 12, 24, 11, 22, 22, 28, 12, 40, 22, 13, 17, 13, 11, 5, 26, 17, 11, 9, 14, 20, 23, 19, 9,
+        6, 7, 23, 13, 11, 11, 17, 12, 8, 12, 11, 10, 13, 20, 7, 35, 36, 5, 24, 20, 28, 23, 10, 12, 20,
+        72, 13, 19, 16, 8, 18, 12, 13, 17, 7, 18, 52, 17, 16, 15, 5, 23, 11, 13, 12, 9, 9, 5, 8, 28, 22,
+        35, 45, 48, 43, 13, 31, 7, 10, 10, 9, 8, 18, 19, 2, 29, 176, 7, 8, 9, 4, 8, 5, 6, 5, 6, 8, 8, 3,
+        18, 3, 3, 21, 26, 9, 8, 24, 13, 10, 7, 12, 15, 21, 10, 20, 14, 9, 6
+    )),
+    ("PRO", "Provérbios", ("provérbios", "pv", "prov"), (
+        33, 22, 35, 27, 23, 35, 27, 36, 18, 32, 31, 28, 25, 35, 33, 33, 28, 24, 29, 30, 31, 29, 35, 34,
+        28, 28, 27, 28, 27, 33, 31
+    )),
+    ("ECC", "Eclesiastes", ("eclesiastes", "ec", "ecl"), (18, 26, 22, 16, 20, 12, 29, 17, 18, 20, 10, 14)),
+    ("SNG", "Cantares", ("cantares", "cânticos", "cântico dos cânticos", "ct", "cant"), (
+        17, 17, 11, 16, 16, 13, 13, 14
+    )),
+    ("ISA", "Isaías", ("isaías", "is", "isa"), (
+        31, 22, 26, 6, 30, 13, 25, 22, 21, 34, 16, 6, 22, 32, 9, 14, 14, 7, 25, 6, 17, 25, 18, 23, 12,
+        21, 13, 29, 24, 33, 9, 20, 24, 17, 10, 22, 38, 22, 8, 31, 29, 25, 28, 28, 25, 13, 15, 22, 26,
+        11, 23, 15, 12, 17, 13, 12, 21, 14, 21, 22, 11, 12, 19, 12, 25, 24
+    )),
+    ("JER", "Jeremias", ("jeremias", "jr", "jer"), (
+        19, 37, 25, 31, 31, 30, 34, 22, 26, 25, 23, 17, 27, 22, 21, 21, 27, 23, 15, 18, 14, 30, 40, 10,
+        38, 24, 22, 17, 32, 24, 40, 44, 26, 22, 19, 32, 21, 28, 18, 16, 18, 22, 13, 30, 5, 28, 7, 47,
+        39, 46, 64, 34
+    )),
+    ("LAM", "Lamentações", ("lamentações", "lm", "lam"), (22, 22, 66, 22, 22)),
+    ("EZK", "Ezequiel", ("ezequiel", "ez", "ezq"), (
+        28, 10, 27, 17, 17, 14, 27, 18, 11, 22, 25, 28, 23, 23, 8, 63, 24, 32, 14, 49, 32, 31, 49, 27,
+        17, 21, 36, 26, 21, 26, 18, 32, 33, 31, 15, 38, 28, 23, 29, 49, 26, 20, 27, 31, 25, 24, 23, 35
+    )),
+    ("DAN", "Daniel", ("daniel", "dn", "dan"), (21, 49, 30, 37, 31, 28, 28, 27, 27, 21, 45, 13)),
+    ("HOS", "Oséias", ("oséias", "os"), (11, 23, 5, 19, 15, 11, 16, 14, 17, 15, 12, 14, 16, 9)),
+    ("JOL", "Joel", ("joel", "jl"), (20, 32, 21)),
+    ("AMO", "Amós", ("amós", "am"), (15, 16, 15, 13, 27, 14, 17, 14, 15)),
+    ("OBA", "Obadias", ("obadias", "ob", "obd"), (21,)),
+    ("JON", "Jonas", ("jonas", "jn"), (17, 10, 10, 11)),
+    ("MIC", "Miquéias", ("miquéias", "mq"), (16, 13, 12, 13, 15, 16, 20)),
+    ("NAM", "Naum", ("naum", "na"), (15, 13, 19)),
+    ("HAB", "Habacuque", ("habacuque", "hc", "hab"), (17, 20, 19)),
+    ("ZEP", "Sofonias", ("sofonias", "sf", "sof"), (18, 15, 20)),
+    ("HAG", "Ageu", ("ageu", "ag"), (15, 23)),
+    ("ZEC", "Zacarias", ("zacarias", "zc", "zac"), (21, 13, 10, 14, 11, 15, 14, 23, 17, 12, 17, 14, 9, 21)),
+    ("MAL", "Malaquias", ("malaquias", "ml", "mal"), (14, 17, 18, 6)),
+    ("MAT", "Mateus", ("mateus", "mt", "mat"), (
+        25, 23, 17, 25, 48, 34, 29, 34, 38, 42, 30, 50, 58, 36, 39, 28, 27, 35, 30, 34, 46, 46, 39, 51,
+        46, 75, 66, 20
+    )),
+    ("MRK", "Marcos", ("marcos", "mc", "mar"), (
+        45, 28, 35, 41, 43, 56, 37, 38, 50, 52, 33, 44, 37, 72, 47, 20
+    )),
+    ("LUK", "Lucas", ("lucas", "lc", "luc"), (
+        80, 52, 38, 44, 39, 49, 50, 56, 62, 42, 54, 59, 35, 35, 32, 31, 37, 43, 48, 47, 38, 71, 56, 53
+    )),
+    ("JHN", "João", ("joão", "jo"), (
+        51, 25, 36, 54, 47, 71, 53, 59, 41, 42, 57, 50, 38, 31, 27, 33, 26, 40, 42, 31, 25
+    )),
+    ("ACT", "Atos", ("atos", "at"), (
+        26, 47, 26, 37, 42, 15, 60, 40, 43, 48, 30, 25, 52, 28, 41, 40, 34, 28, 41, 38, 40, 30, 35, 27,
+        27, 32, 44, 31
+    )),
+    ("ROM", "Romanos", ("romanos", "rm", "rom"), (
+        32, 29, 31, 25, 21, 23, 25, 39, 33, 21, 36, 21, 14, 23, 33, 27
+    )),
+    ("1CO", "1 Coríntios", ("coríntios", "co", "cor"), (
+        31, 16, 23, 21, 13, 20, 40, 13, 27, 33, 34, 31, 13, 40, 58, 24
+    )),
+    ("2CO", "2 Coríntios", ("coríntios", "co", "cor"), (
+        24, 17, 18, 18, 21, 18, 16, 24, 15, 18, 33, 21, 14
+    )),
+    ("GAL", "Gálatas", ("gálatas", "gl", "gál"), (24, 21, 29, 31, 26, 18)),
+    ("EPH", "Efésios", ("efésios", "ef", "efé"), (23, 22, 21, 32, 33, 24)),
+    ("PHP", "Filipenses", ("filipenses", "fp", "fl", "fil", "flp"), (30, 30, 21, 23)),
+    ("COL", "Colossenses", ("colossenses", "cl", "col"), (29, 23, 25, 18)),
+    ("1TH", "1 Tessalonicenses", ("tessalonicenses", "ts", "tes"), (10, 20, 13, 18, 28)),
+    ("2TH", "2 Tessalonicenses", ("tessalonicenses", "ts", "tes"), (12, 17, 18)),
+    ("1TI", "1 Timóteo", ("timóteo", "tm", "tim"), (20, 15, 16, 16, 25, 21)),
+    ("2TI", "2 Timóteo", ("timóteo", "tm", "tim"), (18, 26, 17, 22)),
+    ("TIT", "Tito", ("tito", "tt", "tit"), (16, 15, 15)),
+    ("PHM", "Filemom", ("filemom", "filemon", "fm", "flm"), (25,)),
+    ("HEB", "Hebreus", ("hebreus", "hb", "heb"), (14, 18, 19, 16, 14, 20, 28, 13, 28, 39, 40, 29, 25)),
+    ("JAS", "Tiago", ("tiago", "tg"), (27, 26, 18, 17, 20)),
+    ("1PE", "1 Pedro", ("pedro", "pe", "pd", "ped"), (25, 25, 22, 19, 14)),
+    ("2PE", "2 Pedro", ("pedro", "pe", "pd", "ped"), (21, 22, 18)),
+    ("1JN", "1 João", ("joão", "jo"), (10, 29, 24, 21, 21)),
+    ("2JN", "2 João", ("joão", "jo"), (13,)),
+    ("3JN", "3 João", ("joão", "jo"), (15,)),
+    ("JUD", "Judas", ("judas", "jd"), (25,)),
+    ("REV", "Apocalipse", ("apocalipse", "ap", "apoc"), (
+        20, 29, 22, 11, 14, 17, 17, 13, 21, 11, 19, 17, 18, 20, 8, 21, 18, 24, 21, 15, 27, 21
+    )),
+)
+
+# Abreviações que também são palavras comuns; só valem seguidas de capítulo:versículo
+AMBIGUOUS_ALIASES = {"os", "na", "am", "at", "is", "ed", "et", "ne", "ag", "ex"}
+
+_ORDINALS = {1: ("1", "1ª", "1a", "1º", "1o", "i"), 2: ("2", "2ª", "2a", "2º", "2o", "ii"), 3: ("3", "3ª", "3a", "3º", "3o", "iii")}
+
+BOOK_NAMES: Dict[str, str] = {book_id: name for book_id, name, _, _ in BOOKS}
+VERSE_COUNTS: Dict[str, Tuple[int, ...]] = {book_id: counts for book_id, _, _, counts in BOOKS}
+
+def _strip_accents(text: str) -> str:
+    return "".join(char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char))
+
+def _alias_key(text: str) -> str:
+    return "".join(text.lower().split())
+
+def _book_aliases(name: str, aliases: Tuple[str, ...]) -> List[str]:
+    if not name[0].isdigit():
+        return list(aliases)
+    return [f"{prefix} {alias}" for prefix in _ORDINALS[int(name[0])] for alias in aliases]
+
+def _build_aliases() -> Dict[str, str]:
+    index: Dict[str, str] = {}
+    for book_id, name, aliases, _ in BOOKS:
+        for alias in _book_aliases(name, aliases):
+            index.setdefault(alias, book_id)
+    # Formas sem acento só entram se não colidirem com um apelido explícito ("jo" é João, não Jó)
+    for alias, book_id in list(index.items()):
+        index.setdefault(_strip_accents(alias), book_id)
+    return index
+
+# Espaço sem quebra de linha: referências não continuam na linha seguinte (ex.: listas "- 2 Timóteo")
+_SPACE = r"[^\S\n]*"
+_DASH = _SPACE + "[-–]" + _SPACE
+
+def _numbered_book_pattern() -> str:
+    aliases = {alias for _, name, book_aliases, _ in BOOKS if name[0].isdigit() for alias in book_aliases}
+    aliases |= {_strip_accents(alias) for alias in aliases}
+    return "|".join(re.escape(alias) for alias in sorted(aliases, key=len, reverse=True))
+
+# Um 1, 2 ou 3 seguido do nome de um livro numerado e de capítulo pertence à próxima
+# referência ("Rm 8:28, 2 Co 5:17", "Sl 23:1-2ª Tm 1:7"); outros números terminam a faixa
+_NOT_A_BOOK = (
+    r"(?!(?<=(?<!\d)[1-3])" + _SPACE + r"[ªºao]?" + _SPACE +
+    r"(?:" + _numbered_book_pattern() + r")\.?" + _SPACE + r"\d)"
+)
+
+def _trie_pattern(node: Dict[str, dict]) -> str:
+    branches = [
+        (r"\s*" if char == " " else re.escape(char)) + _trie_pattern(child)
+        for char, child in sorted(node.items()) if char
+    ]
+    if not branches:
+        return ""
+    pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    # Fim de apelido no meio da trie: o restante é opcional e o regex tenta o mais longo primeiro
+    return f"(?:{pattern})?" if "" in node else pattern
+
+def _compile_reference_regex(aliases: List[str]) -> "re.Pattern":
+    trie: Dict[str, dict] = {}
+    for alias in aliases:
+        node = trie
+        for char in alias:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    return re.compile(
+        r"(?<!\w)(?P<book>" + _trie_pattern(trie) + r")\.?" + _SPACE +
+        r"(?P<chapter>\d{1,3})"
+        r"(?:(?:" + _SPACE + ":" + _SPACE + r"|\.)(?P<verse>\d{1,3})"
+        r"(?:" + _DASH + r"(?:(?P<end_chapter>\d{1,3})" + _SPACE + ":" + _SPACE + r")?(?P<end_verse>\d{1,3})" + _NOT_A_BOOK + ")?"
+        r"(?P<more>(?:" + _SPACE + "[,;]" + _SPACE + r"(?:\d{1,3}" + _SPACE + ":" + _SPACE + r")?\d{1,3}"
+        r"(?:" + _DASH + r"\d{1,3})?(?!" + _SPACE + ":)" + _NOT_A_BOOK + ")*)"
+        r")?(?!\d)",
+        re.IGNORECASE,
+    )
+
+_ALIASES = _build_aliases()
+ALIAS_INDEX: Dict[str, str] = {_alias_key(alias): book_id for alias, book_id in _ALIASES.items()}
+_REFERENCE_RE = _compile_reference_regex(list(_ALIASES))
+_LIST_ITEM_RE = re.compile(r"(?:(\d{1,3})\s*:\s*)?(\d{1,3})(?:\s*[-–]\s*(\d{1,3}))?")
+
+class BibleReference(NamedTuple):
+    """Canonical reference: book id, chapter and an optional verse range"""
+    book: str
+    chapter: int
+    verse: Optional[int] = None
+    end_chapter: Optional[int] = None
+    end_verse: Optional[int] = None
+
+    @property
+    def name(self) -> str:
+        return BOOK_NAMES[self.book]
+
+    @property
+    def label(self) -> str:
+        """Portuguese form stored in devotionals.versiculos, e.g. "Salmos 23:1-4" """
+        return f"{self.name} {self._span(':')}"
+
+    @property
+    def canonical(self) -> str:
+        """Locale-independent id for lookups and analytics, e.g. "PSA.23.1-4" """
+        return f"{self.book}.{self._span('.')}"
+
+    def _span(self, separator: str) -> str:
+        if self.verse is None:
+            return str(self.chapter)
+        span = f"{self.chapter}{separator}{self.verse}"
+        if self.end_chapter is not None:
+            return f"{span}-{self.end_chapter}{separator}{self.end_verse}"
+        if self.end_verse is not None:
+            return f"{span}-{self.end_verse}"
+        return span
+
+def chapter_count(book: str) -> int:
+    return len(VERSE_COUNTS[book])
+
+def verse_count(book: str, chapter: int) -> int:
+    counts = VERSE_COUNTS[book]
+    return counts[chapter - 1] if 1 <= chapter <= len(counts) else 0
+
+def make_reference(
+    book: str,
+    chapter: int,
+    verse: Optional[int] = None,
+    end_chapter: Optional[int] = None,
+    end_verse: Optional[int] = None,
+) -> Optional[BibleReference]:
+    """Build a normalized reference, or None if it does not exist in the book"""
+    if not verse_count(book, chapter):
+        return None
+    if verse is None:
+        return BibleReference(book, chapter)
+    if not 1 <= verse <= verse_count(book, chapter):
+        return None
+
+    if end_chapter == chapter:
+        end_chapter = None
+    if end_chapter is not None:
+        if end_chapter < chapter or end_verse is None or not 1 <= end_verse <= verse_count(book, end_chapter):
+            return None
+    elif end_verse is not None:
+        if end_verse < verse or end_verse > verse_count(book, chapter):
+            return None
+        if end_verse == verse:
+            end_verse = None
+    return BibleReference(book, chapter, verse, end_chapter, end_verse)
+
+def _accepts(match: "re.Match", key: str) -> bool:
+    written = match.group("book")
+    if match.group("verse") is None:
+        # Capítulo sozinho só com o nome do livro em maiúscula e sem ambiguidade
+        return (written[0].isupper() or written[0].isdigit()) and key not in AMBIGUOUS_ALIASES
+    # Abreviação em minúscula ("sl 23:1") costuma ser falso positivo; nomes completos passam
+    return not written[0].islower() or sum(char.isalpha() for char in key) > 3
+
+def _match_references(match: "re.Match") -> List[Optional[BibleReference]]:
+    book = ALIAS_INDEX[_alias_key(match.group("book"))]
+    chapter = int(match.group("chapter"))
+    verse = match.group("verse")
+    if verse is None:
+        # Em livros de um capítulo só, "Judas 24" cita o versículo
+        if chapter > 1 and chapter_count(book) == 1:
+            return [make_reference(book, 1, chapter)]
+        return [make_reference(book, chapter)]
+
+    end_chapter, end_verse = match.group("end_chapter"), match.group("end_verse")
+    references = [make_reference(
+        book, chapter, int(verse),
+        int(end_chapter) if end_chapter else None,
+        int(end_verse) if end_verse else None,
+    )]
+    if end_chapter:
+        chapter = int(end_chapter)
+
+    # Listas como "João 3:16, 18; 4:1-2" herdam o livro e, sem capítulo explícito, o capítulo anterior
+    for item in _LIST_ITEM_RE.finditer(match.group("more") or ""):
+        item_chapter, item_verse, item_end = item.groups()
+        if item_chapter:
+            chapter = int(item_chapter)
+        references.append(make_reference(book, chapter, int(item_verse), None, int(item_end) if item_end else None))
+    return references
+
+def find_references(text: str) -> List[BibleReference]:
+    """Find the valid Bible references in the text, deduplicated in order of appearance
+
+    Book names and abbreviations are matched in a single pass by a regex
+    compiled from a trie of every known alias; chapter and verse numbers are
+    then validated against the verse counts of the book.
+    """
+    references: Dict[BibleReference, None] = {}
+    for match in _REFERENCE_RE.finditer(text):
+        if not _accepts(match, _alias_key(match.group("book"))):
+            continue
+        for reference in _match_references(match):
+            if reference is not None:
+                references.setdefault(reference, None)
+    return list(references)
+
+def extract_verses(text: str) -> List[str]:
+    """Canonical Portuguese labels of the references found in the text"""
+    return [reference.label for reference in find_references(text)]
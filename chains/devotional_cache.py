@@ -0,0 +1,267 @@
+import os
+import re
+import copy
+import json
+import time
+import zlib
+import random
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from services.metrics import metrics
+
+# Palavras que não mudam o sentimento descrito ("estou", "me sinto", ...)
+FILLER_WORDS = {
+    "eu", "estou", "esta", "to", "tou", "me", "sinto", "sentindo", "ando", "fico",
+    "ficando", "hoje", "muito", "um", "uma", "pouco", "meio", "bastante", "tao",
+    "com", "de", "do", "da", "dos", "das", "o", "a", "os", "as", "e", "em", "no", "na",
+    "nos", "nas", "por", "pra", "para", "que", "meu", "minha", "meus", "minhas",
+}
+NEGATION_WORDS = {"nao", "nunca", "nem", "sem"}
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Parâmetros do MinHash/LSH (8 bandas x 4 linhas)
+NGRAM_SIZE = 3
+LSH_BANDS = 8
+LSH_ROWS = 4
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1337)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(LSH_BANDS * LSH_ROWS)
+]
+
+def _fold_word(word: str) -> str:
+    """Fold plural and feminine endings so 'ansiosa'/'ansiosos' match 'ansioso'"""
+    if len(word) > 3 and word.endswith("s"):
+        word = word[:-1]
+    if len(word) > 3 and word.endswith("a"):
+        word = word[:-1] + "o"
+    return word
+
+def normalize_feeling(sentimento: str) -> str:
+    """Normalize accents, case, punctuation and filler words of a feeling"""
+    text = unicodedata.normalize("NFKD", sentimento)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = _PUNCTUATION_RE.sub(" ", text.lower())
+    words = _WHITESPACE_RE.sub(" ", text).strip().split(" ")
+    words = [word for word in words if word]
+
+    # Se só houver palavras de preenchimento, mantém o texto original normalizado
+    meaningful = [word for word in words if word not in FILLER_WORDS] or words
+
+    return " ".join(_fold_word(word) for word in meaningful)
+
+def _ngrams(key: str) -> Set[str]:
+    padded = f" {key} "
+    if len(padded) <= NGRAM_SIZE:
+        return {padded}
+    return {padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1)}
+
+def _minhash(grams: Set[str]) -> List[int]:
+    hashes = [zlib.crc32(gram.encode("utf-8")) for gram in grams]
+    return [min((a * value + b) % _MERSENNE_PRIME for value in hashes) for a, b in _PERMUTATIONS]
+
+def _bands(signature: List[int]) -> List[Tuple[int, Tuple[int, ...]]]:
+    return [
+        (band, tuple(signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]))
+        for band in range(LSH_BANDS)
+    ]
+
+def _negations(key: str) -> Set[str]:
+    return {word for word in key.split(" ") if word in NEGATION_WORDS}
+
+class _CacheEntry:
+    __slots__ = ("key", "grams", "bands", "variants", "cursor", "size")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.grams = _ngrams(key)
+        self.bands = _bands(_minhash(self.grams))
+        self.variants: List[Tuple[float, Dict[str, Any], int]] = []
+        self.cursor = 0
+        self.size = 0
+
+class DevotionalCache:
+    """LRU/TTL cache of generated devotionals keyed by the normalized feeling"""
+
+    def __init__(
+        self,
+        ttl_seconds: float = 86400,
+        max_entries: int = 1000,
+        max_bytes: int = 20 * 1024 * 1024,
+        variants_per_key: int = 3,
+        similarity_threshold: float = 0.75,
+        enabled: bool = True,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.variants_per_key = max(1, variants_per_key)
+        self.similarity_threshold = similarity_threshold
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[str]] = {}
+        self._aliases: Dict[str, str] = {}
+        self._bytes = 0
+        # Contados por instância; as métricas globais somam todos os caches do processo
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "DevotionalCache":
+        """Build the cache from DEVOTIONAL_CACHE_* environment variables"""
+        return cls(
+            ttl_seconds=float(os.getenv("DEVOTIONAL_CACHE_TTL_SECONDS", "86400")),
+            max_entries=int(os.getenv("DEVOTIONAL_CACHE_MAX_ENTRIES", "1000")),
+            max_bytes=int(os.getenv("DEVOTIONAL_CACHE_MAX_BYTES", str(20 * 1024 * 1024))),
+            variants_per_key=int(os.getenv("DEVOTIONAL_CACHE_VARIANTS", "3")),
+            similarity_threshold=float(os.getenv("DEVOTIONAL_CACHE_SIMILARITY", "0.75")),
+            enabled=os.getenv("DEVOTIONAL_CACHE_ENABLED", "true").lower() == "true",
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, sentimento: str) -> Optional[Dict[str, Any]]:
+        """Return a cached variant for the feeling, or None on a miss
+
+        While a key still has fewer than `variants_per_key` variants the lookup
+        is a miss, so the pool fills up before being served in rotation.
+        """
+        if not self.enabled:
+            return None
+
+        key = normalize_feeling(sentimento)
+        with self._lock:
+            entry, match = self._find(key)
+            if entry is not None:
+                self._drop_expired(entry)
+
+            if entry is None or len(entry.variants) < self.variants_per_key:
+                self._misses += 1
+                metrics.increment("devotional_cache_requests", result="miss")
+                return None
+
+            self._entries.move_to_end(entry.key)
+            variant = entry.variants[entry.cursor % len(entry.variants)][1]
+            entry.cursor += 1
+            self._hits += 1
+            metrics.increment("devotional_cache_requests", result=f"hit_{match}")
+            return copy.deepcopy(variant)
+
+    def put(self, sentimento: str, devotional: Dict[str, Any]) -> None:
+        """Store a freshly generated devotional as a variant of its key"""
+        if not self.enabled:
+            return
+
+        key = normalize_feeling(sentimento)
+        size = len(json.dumps(devotional, ensure_ascii=False).encode("utf-8"))
+        with self._lock:
+            entry, _ = self._find(key)
+            if entry is None:
+                entry = self._insert(key)
+            elif entry.key != key:
+                self._aliases[key] = entry.key
+
+            self._drop_expired(entry)
+            entry.variants.append((time.monotonic(), copy.deepcopy(devotional), size))
+            entry.size += size
+            self._bytes += size
+
+            # Mantém apenas as variantes mais recentes
+            while len(entry.variants) > self.variants_per_key:
+                _, _, dropped = entry.variants.pop(0)
+                entry.size -= dropped
+                self._bytes -= dropped
+
+            self._entries.move_to_end(entry.key)
+            self._evict()
+            metrics.set_gauge("devotional_cache_entries", len(self._entries))
+            metrics.set_gauge("devotional_cache_bytes", self._bytes)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._aliases.clear()
+            self._bytes = 0
+            self._hits = 0
+            self._misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        hits, misses = self._hits, self._misses
+        total = hits + misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / total if total else 0.0,
+        }
+
+    def _find(self, key: str) -> Tuple[Optional[_CacheEntry], Optional[str]]:
+        """Exact lookup first, then LSH candidates verified by n-gram Jaccard"""
+        canonical = self._aliases.get(key, key)
+        entry = self._entries.get(canonical)
+        if entry is not None:
+            return entry, "exact"
+        self._aliases.pop(key, None)
+
+        grams = _ngrams(key)
+        negations = _negations(key)
+        candidates: Set[str] = set()
+        for band in _bands(_minhash(grams)):
+            candidates.update(self._buckets.get(band, ()))
+
+        best, best_score = None, self.similarity_threshold
+        for candidate_key in candidates:
+            candidate = self._entries[candidate_key]
+            # "triste" e "nao triste" nunca são equivalentes
+            if _negations(candidate_key) != negations:
+                continue
+            score = len(grams & candidate.grams) / len(grams | candidate.grams)
+            if score >= best_score:
+                best, best_score = candidate, score
+
+        if best is None:
+            return None, None
+        return best, "near"
+
+    def _insert(self, key: str) -> _CacheEntry:
+        entry = _CacheEntry(key)
+        self._entries[key] = entry
+        for band in entry.bands:
+            self._buckets.setdefault(band, set()).add(key)
+        return entry
+
+    def _remove(self, entry: _CacheEntry) -> None:
+        self._entries.pop(entry.key, None)
+        self._bytes -= entry.size
+        for band in entry.bands:
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(entry.key)
+                if not bucket:
+                    del self._buckets[band]
+
+    def _drop_expired(self, entry: _CacheEntry) -> None:
+        now = time.monotonic()
+        fresh = [variant for variant in entry.variants if now - variant[0] < self.ttl_seconds]
+        if len(fresh) != len(entry.variants):
+            expired_size = entry.size - sum(variant[2] for variant in fresh)
+            metrics.increment("devotional_cache_evictions", len(entry.variants) - len(fresh), reason="ttl")
+            entry.variants = fresh
+            entry.size -= expired_size
+            self._bytes -= expired_size
+
+    def _evict(self) -> None:
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, oldest = next(iter(self._entries.items()))
+            self._remove(oldest)
+            metrics.increment("devotional_cache_evictions", reason="lru")
@@ -2,11 +2,27 @@ import os
 import asyncio
 import google.generativeai as genai
 from dotenv import load_dotenv
-import json
-import re
-from typing import Dict, Any, List
-import threading
-import queue
+import time
+from typing import Dict, Any, List, Optional, AsyncIterator
+
+from chains.devotional_cache import DevotionalCache, normalize_feeling
+from chains.single_flight import SingleFlight
+from chains.warm_pool import WarmPool
+from services.admission import AdmissionController, AdmissionRejected, SUBSCRIBER_LANE, FREE_LANE
+from services.call_policy import CallPolicy
+from services.circuit_breaker import CircuitBreaker, CircuitOpen
+from chains.section_parser import DevotionalSectionParser, parse_sections
+from chains.bible_references import extract_verses
+from chains.fallback_library import FallbackLibrary
+from chains.llm_providers import DEFAULT_GENERATION_CONFIG, ModelRouter, ModelTier, Route
+from chains.structured_output import (
+    DEVOTIONAL_RESPONSE_SCHEMA,
+    JSON_FORMAT_INSTRUCTIONS,
+    DevotionalOutput,
+    parse_structured_output,
+)
+from services.metrics import metrics
+from services.llm_usage import llm_usage, usage_from_response, finish_reason_from_response, SYSTEM_TIER
 
 # Carregando variáveis de ambiente
 load_dotenv()
@@ -17,16 +33,8 @@ genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 class DevotionalChain:
     def __init__(self):
         """Initialize the DevotionalChain with Gemini model"""
-        # Configure the model
-        self.model_name = "gemini-2.0-flash"
-        self.model = genai.GenerativeModel(
-            model_name=self.model_name,
-            generation_config={
-                "temperature": 0.7,
-                "top_p": 0.95,
-                "max_output_tokens": 1024,
-            }
-        )
+        # Níveis de modelo (provedores criados uma única vez) e roteamento entre eles
+        self.router = ModelRouter.from_env(DEFAULT_GENERATION_CONFIG)
         
         # Create the prompt template
         self.template = """
@@ -59,260 +67,399 @@ Estilo e tom:
 Importante:
 - Todo o conteúdo deve girar em torno do versículo chave selecionado.
 
-Formate sua resposta para que eu possa facilmente extrair as seguintes informações em um formato JSON:
-- texto: o texto completo do devocional
-- versiculos: lista de versículos citados (com referência)
-- reflexao: a reflexão principal do devocional
-- oracao: a oração final
+Use exatamente os títulos numerados acima, em negrito (ex.: **Devocional:**), para separar as seções.
 """
+        
+        # Saída estruturada: JSON validado pelo esquema de resposta do Gemini
+        self.structured_output = os.getenv("DEVOTIONAL_STRUCTURED_OUTPUT", "true").lower() == "true"
+        self.json_template = self.template.replace(
+            "Use exatamente os títulos numerados acima, em negrito (ex.: **Devocional:**), para separar as seções.\n",
+            JSON_FORMAT_INSTRUCTIONS
+        )
+        self.structured_generation_config = {
+            **DEFAULT_GENERATION_CONFIG,
+            "response_mime_type": "application/json",
+            "response_schema": DEVOTIONAL_RESPONSE_SCHEMA,
+        }
+        
+        # Cache de respostas por sentimento normalizado
+        self.cache = DevotionalCache.from_env()
+        
+        # Coalescência de gerações idênticas em andamento
+        self.single_flight = SingleFlight("devotional")
+        
+        # Controle de admissão das chamadas ao modelo (fila com prioridade para assinantes)
+        self.admission = AdmissionController.from_env()
+        
+        # Disjuntor do modelo e biblioteca de devocionais usada enquanto ele estiver aberto
+        self.breaker = CircuitBreaker.from_env("gemini")
+        self.fallback_library = FallbackLibrary()
+        
+        # Prazo, retries com orçamento e hedging das chamadas ao modelo
+        self.call_policy = CallPolicy.from_env(breaker=self.breaker)
+        
+        # Pool de devocionais pré-gerados para os sentimentos mais frequentes,
+        # reabastecido apenas quando há folga nas chamadas ao modelo
+        self.warm_pool = WarmPool.from_env(
+            self._generate_for_warm_pool,
+            has_capacity=lambda: self.admission.queue_depth() == 0
+                and self.admission.in_flight < max(1, self.admission.max_in_flight // 2)
+                and not self.breaker.is_open
+        )
+    
+    @property
+    def model(self):
+        """Provider of the default model tier"""
+        return self.router.default.provider
+    
+    @model.setter
+    def model(self, provider):
+        self.router.default.provider = provider
+    
+    @property
+    def model_name(self) -> str:
+        return self.router.default.model_name
     
-    async def generate_devotional_async(self, sentimento: str) -> dict:
-        """Generate a devotional based on the user's feeling with retry mechanism"""
+    @staticmethod
+    def _routing(model_tier: ModelTier, route: Route) -> Dict[str, str]:
+        # Gravado em cada devocional para comparar latência e qualidade entre níveis
+        return {"modelo": model_tier.model_name, "nivel_modelo": model_tier.name, "motivo_roteamento": route.reason}
+    
+    async def generate_devotional_async(self, sentimento: str, user_id: Optional[str] = None, subscriber: bool = False, endpoint: str = "direct", wait: bool = False) -> dict:
+        """Generate a devotional, serving repeated feelings from the response cache
+        
+        Only calls that reach the model go through admission control; callers
+        joining an identical in-flight generation do not take another slot.
+        While the circuit breaker is open, or when a generation fails because
+        it opened, a devotional from the fallback library is returned instead.
+        Background jobs pass wait=True to queue for a slot instead of being
+        rejected by the per-user limit or a full queue.
+        """
+        start = time.perf_counter()
+        
+        pooled = self.warm_pool.take(sentimento)
+        if pooled is not None:
+            metrics.observe("devotional_generation_seconds", time.perf_counter() - start, source="pool")
+            return pooled
+        
+        cached = self.cache.get(sentimento)
+        if cached is not None:
+            metrics.observe("devotional_generation_seconds", time.perf_counter() - start, source="cache")
+            return cached
+        
+        if self.breaker.is_open:
+            return self._fallback(sentimento, start)
+        
+        key = normalize_feeling(sentimento)
+        tier = SUBSCRIBER_LANE if subscriber else FREE_LANE
+        
+        async def generate() -> dict:
+            # A vaga é tomada dentro da geração compartilhada: se o líder for
+            # cancelado (cliente desconectado), ela só é liberada quando o modelo termina
+            async with self.admission.slot(user_id, subscriber, wait):
+                return await self._generate_and_cache(sentimento, endpoint, tier)
+        
+        try:
+            devotional = await self.single_flight.do(key, generate)
+        except AdmissionRejected:
+            raise
+        except CircuitOpen:
+            # Recusada pelo disjuntor (aberto, ou meio-aberto com a chamada de teste em uso)
+            return self._fallback(sentimento, start)
+        except Exception:
+            if self.breaker.is_open:
+                return self._fallback(sentimento, start)
+            raise
+        metrics.observe("devotional_generation_seconds", time.perf_counter() - start, source="model")
+        return devotional
+    
+    def _fallback(self, sentimento: str, start: float) -> dict:
+        devotional = self.fallback_library.get(sentimento)
+        metrics.observe("devotional_generation_seconds", time.perf_counter() - start, source="fallback")
+        return devotional
+    
+    def _section_events(self, devotional: Dict[str, Any]) -> List[Dict[str, Any]]:
+        parser = DevotionalSectionParser()
+        return [
+            {"event": "section", "data": {"secao": name, "conteudo": content}}
+            for name, content in parser.feed(devotional["texto"]) + parser.finish()
+        ]
+    
+    async def _generate_and_cache(self, sentimento: str, endpoint: str, tier: str) -> dict:
+        devotional = await self.generate_devotional_uncached(sentimento, endpoint=endpoint, tier=tier)
+        self.cache.put(sentimento, devotional)
+        return devotional
+    
+    async def _generate_for_warm_pool(self, sentimento: str) -> dict:
+        """Generate a pooled devotional through the same admission limiter
+        
+        Refills take a free-lane slot like any anonymous request, so they
+        never run beyond max_in_flight and are rejected when the queue is full.
+        """
+        async with self.admission.slot(None, False):
+            return await self.generate_devotional_uncached(sentimento, endpoint="warm_pool")
+    
+    async def generate_devotional_uncached(self, sentimento: str, endpoint: str = "direct", tier: str = SYSTEM_TIER) -> dict:
+        """Generate a devotional based on the user's feeling with retry mechanism
+        
+        The model tier is picked by the router; an attempt that fails moves
+        to the next tier. Every call is recorded in the LLM usage tracker
+        under the given endpoint and user tier, and the devotional records
+        the tier that produced it.
+        """
         # Format the prompt with the user's feeling
-        prompt = self.template.format(sentimento=sentimento)
+        if self.structured_output:
+            prompt = self.json_template.format(sentimento=sentimento)
+            request_options = {"generation_config": self.structured_generation_config}
+        else:
+            prompt = self.template.format(sentimento=sentimento)
+            request_options = {}
         
-        # Configurações de retry
-        max_retries = 5
-        retry_delay = 2  # segundos
-        timeout = 60  # segundos por tentativa
+        route = self.router.route(sentimento, tier)
+        calls = 0
+        failures = 0
         
-        for attempt in range(1, max_retries + 1):
+        async def attempt():
+            nonlocal calls, failures
+            model_tier = route.tier_for(failures)
+            print(f"Chamando o modelo {model_tier.model_name} para gerar devocional...")
+            metrics.increment("llm_calls")
+            calls += 1
+            attempt_start = time.perf_counter()
             try:
-                print(f"Tentativa {attempt} de gerar devocional...")
-                
-                # Gerar o conteúdo de forma assíncrona
-                response = await self.model.generate_content_async(prompt)
-                result = response.text
-                
-                print(f"Devocional gerado com sucesso na tentativa {attempt}")
+                response = await model_tier.provider.generate_content_async(prompt, **request_options)
+            except Exception:
+                failures += 1
+                self.router.record_failover(model_tier, route.tier_for(failures))
+                raise
+            model_tier.observe(time.perf_counter() - attempt_start)
+            return model_tier, response
+        
+        # Prazo total, tempo limite por tentativa, retries limitados pelo orçamento e hedging
+        start = time.perf_counter()
+        usage = {"model": route.primary.model_name, "endpoint": endpoint, "tier": tier}
+        try:
+            model_tier, response = await self.call_policy.call(attempt)
+            result = response.text
+        except CircuitOpen:
+            # Nenhuma chamada foi feita: o chamador serve a biblioteca de contingência
+            raise
+        except asyncio.TimeoutError:
+            llm_usage.record(latency=time.perf_counter() - start, retries=max(0, calls - 1), error=True, **usage)
+            raise Exception(f"Tempo esgotado ao gerar o devocional (prazo de {self.call_policy.deadline:g}s)")
+        except Exception as e:
+            llm_usage.record(latency=time.perf_counter() - start, retries=max(0, calls - 1), error=True, **usage)
+            raise Exception(f"Erro ao gerar devocional: {str(e)}")
+        
+        # Sem streaming, o primeiro token chega junto com a resposta inteira
+        latency = time.perf_counter() - start
+        usage["model"] = model_tier.model_name
+        llm_usage.record(
+            latency=latency,
+            ttft=latency,
+            retries=max(0, calls - 1),
+            finish_reason=finish_reason_from_response(response),
+            **usage_from_response(response),
+            **usage
+        )
+        
+        # Extract structured data from the result
+        devotional = self.extract_structured_data(result, sentimento)
+        devotional.update(self._routing(model_tier, route))
+        return devotional
+    
+    async def stream_devotional_async(self, sentimento: str, user_id: Optional[str] = None, subscriber: bool = False, endpoint: str = "stream") -> AsyncIterator[Dict[str, Any]]:
+        """Stream a devotional as token, section and done events
+        
+        Sections are emitted as soon as the heading of the next one arrives.
+        The final "done" event carries the same dict returned by
+        generate_devotional_async.
+        """
+        start = time.perf_counter()
+        
+        cached, source = self.warm_pool.take(sentimento), "pool"
+        if cached is None:
+            cached, source = self.cache.get(sentimento), "cache"
+        if cached is None and self.breaker.is_open:
+            cached, source = self.fallback_library.get(sentimento), "fallback"
+        if cached is not None:
+            for event in self._section_events(cached):
+                yield event
+            metrics.observe("devotional_generation_seconds", time.perf_counter() - start, source=source)
+            yield {"event": "done", "data": cached}
+            return
+        
+        prompt = self.template.format(sentimento=sentimento)
+        policy = self.call_policy
+        started = time.monotonic()
+        policy.budget.record_request()
+        retry_delay = policy.retry_delay
+        fallback = None
+        user_tier = SUBSCRIBER_LANE if subscriber else FREE_LANE
+        route = self.router.route(sentimento, user_tier)
+        usage = {"model": route.primary.model_name, "endpoint": endpoint, "tier": user_tier}
+        model_started = time.perf_counter()
+        ttft = None
+        last_chunk = None
+        
+        async with self.admission.slot(user_id, subscriber):
+            for attempt in range(1, policy.max_attempts + 1):
+                parser = DevotionalSectionParser()
+                emitted = False
+                # Cada nova tentativa vem depois de uma falha e passa ao próximo nível de modelo
+                model_tier = route.tier_for(attempt - 1)
+                usage["model"] = model_tier.model_name
+                # Mesmo controle das chamadas sem streaming: no meio-aberto só a chamada de teste segue
+                if not self.breaker.allow():
+                    fallback = self.fallback_library.get(sentimento)
+                    break
+                attempt_start = time.perf_counter()
+                try:
+                    print(f"Tentativa {attempt} de gerar devocional com {model_tier.model_name} (streaming)...")
+                    metrics.increment("llm_calls")
+                    # Sem hedging no streaming: o limite por tentativa cobre o início da resposta
+                    response = await asyncio.wait_for(
+                        model_tier.provider.generate_content_async(prompt, stream=True),
+                        min(policy.attempt_timeout, policy.remaining(started))
+                    )
+                    chunks = response.__aiter__()
                 
-                # Extract structured data from the result
-                parsed_result = self.extract_structured_data(result, sentimento)
+                    while True:
+                        # Cada chunk espera no máximo o que resta do prazo da requisição:
+                        # um stream parado no meio não segura a vaga de admissão
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), max(policy.remaining(started), 0))
+                        except StopAsyncIteration:
+                            break
+                        # O último chunk traz usage_metadata e o motivo de término
+                        last_chunk = chunk
+                        try:
+                            text = chunk.text
+                        except ValueError:
+                            # Chunk sem texto (ex.: apenas metadados)
+                            continue
+                        if not text:
+                            continue
+                    
+                        if not emitted:
+                            metrics.observe("devotional_ttfb_seconds", time.perf_counter() - start)
+                            ttft = time.perf_counter() - model_started
+                            emitted = True
+                        yield {"event": "token", "data": {"texto": text}}
+                        for name, content in parser.feed(text):
+                            yield {"event": "section", "data": {"secao": name, "conteudo": content}}
                 
-                return parsed_result
-            except asyncio.TimeoutError:
-                print(f"Timeout na tentativa {attempt} de {max_retries}")
-                if attempt < max_retries:
-                    # Esperar antes de tentar novamente
+                    for name, content in parser.finish():
+                        yield {"event": "section", "data": {"secao": name, "conteudo": content}}
+                    self.breaker.record_success()
+                    model_tier.observe(time.perf_counter() - attempt_start)
+                    llm_usage.record(
+                        latency=time.perf_counter() - model_started,
+                        ttft=ttft,
+                        retries=attempt - 1,
+                        finish_reason=finish_reason_from_response(last_chunk),
+                        **usage_from_response(last_chunk),
+                        **usage
+                    )
+                    break
+                except Exception as e:
+                    print(f"Erro na tentativa {attempt}: {e}")
+                    self.breaker.record_failure("timeout" if isinstance(e, asyncio.TimeoutError) else "error")
+                    if not emitted and self.breaker.is_open:
+                        llm_usage.record(latency=time.perf_counter() - model_started, retries=attempt - 1, error=True, **usage)
+                        fallback = self.fallback_library.get(sentimento)
+                        break
+                    # Depois que o cliente recebeu tokens não é possível recomeçar
+                    if emitted or not policy.can_retry(attempt, started, retry_delay):
+                        llm_usage.record(latency=time.perf_counter() - model_started, ttft=ttft, retries=attempt - 1, error=True, **usage)
+                        raise Exception(f"Erro ao gerar devocional após {attempt} tentativas: {str(e)}")
+                    self.router.record_failover(model_tier, route.tier_for(attempt))
                     await asyncio.sleep(retry_delay)
-                    # Aumentar o delay para a próxima tentativa
                     retry_delay *= 1.5
-                else:
-                    raise Exception(f"Tempo esgotado após {max_retries} tentativas de gerar o devocional")
-            except Exception as e:
-                print(f"Erro na tentativa {attempt}: {e}")
-                # Se for o último retry, propagar o erro
-                if attempt == max_retries:
-                    raise Exception(f"Erro ao gerar devocional após {max_retries} tentativas: {str(e)}")
-                # Esperar antes de tentar novamente
-                await asyncio.sleep(retry_delay)
-                # Aumentar o delay para a próxima tentativa
-                retry_delay *= 1.5
+        
+        if fallback is not None:
+            for event in self._section_events(fallback):
+                yield event
+            metrics.observe("devotional_generation_seconds", time.perf_counter() - start, source="fallback")
+            yield {"event": "done", "data": fallback}
+            return
+        
+        devotional = self.build_devotional(parser.text, parser.sections, sentimento)
+        devotional.update(self._routing(model_tier, route))
+        self.cache.put(sentimento, devotional)
+        metrics.observe("devotional_generation_seconds", time.perf_counter() - start, source="model")
+        yield {"event": "done", "data": devotional}
     
-    # Função síncrona que gera o devocional usando abordagem de thread separada com queue para retornar resultado
-    def generate_devotional_sync(self, sentimento: str) -> Dict[str, Any]:
-        """Generate devotional in a synchronous way using a separate thread"""
-        result_queue = queue.Queue()
-        error_queue = queue.Queue()
-        
-        # Função para executar em uma thread separada
-        def run_in_thread():
-            try:
-                # Criar um novo event loop para a thread
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                try:
-                    # Executar a coroutine e colocar o resultado na fila
-                    result = loop.run_until_complete(self.generate_devotional_async(sentimento))
-                    result_queue.put(result)
-                finally:
-                    # Finalizar tarefas pendentes e fechar o loop
-                    pending = asyncio.all_tasks(loop)
-                    for task in pending:
-                        task.cancel()
-                    
-                    if pending:
-                        # Executar até que todas as tarefas sejam canceladas
-                        loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
-                    
-                    loop.close()
-            except Exception as e:
-                # Colocar o erro na fila de erros
-                error_queue.put(e)
-        
-        # Criar e iniciar a thread
-        thread = threading.Thread(target=run_in_thread)
-        thread.start()
-        thread.join()  # Esperar a thread terminar
-        
-        # Verificar se houve erro
-        if not error_queue.empty():
-            raise error_queue.get()
-        
-        # Obter o resultado da fila
-        if not result_queue.empty():
-            return result_queue.get()
-        
-        # Se não tiver resultado nem erro, usar método síncrono como fallback
-        print("Usando fallback síncrono para gerar devocional")
-        model = genai.GenerativeModel(
-            model_name=self.model_name,
-            generation_config={
-                "temperature": 0.7,
-                "top_p": 0.95,
-                "max_output_tokens": 1024,
-            }
-        )
-        prompt = self.template.format(sentimento=sentimento)
-        response = model.generate_content(prompt)
-        result = response.text
-        return self.extract_structured_data(result, sentimento)
+    def build_devotional(self, text: str, sections: Dict[str, str], sentimento: str) -> Dict[str, Any]:
+        """Build the devotional dict from incrementally parsed sections"""
+        if "devocional" not in sections and "oracao" not in sections:
+            # Resposta fora do formato de seções (ex.: JSON)
+            return self.extract_structured_data(text, sentimento)
+        
+        return {
+            "texto": text,
+            "versiculos": self.extract_verses_from_text(text),
+            "reflexao": sections.get("devocional", ""),
+            "oracao": sections.get("oracao", "")
+        }
     
     def extract_structured_data(self, text: str, sentimento: str) -> Dict[str, Any]:
-        """Extract structured data from the devotional text"""
-        try:
-            # Try to extract JSON if present
-            json_str = self.extract_json_from_text(text)
-            try:
-                devotional_data = json.loads(json_str)
-                
-                # Ensure all required fields are present
-                required_fields = ["texto", "versiculos", "reflexao", "oracao"]
-                for field in required_fields:
-                    if field not in devotional_data:
-                        devotional_data[field] = ""
-                
-                # Ensure versiculos is a list
-                if not isinstance(devotional_data["versiculos"], list):
-                    devotional_data["versiculos"] = [devotional_data["versiculos"]]
-                
-                return devotional_data
-            except json.JSONDecodeError:
-                # If JSON parsing fails, use heuristic parsing
-                pass
-        except Exception:
-            # Continue with heuristic parsing if any error occurs
-            pass
+        """Extract structured data from the devotional text
         
-        # Extract structured data using heuristics
-        return self.extract_devotional_from_text(text)
-    
-    def extract_json_from_text(self, text: str) -> str:
-        """Extract JSON from text that may contain other information"""
-        # Look for JSON patterns
-        json_start = text.find('{')
-        json_end = text.rfind('}')
-        
-        if json_start >= 0 and json_end >= 0:
-            json_text = text[json_start:json_end+1]
-            return json_text
-        
-        # If no JSON format found, return the original text
-        return text
+        Validated JSON (repaired when near-valid) is preferred; plain text
+        falls back to the single-pass section parser.
+        """
+        start = time.perf_counter()
+        output, mode = parse_structured_output(text)
+        
+        if isinstance(output, DevotionalOutput):
+            texto = output.to_text()
+            devotional = output.to_devotional(self.extract_verses_from_text(texto))
+        elif output is not None:
+            devotional = {
+                "texto": output.texto,
+                "versiculos": self.extract_verses_from_text("\n".join(output.versiculos)) or output.versiculos,
+                "reflexao": output.reflexao,
+                "oracao": output.oracao
+            }
+        else:
+            mode = "sections"
+            devotional = self.extract_devotional_from_text(text)
+        
+        metrics.increment("devotional_parse_results", mode=mode)
+        metrics.observe("devotional_parse_seconds", time.perf_counter() - start, mode=mode)
+        return devotional
     
     def extract_devotional_from_text(self, text: str) -> Dict[str, Any]:
         """Extract devotional information from unstructured text"""
-        lines = text.split("\n")
-        texto = text
-        versiculos = self.extract_verses_from_text(text)
-        reflexao = ""
-        oracao = ""
-        
-        # Extract reflection and prayer using simple heuristics
-        in_oracao = False
-        for i, line in enumerate(lines):
-            line_lower = line.lower()
-            
-            # Identify prayer section
-            if "oração final" in line_lower or "oremos" in line_lower or "vamos orar" in line_lower:
-                in_oracao = True
-                oracao = "\n".join(lines[i:])
-                break
-        
-        # If no prayer section identified, use the last few lines
-        if not oracao:
-            for i, line in enumerate(lines):
-                if "oração" in line.lower():
-                    oracao = "\n".join(lines[i:])
-                    break
-            
-            # If still no prayer found, use last lines
-            if not oracao and len(lines) > 3:
-                oracao = "\n".join(lines[-3:])
-        
-        # Extract reflection (look for "Devocional" or "Reflexão" headers)
-        for i, line in enumerate(lines):
-            if "devocional:" in line.lower() or "reflexão:" in line.lower() or "**devocional:**" in line.lower():
-                # Find end of reflection (next section)
-                end_idx = len(lines)
-                for j in range(i+1, len(lines)):
-                    if "**aplicação" in lines[j].lower() or "**oração" in lines[j].lower():
-                        end_idx = j
-                        break
-                
-                reflexao = "\n".join(lines[i+1:end_idx])
-                break
-        
-        # If no reflection found, use a middle section of text
-        if not reflexao:
-            if len(lines) > 10:
-                # Try to find a reasonable section in the middle
-                for i, line in enumerate(lines):
-                    if i > len(lines) // 3 and i < (2 * len(lines) // 3):
-                        if len(line) > 50:  # Long line likely part of main content
-                            reflexao = line
-                            break
-            
-            # If still no reflection, use a chunk from the middle
-            if not reflexao:
-                third = len(lines) // 3
-                reflexao = "\n".join(lines[third:2*third])
+        sections = parse_sections(text)
+        
+        # Sem cabeçalho de reflexão, usa a seção mais longa encontrada
+        reflexao = sections.get("devocional") or max(sections.values(), key=len, default=text)
         
         return {
-            "texto": texto,
-            "versiculos": versiculos,
+            "texto": text,
+            "versiculos": self.extract_verses_from_text(text),
             "reflexao": reflexao,
-            "oracao": oracao
+            "oracao": sections.get("oracao", "")
         }
     
     def extract_verses_from_text(self, text: str) -> List[str]:
-        """Extract biblical references from text"""
-        # Pattern for common Bible references
-        pattern = r'([1-3]?\s*[A-ZÀ-Úa-zà-ú]+)\s+(\d+)[:]\s*(\d+)(?:\s*[-]\s*(\d+))?'
-        
-        matches = re.findall(pattern, text)
-        verses = []
-        
-        for match in matches:
-            book, chapter, verse_start, verse_end = match
-            
-            if verse_end:
-                verses.append(f"{book} {chapter}:{verse_start}-{verse_end}")
-            else:
-                verses.append(f"{book} {chapter}:{verse_start}")
-        
-        return verses
+        """Extract canonical biblical references from text"""
+        return extract_verses(text)
 
 # Create a singleton instance
 devotional_chain_instance = DevotionalChain()
 
 # Função assíncrona para ser usada em contextos assíncronos (como FastAPI)
-async def generate_devotional_async(sentimento: str) -> Dict[str, Any]:
+async def generate_devotional_async(sentimento: str, user_id: Optional[str] = None, subscriber: bool = False, endpoint: str = "direct", wait: bool = False) -> Dict[str, Any]:
     """
     Async function for use in async contexts like FastAPI
     """
-    return await devotional_chain_instance.generate_devotional_async(sentimento)
+    return await devotional_chain_instance.generate_devotional_async(sentimento, user_id=user_id, subscriber=subscriber, endpoint=endpoint, wait=wait)
 
-def generate_devotional(sentimento: str) -> Dict[str, Any]:
+def stream_devotional_async(sentimento: str, user_id: Optional[str] = None, subscriber: bool = False, endpoint: str = "stream") -> AsyncIterator[Dict[str, Any]]:
     """
-    Synchronous function for backward compatibility
+    Async generator of streaming events (token, section, done)
     """
-    try:
-        # Tentar o método síncrono com thread separada
-        return devotional_chain_instance.generate_devotional_sync(sentimento)
-    except Exception as e:
-        # Format and re-raise the exception with a helpful message
-        error_message = str(e)
-        print(f"Erro ao gerar devocional: {error_message}")
-        raise Exception(f"Erro ao gerar devocional: {error_message}") 
\ No newline at end of file
+    return devotional_chain_instance.stream_devotional_async(sentimento, user_id=user_id, subscriber=subscriber, endpoint=endpoint)
@@ -0,0 +1,88 @@
+import copy
+import json
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from chains.bible_references import extract_verses
+from chains.devotional_cache import NEGATION_WORDS, normalize_feeling
+from chains.structured_output import DevotionalOutput
+from services.metrics import metrics
+
+DEFAULT_LIBRARY_PATH = Path(__file__).parent / "data" / "fallback_devotionals.json"
+DEFAULT_CATEGORY = "geral"
+
+# Palavras-chave curtas ("dor", "bem") só valem como palavra inteira; as demais como prefixo
+_EXACT_KEYWORD_LENGTH = 3
+
+class FallbackLibrary:
+    """Curated, pre-approved devotionals served while the model is unavailable
+
+    Entries are stored in the structured output schema and grouped by feeling
+    category. Keyword prefixes are indexed once at load time, so classifying a
+    feeling only looks up the prefixes of its normalized words. Devotionals of
+    a category are handed out in rotation and carry "fallback": True so
+    handlers can skip the usage quota.
+    """
+
+    def __init__(self, path: Path = DEFAULT_LIBRARY_PATH):
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        if DEFAULT_CATEGORY not in data:
+            raise ValueError(f"Biblioteca de contingência sem a categoria '{DEFAULT_CATEGORY}'")
+
+        self._devotionals: Dict[str, List[Dict[str, Any]]] = {}
+        self._negated: Dict[str, str] = {}
+        self._keywords: Dict[str, List[str]] = defaultdict(list)
+        self._cursor: Counter = Counter()
+
+        for category, entry in data.items():
+            devotionals = [self._build(DevotionalOutput(**item)) for item in entry["devocionais"]]
+            if not devotionals:
+                raise ValueError(f"Categoria '{category}' sem devocionais")
+            self._devotionals[category] = devotionals
+            if entry.get("se_negado"):
+                self._negated[category] = entry["se_negado"]
+            for keyword in entry.get("palavras", []):
+                self._keywords[keyword].append(category)
+
+    @property
+    def categories(self) -> List[str]:
+        return list(self._devotionals)
+
+    @staticmethod
+    def _build(output: DevotionalOutput) -> Dict[str, Any]:
+        texto = output.to_text()
+        devotional = output.to_devotional(extract_verses(texto))
+        if not devotional["reflexao"] or not devotional["oracao"] or not devotional["versiculos"]:
+            raise ValueError("Devocional de contingência incompleto")
+        devotional["fallback"] = True
+        return devotional
+
+    def _word_categories(self, word: str) -> List[str]:
+        categories = list(self._keywords.get(word, []))
+        for end in range(_EXACT_KEYWORD_LENGTH + 1, len(word)):
+            categories.extend(self._keywords.get(word[:end], []))
+        return categories
+
+    def category(self, sentimento: str) -> str:
+        """Classify the feeling into a library category"""
+        words = normalize_feeling(sentimento).split()
+        scores: Counter = Counter()
+        for word in words:
+            scores.update(self._word_categories(word))
+        if not scores:
+            return DEFAULT_CATEGORY
+
+        category = scores.most_common(1)[0][0]
+        # "não estou feliz" não deve receber o devocional de alegria
+        if any(word in NEGATION_WORDS for word in words):
+            category = self._negated.get(category, category)
+        return category
+
+    def get(self, sentimento: str, category: Optional[str] = None) -> Dict[str, Any]:
+        category = category or self.category(sentimento)
+        devotionals = self._devotionals.get(category) or self._devotionals[DEFAULT_CATEGORY]
+        index = self._cursor[category] % len(devotionals)
+        self._cursor[category] += 1
+        metrics.increment("fallback_devotionals", category=category)
+        return copy.deepcopy(devotionals[index])
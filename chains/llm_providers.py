@@ -0,0 +1,325 @@
+import os
+import json
+import random
+import asyncio
+import hashlib
+import time
+from collections import deque
+from types import SimpleNamespace
+from typing import Dict, Any, List, Optional, NamedTuple
+
+import google.generativeai as genai
+
+from services.admission import SUBSCRIBER_LANE, FREE_LANE
+from services.metrics import metrics, _percentile
+
+DEFAULT_GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "max_output_tokens": 1024,
+}
+DEFAULT_MODEL_TIERS = "standard=gemini:gemini-2.0-flash"
+
+# Motivos da escolha do nível de modelo, gravados em cada devocional
+DEFAULT_REASON = "default"
+USER_TIER_REASON = "user_tier"
+SHORT_INPUT_REASON = "short_input"
+LATENCY_REASON = "latency"
+PROBE_REASON = "probe"
+
+class GeminiProvider:
+    """Google Gemini model, created once and reused by every request"""
+
+    kind = "gemini"
+
+    def __init__(self, model_name: str, generation_config: Optional[Dict[str, Any]] = None):
+        self.model_name = model_name
+        self._model = genai.GenerativeModel(
+            model_name=model_name,
+            generation_config=generation_config or DEFAULT_GENERATION_CONFIG,
+        )
+
+    async def generate_content_async(self, prompt: str, stream: bool = False, **kwargs):
+        return await self._model.generate_content_async(prompt, stream=stream, **kwargs)
+
+    def generate_content(self, prompt: str, **kwargs):
+        return self._model.generate_content(prompt, **kwargs)
+
+class _FakeStream:
+    def __init__(self, chunks: List[Any], delay: float):
+        self.chunks = chunks
+        self.delay = delay
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(self.delay)
+            yield chunk
+
+class FakeProvider:
+    """Deterministic local model for load tests and development
+
+    Answers every prompt with the same devotional (as JSON when the request
+    asks for the structured schema, as sectioned text otherwise) after a
+    simulated latency. Jitter is drawn from a seeded generator, so a run is
+    reproducible. Responses carry usage_metadata and a finish reason like
+    the Gemini SDK ones.
+    """
+
+    kind = "fake"
+
+    def __init__(self, model_name: str = "fake-devotional", latency: float = 0.0, jitter: float = 0.0, seed: int = 0, chunks: int = 8):
+        self.model_name = model_name
+        self.latency = latency
+        self.jitter = jitter
+        self.chunks = max(1, chunks)
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    @staticmethod
+    def _feeling(prompt: str) -> str:
+        marker = 'Sentimento: "'
+        start = prompt.find(marker)
+        if start < 0:
+            return ""
+        start += len(marker)
+        return prompt[start:prompt.find('"', start)]
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def _content(self, prompt: str, structured: bool) -> str:
+        feeling = self._feeling(prompt)
+        # Variação determinística do versículo conforme o sentimento
+        verses = ["Filipenses 4:6-7", "Salmos 23:1-4", "Isaías 41:10", "Mateus 11:28"]
+        verse = verses[int(hashlib.sha1(feeling.encode("utf-8")).hexdigest(), 16) % len(verses)]
+        data = {
+            "saudacao": f"Obrigado por compartilhar que você se sente {feeling}.",
+            "versiculos_chave": [verse],
+            "devocional": f"Nós podemos entregar a Deus o que sentimos hoje, como nos lembra {verse}.",
+            "aplicacao": "Separe alguns minutos hoje para orar e descansar na Palavra.",
+            "oracao": "Senhor, entregamos a ti o nosso coração. Amém.",
+            "aprofundamento": ["Salmos 46:1", "1 Pedro 5:7"],
+        }
+        if structured:
+            return json.dumps(data, ensure_ascii=False)
+        return (
+            f"{data['saudacao']}\n\n1. **Versículo(s) chave:** {verse}\n\n"
+            f"2. **Devocional:**\n{data['devocional']}\n\n3. **Aplicação prática:** {data['aplicacao']}\n\n"
+            f"4. **Oração final:**\n{data['oracao']}\n\n5. **Aprofundamento:**\n" + "\n".join(data["aprofundamento"])
+        )
+
+    @staticmethod
+    def _response(text: str, prompt: str, usage: bool = True) -> SimpleNamespace:
+        if not usage:
+            return SimpleNamespace(text=text, usage_metadata=None, candidates=[])
+        prompt_tokens, output_tokens = len(prompt) // 4, len(text) // 4
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=output_tokens,
+                total_token_count=prompt_tokens + output_tokens,
+            ),
+            candidates=[SimpleNamespace(finish_reason=SimpleNamespace(name="STOP"))],
+        )
+
+    async def generate_content_async(self, prompt: str, stream: bool = False, generation_config: Optional[Dict[str, Any]] = None, **kwargs):
+        self.calls += 1
+        structured = (generation_config or {}).get("response_mime_type") == "application/json"
+        text = self._content(prompt, structured)
+        if stream:
+            size = -(-len(text) // self.chunks)
+            parts = [text[i:i + size] for i in range(0, len(text), size)]
+            # Só o último chunk traz a contagem de tokens, como no Gemini
+            chunks = [self._response(part, prompt, usage=i == len(parts) - 1) for i, part in enumerate(parts)]
+            return _FakeStream(chunks, self._delay() / len(chunks))
+        await asyncio.sleep(self._delay())
+        return self._response(text, prompt)
+
+    def generate_content(self, prompt: str, **kwargs):
+        self.calls += 1
+        time.sleep(self._delay())
+        return self._response(self._content(prompt, False), prompt)
+
+PROVIDERS = {
+    GeminiProvider.kind: lambda model_name, generation_config: GeminiProvider(model_name, generation_config),
+    FakeProvider.kind: lambda model_name, generation_config: FakeProvider(
+        model_name,
+        latency=float(os.getenv("LLM_FAKE_LATENCY_SECONDS", "0.5")),
+        jitter=float(os.getenv("LLM_FAKE_JITTER_SECONDS", "0")),
+    ),
+}
+
+class ModelTier:
+    """A named model tier (e.g. "standard", "lite") served by one provider
+
+    Latency samples older than max_age seconds are discarded, so a tier that
+    stopped receiving traffic after turning slow is not judged forever by
+    its old samples.
+    """
+
+    def __init__(self, name: str, model_name: str, provider: Any, window: int = 200, max_age: float = 300.0):
+        self.name = name
+        self.model_name = model_name
+        self.provider = provider
+        self.max_age = max_age
+        self._latencies: deque = deque(maxlen=window)
+
+    def observe(self, latency: float) -> None:
+        self._latencies.append((time.monotonic(), latency))
+
+    def latency_percentile(self, percentile: float, min_samples: int) -> Optional[float]:
+        if self.max_age > 0:
+            oldest = time.monotonic() - self.max_age
+            while self._latencies and self._latencies[0][0] < oldest:
+                self._latencies.popleft()
+        if len(self._latencies) < min_samples:
+            return None
+        return _percentile(sorted(latency for _, latency in self._latencies), percentile)
+
+class Route(NamedTuple):
+    tiers: List[ModelTier]
+    reason: str
+
+    @property
+    def primary(self) -> ModelTier:
+        return self.tiers[0]
+
+    def tier_for(self, failures: int) -> ModelTier:
+        """Tier for the next attempt, moving down the failover list after each failure"""
+        return self.tiers[min(failures, len(self.tiers) - 1)]
+
+class ModelRouter:
+    """Choose the model tier of each request and the order to fail over
+
+    Rules are applied in order: a tier configured for the user tier
+    (subscriber or free), then the short-input tier for feelings up to
+    short_input_chars, then the default tier. When latency_threshold is
+    set and the chosen tier's recent latency percentile is above it, the
+    fastest tier below the threshold is used instead, and a probe_ratio
+    fraction of requests goes to a tier not known to be fast (too slow or
+    without enough recent samples) so its latency keeps being measured.
+    The remaining tiers follow in configuration order as failover targets.
+    """
+
+    def __init__(
+        self,
+        tiers: List[ModelTier],
+        default: Optional[str] = None,
+        user_tiers: Optional[Dict[str, str]] = None,
+        short_input_tier: Optional[str] = None,
+        short_input_chars: int = 0,
+        latency_threshold: float = 0.0,
+        latency_percentile: float = 90,
+        min_samples: int = 20,
+        probe_ratio: float = 0.0,
+        failover: bool = True,
+    ):
+        if not tiers:
+            raise ValueError("É necessário pelo menos um nível de modelo")
+        self.tiers = {tier.name: tier for tier in tiers}
+        self.default = self.tiers[default or tiers[0].name]
+        self.user_tiers = {user_tier: name for user_tier, name in (user_tiers or {}).items() if name}
+        self.short_input_tier = short_input_tier or None
+        self.short_input_chars = short_input_chars
+        self.latency_threshold = latency_threshold
+        self.latency_percentile = latency_percentile
+        self.min_samples = min_samples
+        self.probe_ratio = probe_ratio
+        self.failover = failover
+        self._random = random.Random()
+        for name in [*self.user_tiers.values(), self.short_input_tier]:
+            if name and name not in self.tiers:
+                raise ValueError(f"Nível de modelo desconhecido: {name}")
+
+    @classmethod
+    def from_env(cls, generation_config: Optional[Dict[str, Any]] = None, **kwargs) -> "ModelRouter":
+        """Build the tiers and routing rules from LLM_MODEL_TIERS and LLM_ROUTE_* variables
+
+        LLM_MODEL_TIERS lists "name=provider:model" entries separated by commas,
+        e.g. "standard=gemini:gemini-2.0-flash,lite=gemini:gemini-2.0-flash-lite".
+        """
+        tiers = []
+        max_age = float(os.getenv("LLM_ROUTE_LATENCY_WINDOW_SECONDS", "300"))
+        for entry in os.getenv("LLM_MODEL_TIERS", DEFAULT_MODEL_TIERS).split(","):
+            if not entry.strip():
+                continue
+            name, spec = entry.strip().split("=", 1)
+            kind, model_name = spec.split(":", 1)
+            if kind not in PROVIDERS:
+                raise ValueError(f"Provedor de modelo desconhecido: {kind}")
+            tiers.append(ModelTier(name, model_name, PROVIDERS[kind](model_name, generation_config), max_age=max_age))
+
+        return cls(
+            tiers,
+            default=os.getenv("LLM_DEFAULT_TIER") or None,
+            user_tiers={
+                SUBSCRIBER_LANE: os.getenv("LLM_ROUTE_SUBSCRIBER_TIER", ""),
+                FREE_LANE: os.getenv("LLM_ROUTE_FREE_TIER", ""),
+            },
+            short_input_tier=os.getenv("LLM_ROUTE_SHORT_INPUT_TIER") or None,
+            short_input_chars=int(os.getenv("LLM_ROUTE_SHORT_INPUT_CHARS", "0")),
+            latency_threshold=float(os.getenv("LLM_ROUTE_LATENCY_THRESHOLD_SECONDS", "0")),
+            probe_ratio=float(os.getenv("LLM_ROUTE_PROBE_RATIO", "0.05")),
+            failover=os.getenv("LLM_ROUTE_FAILOVER", "true").lower() == "true",
+            **kwargs,
+        )
+
+    def _by_latency(self, tier: ModelTier) -> Optional[ModelTier]:
+        latency = tier.latency_percentile(self.latency_percentile, self.min_samples)
+        if latency is None or latency <= self.latency_threshold:
+            return None
+        candidates = []
+        for other in self.tiers.values():
+            other_latency = other.latency_percentile(self.latency_percentile, self.min_samples)
+            if other is not tier and other_latency is not None and other_latency <= self.latency_threshold:
+                candidates.append((other_latency, other.name, other))
+        return min(candidates)[2] if candidates else None
+
+    def _probe(self, tier: ModelTier) -> Optional[ModelTier]:
+        """A tier not known to be fast, for a probe_ratio fraction of requests"""
+        if self.probe_ratio <= 0 or self._random.random() >= self.probe_ratio:
+            return None
+        unknown = []
+        for other in self.tiers.values():
+            latency = other.latency_percentile(self.latency_percentile, self.min_samples)
+            if other is not tier and (latency is None or latency > self.latency_threshold):
+                unknown.append(other)
+        return self._random.choice(unknown) if unknown else None
+
+    def route(self, sentimento: str, user_tier: Optional[str] = None) -> Route:
+        """Pick the tier for a request; the following tiers are failover targets"""
+        if user_tier in self.user_tiers:
+            tier, reason = self.tiers[self.user_tiers[user_tier]], USER_TIER_REASON
+        elif self.short_input_tier and len(sentimento.strip()) <= self.short_input_chars:
+            tier, reason = self.tiers[self.short_input_tier], SHORT_INPUT_REASON
+        else:
+            tier, reason = self.default, DEFAULT_REASON
+
+        if self.latency_threshold > 0:
+            faster = self._by_latency(tier)
+            if faster is not None:
+                tier, reason = faster, LATENCY_REASON
+            probe = self._probe(tier)
+            if probe is not None:
+                tier, reason = probe, PROBE_REASON
+
+        tiers = [tier]
+        if self.failover:
+            tiers += [other for other in self.tiers.values() if other is not tier]
+        metrics.increment("llm_routes", model_tier=tier.name, reason=reason)
+        return Route(tiers, reason)
+
+    def record_failover(self, source: ModelTier, target: ModelTier) -> None:
+        if source is not target:
+            print(f"Failover do nível de modelo {source.name} para {target.name}")
+            metrics.increment("llm_failovers", source=source.name, target=target.name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "model": tier.model_name,
+                "latency_p90": tier.latency_percentile(90, 1),
+            }
+            for name, tier in self.tiers.items()
+        }
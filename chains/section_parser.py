@@ -0,0 +1,111 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Seções do devocional, na ordem em que o prompt pede que apareçam
+GREETING_SECTION = "saudacao"
+SECTION_TITLES = [
+    ("versiculo_chave", r"vers[ií]culos?(?:\s*\(s\))?\s+chaves?"),
+    ("devocional", r"devocional|reflex[ãa]o"),
+    ("aplicacao", r"aplica[çc][ãa]o(?:\s+pr[áa]tica)?"),
+    ("oracao", r"ora[çc][ãa]o(?:\s+final)?"),
+    ("aprofundamento", r"aprofundamento|para\s+aprofundar"),
+]
+SECTION_ORDER = [GREETING_SECTION] + [name for name, _ in SECTION_TITLES]
+
+_TITLES = "|".join(f"(?P<{name}>{pattern})" for name, pattern in SECTION_TITLES)
+# Cabeçalhos como "**Devocional:**", "1. **Versículo(s) chave:** texto", "## Oração Final"
+_HEADING_RE = re.compile(
+    r"^\s*(?:#{1,6}\s*)?(?:\d+[.)]\s*)?(?P<bold>\*\*)?\s*(?:" + _TITLES + r")(?!\w)"
+    r"\s*(?P<colon>:)?\s*(?:\*\*)?\s*(?P<trailing_colon>:)?\s*(?P<rest>.*?)\s*$",
+    re.IGNORECASE,
+)
+
+def match_heading(line: str) -> Optional[Tuple[str, str]]:
+    """Return (section, rest of line) if the line is a section heading"""
+    match = _HEADING_RE.match(line)
+    if not match:
+        return None
+
+    rest = match.group("rest")
+    # Sem negrito nem dois-pontos, só é cabeçalho se o título ocupar a linha inteira
+    if rest and not (match.group("bold") or match.group("colon") or match.group("trailing_colon")):
+        return None
+
+    for name, _ in SECTION_TITLES:
+        if match.group(name):
+            return name, rest
+    return None
+
+class DevotionalSectionParser:
+    """Single-pass, incremental parser that splits a devotional into its sections
+
+    Text can be fed in arbitrary chunks (e.g. streamed tokens). Only complete
+    lines are inspected, and each section is reported as soon as the heading
+    of the next one shows up. Headings are accepted only in forward order, so
+    a stray "Oração:" inside the reflection does not restart the structure.
+    """
+
+    def __init__(self):
+        self.sections: Dict[str, str] = {}
+        self._current = GREETING_SECTION
+        self._lines: List[str] = []
+        self._buffer = ""
+        self._text: List[str] = []
+
+    @property
+    def text(self) -> str:
+        return "".join(self._text)
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        """Consume a chunk and return the sections completed by it"""
+        self._text.append(chunk)
+        self._buffer += chunk
+        completed = []
+
+        *lines, self._buffer = self._buffer.split("\n")
+        for line in lines:
+            section = self._consume_line(line)
+            if section is not None:
+                completed.append(section)
+        return completed
+
+    def finish(self) -> List[Tuple[str, str]]:
+        """Flush the pending line and return the last open section"""
+        completed = []
+        if self._buffer:
+            section = self._consume_line(self._buffer)
+            if section is not None:
+                completed.append(section)
+            self._buffer = ""
+
+        section = self._close_current()
+        if section is not None:
+            completed.append(section)
+        return completed
+
+    def _consume_line(self, line: str) -> Optional[Tuple[str, str]]:
+        heading = match_heading(line)
+        if heading is not None and SECTION_ORDER.index(heading[0]) > SECTION_ORDER.index(self._current):
+            closed = self._close_current()
+            self._current = heading[0]
+            if heading[1].strip():
+                self._lines.append(heading[1])
+            return closed
+
+        self._lines.append(line)
+        return None
+
+    def _close_current(self) -> Optional[Tuple[str, str]]:
+        content = "\n".join(self._lines).strip()
+        self._lines = []
+        if not content or self._current in self.sections:
+            return None
+        self.sections[self._current] = content
+        return self._current, content
+
+def parse_sections(text: str) -> Dict[str, str]:
+    """Split a complete devotional text into its sections in one pass"""
+    parser = DevotionalSectionParser()
+    parser.feed(text)
+    parser.finish()
+    return parser.sections
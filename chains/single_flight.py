@@ -0,0 +1,67 @@
+import asyncio
+import copy
+from typing import Any, Awaitable, Callable, Dict, Set
+
+from services.metrics import metrics
+
+class SingleFlight:
+    """Coalesce concurrent calls that share the same key into one execution
+
+    The first caller for a key starts the work in its own task; every caller,
+    including the first, awaits a shielded shared future. Cancelling one caller
+    therefore never cancels the shared work nor the other waiters, and an
+    exception is delivered to all of them.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def in_flight(self, key: str) -> bool:
+        future = self._inflight.get(key)
+        try:
+            return future is not None and future.get_loop() is asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        future = self._inflight.get(key)
+
+        # Futures pertencem a um event loop; não compartilhar entre loops diferentes
+        if future is not None and future.get_loop() is loop:
+            metrics.increment("singleflight_calls", flight=self.name, result="coalesced")
+        else:
+            metrics.increment("singleflight_calls", flight=self.name, result="leader")
+            future = loop.create_future()
+            self._inflight[key] = future
+            task = loop.create_task(self._run(key, factory, future))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        result = await asyncio.shield(future)
+        # Cada chamador recebe sua própria cópia do resultado
+        return copy.deepcopy(result)
+
+    async def _run(self, key: str, factory: Callable[[], Awaitable[Any]], future: asyncio.Future) -> None:
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            if not future.done():
+                future.cancel()
+            raise
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+                # Evita o aviso de exceção não consumida quando todos os chamadores desistiram
+                future.exception()
+        else:
+            if not future.done():
+                future.set_result(result)
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
@@ -0,0 +1,168 @@
+import re
+import json
+from typing import Dict, Any, List, Optional, Tuple
+
+from pydantic import BaseModel, Field, ValidationError
+
+# Esquema de resposta enviado ao Gemini no modo de saída estruturada
+DEVOTIONAL_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "saudacao": {"type": "string"},
+        "versiculos_chave": {"type": "array", "items": {"type": "string"}},
+        "devocional": {"type": "string"},
+        "aplicacao": {"type": "string"},
+        "oracao": {"type": "string"},
+        "aprofundamento": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["saudacao", "versiculos_chave", "devocional", "aplicacao", "oracao", "aprofundamento"],
+}
+
+JSON_FORMAT_INSTRUCTIONS = """
+Responda somente com um objeto JSON com os campos:
+- saudacao: a frase inicial de acolhimento
+- versiculos_chave: lista com o(s) versículo(s) chave, no formato "Livro capítulo:versículo - texto"
+- devocional: a reflexão completa
+- aplicacao: a aplicação prática
+- oracao: a oração final
+- aprofundamento: lista de referências bíblicas para aprofundamento
+"""
+
+_LIST_FIELDS = ("versiculos_chave", "aprofundamento", "versiculos")
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_DANGLING_TAIL_RE = re.compile(r'(?:,\s*"[^"\\]*"\s*:?\s*|,\s*)$')
+
+class DevotionalOutput(BaseModel):
+    """Devocional no formato estruturado pedido ao modelo"""
+    saudacao: str = ""
+    versiculos_chave: List[str] = Field(default_factory=list)
+    devocional: str = ""
+    aplicacao: str = ""
+    oracao: str = ""
+    aprofundamento: List[str] = Field(default_factory=list)
+
+    def to_text(self) -> str:
+        """Render the sections with the same headings the text prompt uses"""
+        parts = [self.saudacao]
+        if self.versiculos_chave:
+            parts.append("1. **Versículo(s) chave:** " + "\n".join(self.versiculos_chave))
+        parts.append("2. **Devocional:**\n" + self.devocional)
+        if self.aplicacao:
+            parts.append("3. **Aplicação prática:** " + self.aplicacao)
+        parts.append("4. **Oração final:**\n" + self.oracao)
+        if self.aprofundamento:
+            parts.append("5. **Aprofundamento:**\n" + "\n".join(self.aprofundamento))
+        return "\n\n".join(part for part in parts if part).strip()
+
+    def to_devotional(self, verses: List[str]) -> Dict[str, Any]:
+        return {
+            "texto": self.to_text(),
+            "versiculos": verses,
+            "reflexao": self.devocional,
+            "oracao": self.oracao,
+        }
+
+class LegacyDevotionalOutput(BaseModel):
+    """Formato JSON antigo, com os campos já no formato da API"""
+    texto: str = ""
+    versiculos: List[str] = Field(default_factory=list)
+    reflexao: str = ""
+    oracao: str = ""
+
+def _coerce_lists(data: Dict[str, Any]) -> Dict[str, Any]:
+    coerced = dict(data)
+    for field in _LIST_FIELDS:
+        value = coerced.get(field)
+        if value is None:
+            coerced.pop(field, None)
+        elif isinstance(value, str):
+            coerced[field] = [value] if value.strip() else []
+        elif isinstance(value, list):
+            coerced[field] = [str(item) for item in value if item]
+    for field, value in list(coerced.items()):
+        if value is None:
+            coerced[field] = ""
+    return coerced
+
+def _json_body(text: str) -> Optional[str]:
+    start = text.find("{")
+    if start < 0:
+        return None
+    end = text.rfind("}")
+    return text[start:end + 1] if end > start else text[start:]
+
+def repair_json(text: str) -> str:
+    """Targeted repair of near-valid JSON produced by the model
+
+    Escapes raw control characters inside strings, drops dangling keys and
+    trailing commas, and closes strings and brackets left open by a
+    truncated response.
+    """
+    repaired = []
+    stack = []
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            elif char == "\n":
+                char = "\\n"
+            elif char == "\r":
+                char = "\\r"
+            elif char == "\t":
+                char = "\\t"
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+        repaired.append(char)
+
+    body = "".join(repaired)
+    if in_string:
+        body = body[:-1] if escaped else body
+        body += '"'
+    if stack:
+        # Resposta truncada: remove chave sem valor e vírgula pendente antes de fechar
+        body = _DANGLING_TAIL_RE.sub("", body.rstrip())
+        body += "".join(reversed(stack))
+    return _TRAILING_COMMA_RE.sub(r"\1", body)
+
+def parse_structured_output(text: str) -> Tuple[Optional[BaseModel], str]:
+    """Parse and validate the model JSON, returning (model, mode)
+
+    mode is "json" for valid JSON, "repaired" when repair_json was needed and
+    "failed" when the text holds no usable JSON object.
+    """
+    body = _json_body(text)
+    if body is None:
+        return None, "failed"
+
+    mode = "json"
+    try:
+        data = json.loads(body)
+    except json.JSONDecodeError:
+        mode = "repaired"
+        try:
+            data = json.loads(repair_json(body))
+        except json.JSONDecodeError:
+            return None, "failed"
+
+    if not isinstance(data, dict):
+        return None, "failed"
+
+    data = _coerce_lists(data)
+    try:
+        if "devocional" in data or "versiculos_chave" in data:
+            output = DevotionalOutput(**data)
+            return (output, mode) if output.devocional or output.oracao else (None, "failed")
+        if "texto" in data:
+            return LegacyDevotionalOutput(**data), mode
+    except ValidationError:
+        pass
+    return None, "failed"
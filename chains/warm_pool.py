@@ -0,0 +1,194 @@
+import os
+import time
+import asyncio
+from collections import Counter, deque
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Tuple
+
+from chains.devotional_cache import normalize_feeling
+from services.metrics import metrics
+
+Generator = Callable[[str], Awaitable[Dict[str, Any]]]
+HistoryLoader = Callable[[], Awaitable[List[str]]]
+
+async def load_recent_feelings(limit: int = 2000) -> List[str]:
+    """Load the most recent feelings of all users from the devotionals table
+
+    Reads across users, so it goes through the service-role repository (RLS
+    would restrict the anon client to a single user's rows).
+    """
+    from services.repository import admin_repository
+
+    return await admin_repository.list_recent_feelings(limit)
+
+def _parse_hours(window: str) -> Tuple[int, int]:
+    start, end = window.split("-", 1)
+    return int(start), int(end)
+
+class WarmPool:
+    """Background pool of pre-generated devotionals for the most frequent feelings
+
+    Each pooled devotional is handed out once, so users asking for the same
+    feeling still get different texts. Refills only run inside the configured
+    off-peak window, at a fixed rate, and only while the model has spare
+    capacity.
+    """
+
+    def __init__(
+        self,
+        generator: Generator,
+        history_loader: HistoryLoader = load_recent_feelings,
+        has_capacity: Callable[[], bool] = lambda: True,
+        top_n: int = 20,
+        per_feeling: int = 2,
+        refill_per_minute: float = 6,
+        max_age_seconds: float = 6 * 3600,
+        refill_hours: str = "0-6",
+        ranking_interval: float = 3600,
+        idle_interval: float = 30,
+        enabled: bool = False,
+    ):
+        self.generator = generator
+        self.history_loader = history_loader
+        self.has_capacity = has_capacity
+        self.top_n = top_n
+        self.per_feeling = per_feeling
+        self.refill_interval = 60 / refill_per_minute if refill_per_minute > 0 else idle_interval
+        self.max_age_seconds = max_age_seconds
+        self.refill_hours = _parse_hours(refill_hours)
+        self.ranking_interval = ranking_interval
+        self.idle_interval = idle_interval
+        self.enabled = enabled
+        self._pool: Dict[str, deque] = {}
+        self._top: List[Tuple[str, str]] = []
+        self._ranked_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, generator: Generator, **kwargs) -> "WarmPool":
+        """Build the pool from WARM_POOL_* environment variables"""
+        return cls(
+            generator,
+            top_n=int(os.getenv("WARM_POOL_TOP_N", "20")),
+            per_feeling=int(os.getenv("WARM_POOL_PER_FEELING", "2")),
+            refill_per_minute=float(os.getenv("WARM_POOL_REFILL_PER_MINUTE", "6")),
+            max_age_seconds=float(os.getenv("WARM_POOL_MAX_AGE_SECONDS", str(6 * 3600))),
+            refill_hours=os.getenv("WARM_POOL_REFILL_HOURS", "0-6"),
+            enabled=os.getenv("WARM_POOL_ENABLED", "false").lower() == "true",
+            **kwargs,
+        )
+
+    @property
+    def size(self) -> int:
+        return sum(len(items) for items in self._pool.values())
+
+    @property
+    def top_feelings(self) -> List[str]:
+        return [key for key, _ in self._top]
+
+    def take(self, sentimento: str) -> Optional[Dict[str, Any]]:
+        """Consume a fresh pooled devotional for the feeling, if there is one"""
+        if not self.enabled:
+            return None
+
+        items = self._pool.get(normalize_feeling(sentimento))
+        self._drop_stale(items)
+        if not items:
+            metrics.increment("warm_pool_requests", result="miss")
+            return None
+
+        _, devotional = items.popleft()
+        metrics.increment("warm_pool_requests", result="hit")
+        metrics.set_gauge("warm_pool_size", self.size)
+        return devotional
+
+    async def refresh_ranking(self) -> None:
+        """Rank normalized feelings from recent history and keep the top N"""
+        feelings = await self.history_loader()
+        counts: Counter = Counter()
+        examples: Dict[str, Counter] = {}
+        for sentimento in feelings:
+            key = normalize_feeling(sentimento)
+            counts[key] += 1
+            examples.setdefault(key, Counter())[sentimento.strip()] += 1
+
+        # O texto mais comum de cada grupo é usado como prompt da pré-geração
+        self._top = [
+            (key, examples[key].most_common(1)[0][0])
+            for key, _ in counts.most_common(self.top_n)
+        ]
+        self._ranked_at = time.monotonic()
+
+        # Descarta itens de sentimentos que saíram do ranking
+        for key in set(self._pool) - set(self.top_feelings):
+            del self._pool[key]
+        metrics.set_gauge("warm_pool_size", self.size)
+
+    async def refill_once(self) -> bool:
+        """Generate one devotional for the most needed feeling; False if full"""
+        target = self._next_deficit()
+        if target is None:
+            return False
+
+        key, sentimento = target
+        start = time.perf_counter()
+        devotional = await self.generator(sentimento)
+        self._pool.setdefault(key, deque()).append((time.monotonic(), devotional))
+
+        metrics.increment("warm_pool_refills")
+        metrics.observe("warm_pool_refill_seconds", time.perf_counter() - start)
+        metrics.set_gauge("warm_pool_size", self.size)
+        return True
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def in_refill_window(self, hour: Optional[int] = None) -> bool:
+        hour = datetime.now().hour if hour is None else hour
+        start, end = self.refill_hours
+        if start <= end:
+            return start <= hour < end
+        # Janela que atravessa a meia-noite, ex.: 22-6
+        return hour >= start or hour < end
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if not self._top or time.monotonic() - self._ranked_at > self.ranking_interval:
+                    await self.refresh_ranking()
+
+                if self.in_refill_window() and self.has_capacity() and await self.refill_once():
+                    await asyncio.sleep(self.refill_interval)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Erro ao reabastecer pool de devocionais: {e}")
+                metrics.increment("warm_pool_refill_errors")
+            await asyncio.sleep(self.idle_interval)
+
+    def _next_deficit(self) -> Optional[Tuple[str, str]]:
+        best, best_count = None, self.per_feeling
+        for key, sentimento in self._top:
+            items = self._pool.get(key)
+            self._drop_stale(items)
+            count = len(items) if items else 0
+            # Os sentimentos mais frequentes vêm primeiro no ranking
+            if count < best_count:
+                best, best_count = (key, sentimento), count
+        return best
+
+    def _drop_stale(self, items: Optional[deque]) -> None:
+        if not items:
+            return
+        now = time.monotonic()
+        while items and now - items[0][0] > self.max_age_seconds:
+            items.popleft()
+            metrics.increment("warm_pool_discarded", reason="stale")
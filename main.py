@@ -1,27 +1,55 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Depends, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import JWTError, jwt
 from dotenv import load_dotenv
 from typing import Optional
 
 # Importando rotas da API
-from api.routes import router as api_router
-from api.auth import router as auth_router, get_current_user
+from api.routes import router as api_router, reserve_usage, release_usage, record_devotional
+from api.auth import router as auth_router, get_current_user, authenticate_token
 from api.webhook import router as webhook_router
-from services.supabase_client import get_supabase_client
+from api.bulk import router as bulk_router
+from services.supabase_client import supabase_clients
+from services.repository import repository, admin_repository
+from services.profile_cache import profile_cache
+from services.entitlements import entitlement_cache
+from services.metrics import metrics
+from services.llm_usage import llm_usage, GROUP_FIELDS
+from services.admission import AdmissionRejected
+from services.jobs import job_queue
+from services.write_behind import write_behind
+from chains.devotional_chain import devotional_chain_instance
 
 # Carregando variáveis de ambiente
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Clientes do Supabase e pool de conexões HTTP compartilhados pelo processo
+    supabase_clients.start()
+    # Escritas que não precisam acontecer antes da resposta, gravadas em lote
+    write_behind.start()
+    # Iniciar o pool de workers dos jobs de geração
+    await job_queue.start()
+    # Pré-geração de devocionais para os sentimentos mais frequentes
+    devotional_chain_instance.warm_pool.start()
+    yield
+    await devotional_chain_instance.warm_pool.stop()
+    await job_queue.stop()
+    # Grava o que ainda estiver no buffer antes de fechar os clientes
+    await write_behind.stop()
+    await supabase_clients.aclose()
+
 # Criando a aplicação FastAPI
 app = FastAPI(
     title="Devocionais Personalizados",
     description="API para geração de devocionais cristãos personalizados",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configurando CORS
@@ -37,6 +65,7 @@ app.add_middleware(
 app.include_router(api_router, prefix="/api", tags=["api"])
 app.include_router(auth_router, prefix="/api/auth", tags=["auth"])
 app.include_router(webhook_router, prefix="/api/mp", tags=["mercado_pago"])
+app.include_router(bulk_router, prefix="/api/bulk", tags=["bulk"])
 
 # Configurando arquivos estáticos
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -55,26 +84,20 @@ async def get_current_user_optional(credentials: Optional[HTTPAuthorizationCrede
         return None
     
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, os.getenv("SECRET_KEY"), algorithms=[os.getenv("ALGORITHM", "HS256")])
-        user_id: str = payload.get("sub")
-        
-        if user_id is None:
-            return None
-            
-        # Verificar se o usuário existe no Supabase
-        supabase = get_supabase_client()
-        user = supabase.table("profiles").select("*").eq("id", user_id).execute()
-        
-        if not user.data or len(user.data) == 0:
-            return None
-            
-        return user.data[0]
-    except JWTError:
-        return None
+        return await authenticate_token(credentials.credentials)
     except Exception:
         return None
 
+async def get_metrics_admin(current_user = Depends(get_current_user)):
+    """
+    Métricas internas (sentimentos mais pedidos, custo por modelo) só para os
+    usuários listados em METRICS_ADMIN_USER_IDS
+    """
+    admins = {user_id.strip() for user_id in os.getenv("METRICS_ADMIN_USER_IDS", "").split(",") if user_id.strip()}
+    if current_user["id"] not in admins:
+        raise HTTPException(status_code=403, detail="Acesso restrito a administradores")
+    return current_user
+
 # Rota principal
 @app.get("/")
 async def root(request: Request):
@@ -113,6 +136,43 @@ async def dashboard_page(request: Request):
 async def health_check():
     return {"status": "online", "version": "1.0.0"}
 
+# Rota para métricas de desempenho (cache, chamadas ao LLM, latência)
+@app.get("/api/metrics")
+async def get_metrics(admin = Depends(get_metrics_admin)):
+    return {
+        **metrics.snapshot(),
+        "devotional_cache": devotional_chain_instance.cache.stats(),
+        "profile_cache": await profile_cache.stats(),
+        "entitlement_cache": await entitlement_cache.stats(),
+        "write_behind": write_behind.stats(),
+        "warm_pool": {
+            "size": devotional_chain_instance.warm_pool.size,
+            "top_feelings": devotional_chain_instance.warm_pool.top_feelings
+        },
+        "circuit_breaker": {
+            "state": devotional_chain_instance.breaker.state
+        },
+        "model_tiers": devotional_chain_instance.router.stats()
+    }
+
+# Rota para custo e latência das chamadas ao LLM, agrupados por modelo, endpoint e tier
+@app.get("/api/metrics/llm")
+async def get_llm_metrics(
+    group_by: str = ",".join(GROUP_FIELDS),
+    model: Optional[str] = None,
+    endpoint: Optional[str] = None,
+    tier: Optional[str] = None,
+    admin = Depends(get_metrics_admin)
+):
+    fields = [field.strip() for field in group_by.split(",") if field.strip()]
+    invalid = [field for field in fields if field not in GROUP_FIELDS]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Campos de agrupamento inválidos: {', '.join(invalid)}")
+    return {
+        "group_by": [field for field in GROUP_FIELDS if field in fields],
+        "groups": llm_usage.summary(fields, model=model, endpoint=endpoint, tier=tier)
+    }
+
 # Rota para verificar usuário logado via token
 @app.get("/api/user/me")
 async def get_current_user_info(current_user = Depends(get_current_user_optional)):
@@ -124,19 +184,19 @@ async def get_current_user_info(current_user = Depends(get_current_user_optional
 @app.get("/api/user/stats")
 async def get_user_stats(current_user = Depends(get_current_user)):
     try:
-        supabase = get_supabase_client()
-        
-        # Contar devocionais salvos
-        devotionals = supabase.table("saved_devotionals").select("id").eq("user_id", current_user["id"]).execute()
-        devotionals_count = len(devotionals.data) if devotionals.data else 0
-        
-        # Calcular streak (simplificado por enquanto)
-        streak_count = 7  # Placeholder - implementar lógica real
-        
+        # Totais e sequência mantidos no banco a cada devocional gerado ou salvo
+        stats = await admin_repository.get_user_stats(current_user["id"]) or {}
         return {
-            "devotionalsCount": devotionals_count,
-            "streakCount": streak_count
+            "devotionalsCount": stats.get("saved_count", 0),
+            "streakCount": stats.get("streak", 0)
         }
+    except Exception as e:
+        print(f"Erro ao obter estatísticas do usuário: {str(e)}")
+    
+    try:
+        # Banco sem a função get_user_stats: contagem exata, sem sequência
+        devotionals_count = await repository.count_saved_devotionals(current_user["id"])
+        return {"devotionalsCount": devotionals_count, "streakCount": 0}
     except Exception as e:
         return {"devotionalsCount": 0, "streakCount": 0}
 
@@ -144,13 +204,11 @@ async def get_user_stats(current_user = Depends(get_current_user)):
 @app.get("/api/user/settings")
 async def get_user_settings(current_user = Depends(get_current_user)):
     try:
-        supabase = get_supabase_client()
-        
         # Buscar configurações do usuário
-        settings = supabase.table("user_settings").select("*").eq("user_id", current_user["id"]).execute()
+        settings = await repository.get_user_settings(current_user["id"])
         
-        if settings.data and len(settings.data) > 0:
-            return settings.data[0]
+        if settings:
+            return settings
         else:
             # Retornar configurações padrão
             return {
@@ -174,23 +232,26 @@ async def generate_devotional_endpoint(request: Request, current_user = Depends(
             raise HTTPException(status_code=400, detail="Sentimento é obrigatório")
         
         # Importar a cadeia de devocional
-        from chains.devotional_chain import generate_devotional
+        from chains.devotional_chain import generate_devotional_async
         
-        # Gerar o devocional
-        devotional = generate_devotional(sentimento)
+        # Verifica a cota e reserva o uso em uma única ida ao banco
+        is_subscribed, limit_response = await reserve_usage(current_user["id"])
+        if limit_response is not None:
+            return limit_response
         
-        # Atualizar contador de uso
-        supabase = get_supabase_client()
-        usage = supabase.table("usages").select("*").eq("user_id", current_user["id"]).execute()
-        
-        if usage.data and len(usage.data) > 0:
-            current_count = usage.data[0].get("devotional_count", 0)
-            supabase.table("usages").update({"devotional_count": current_count + 1}).eq("user_id", current_user["id"]).execute()
-        else:
-            supabase.table("usages").insert({"user_id": current_user["id"], "devotional_count": 1}).execute()
+        # Gerar o devocional sem bloquear o event loop; a reserva é devolvida se falhar
+        try:
+            devotional = await generate_devotional_async(sentimento, user_id=current_user["id"], subscriber=is_subscribed, endpoint="generate_devotional")
+        except Exception:
+            await release_usage(current_user["id"])
+            raise
         
-        return devotional
+        # Salva no histórico (referência para salvar pelo painel) e devolve a
+        # reserva se o devocional veio da biblioteca de contingência
+        return await record_devotional(current_user["id"], sentimento, devotional)
         
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao gerar devocional: {str(e)}")
 
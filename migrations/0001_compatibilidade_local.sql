@@ -0,0 +1,29 @@
+-- Objetos que o Supabase já fornece e que as migrações seguintes usam.
+-- No Supabase nada aqui é alterado; num Postgres local são criadas versões mínimas.
+
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT FROM pg_roles WHERE rolname = 'anon') THEN CREATE ROLE anon NOLOGIN; END IF;
+  IF NOT EXISTS (SELECT FROM pg_roles WHERE rolname = 'authenticated') THEN CREATE ROLE authenticated NOLOGIN; END IF;
+  IF NOT EXISTS (SELECT FROM pg_roles WHERE rolname = 'service_role') THEN CREATE ROLE service_role NOLOGIN BYPASSRLS; END IF;
+END $$;
+
+CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+
+CREATE SCHEMA IF NOT EXISTS auth;
+
+CREATE TABLE IF NOT EXISTS auth.users (
+  id UUID DEFAULT uuid_generate_v4() PRIMARY KEY,
+  email TEXT,
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL
+);
+
+-- auth.uid(): usuário da requisição, lido das claims do JWT repassadas pelo PostgREST
+DO $$
+BEGIN
+  IF to_regprocedure('auth.uid()') IS NULL THEN
+    CREATE FUNCTION auth.uid() RETURNS UUID AS $fn$
+      SELECT nullif(current_setting('request.jwt.claim.sub', TRUE), '')::uuid;
+    $fn$ LANGUAGE sql STABLE;
+  END IF;
+END $$;
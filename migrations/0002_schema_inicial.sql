@@ -1,5 +1,6 @@
--- Script de configuração do Supabase para a aplicação Devocionais Personalizados
--- Este script deve ser executado no Editor SQL do Supabase
+-- Esquema inicial: perfis, assinaturas, uso e devocionais, com RLS, políticas,
+-- triggers e índices por usuário. Pode ser reaplicada sobre um banco criado
+-- pelo antigo supabase_setup.sql.
 
 -- ======== TABELAS ========
 
@@ -39,9 +40,17 @@ CREATE TABLE IF NOT EXISTS public.devotionals (
   versiculos TEXT[] NOT NULL,
   reflexao TEXT,
   oracao TEXT,
+  modelo TEXT,
+  nivel_modelo TEXT,
+  motivo_roteamento TEXT,
   created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL
 );
 
+-- Modelo e nível de modelo que geraram cada devocional (bancos criados antes do roteamento)
+ALTER TABLE public.devotionals ADD COLUMN IF NOT EXISTS modelo TEXT;
+ALTER TABLE public.devotionals ADD COLUMN IF NOT EXISTS nivel_modelo TEXT;
+ALTER TABLE public.devotionals ADD COLUMN IF NOT EXISTS motivo_roteamento TEXT;
+
 -- ======== SEGURANÇA (RLS) ========
 
 -- Habilitar RLS em todas as tabelas
@@ -53,45 +62,55 @@ ALTER TABLE public.devotionals ENABLE ROW LEVEL SECURITY;
 -- ======== POLÍTICAS ========
 
 -- Políticas para profiles
+DROP POLICY IF EXISTS "Usuários podem ver seus próprios perfis" ON public.profiles;
 CREATE POLICY "Usuários podem ver seus próprios perfis"
   ON public.profiles FOR SELECT
   USING (auth.uid() = id);
 
+DROP POLICY IF EXISTS "Usuários podem atualizar seus próprios perfis" ON public.profiles;
 CREATE POLICY "Usuários podem atualizar seus próprios perfis"
   ON public.profiles FOR UPDATE
   USING (auth.uid() = id);
 
 -- Políticas para subscriptions
+DROP POLICY IF EXISTS "Usuários podem ver suas próprias assinaturas" ON public.subscriptions;
 CREATE POLICY "Usuários podem ver suas próprias assinaturas"
   ON public.subscriptions FOR SELECT
   USING (auth.uid() = user_id);
 
+DROP POLICY IF EXISTS "API pode criar e atualizar assinaturas" ON public.subscriptions;
 CREATE POLICY "API pode criar e atualizar assinaturas"
   ON public.subscriptions FOR INSERT
   WITH CHECK (auth.uid() = user_id);
 
+DROP POLICY IF EXISTS "API pode atualizar assinaturas" ON public.subscriptions;
 CREATE POLICY "API pode atualizar assinaturas"
   ON public.subscriptions FOR UPDATE
   USING (auth.uid() = user_id);
 
 -- Políticas para usages
+DROP POLICY IF EXISTS "Usuários podem ver seu próprio uso" ON public.usages;
 CREATE POLICY "Usuários podem ver seu próprio uso"
   ON public.usages FOR SELECT
   USING (auth.uid() = user_id);
 
+DROP POLICY IF EXISTS "API pode criar registros de uso" ON public.usages;
 CREATE POLICY "API pode criar registros de uso"
   ON public.usages FOR INSERT
   WITH CHECK (auth.uid() = user_id);
 
+DROP POLICY IF EXISTS "API pode atualizar registros de uso" ON public.usages;
 CREATE POLICY "API pode atualizar registros de uso"
   ON public.usages FOR UPDATE
   USING (auth.uid() = user_id);
 
 -- Políticas para devotionals
+DROP POLICY IF EXISTS "Usuários podem ver seus próprios devocionais" ON public.devotionals;
 CREATE POLICY "Usuários podem ver seus próprios devocionais"
   ON public.devotionals FOR SELECT
   USING (auth.uid() = user_id);
 
+DROP POLICY IF EXISTS "Usuários podem criar seus próprios devocionais" ON public.devotionals;
 CREATE POLICY "Usuários podem criar seus próprios devocionais"
   ON public.devotionals FOR INSERT
   WITH CHECK (auth.uid() = user_id);
@@ -108,6 +127,7 @@ END;
 $$ LANGUAGE plpgsql;
 
 -- Trigger para atualização automática do campo 'updated_at' na tabela de assinaturas
+DROP TRIGGER IF EXISTS update_subscriptions_updated_at ON public.subscriptions;
 CREATE TRIGGER update_subscriptions_updated_at
 BEFORE UPDATE ON public.subscriptions
 FOR EACH ROW
@@ -130,6 +150,7 @@ END;
 $$ LANGUAGE plpgsql SECURITY DEFINER;
 
 -- Trigger para criação automática de perfil
+DROP TRIGGER IF EXISTS on_auth_user_created ON auth.users;
 CREATE TRIGGER on_auth_user_created
 AFTER INSERT ON auth.users
 FOR EACH ROW
@@ -137,23 +158,6 @@ EXECUTE FUNCTION public.handle_new_user();
 
 -- ======== ÍNDICES ========
 
--- Índices para melhorar a performance
 CREATE INDEX IF NOT EXISTS idx_subscriptions_user_id ON public.subscriptions (user_id);
-CREATE INDEX IF NOT EXISTS idx_usages_user_id ON public.usages (user_id);
-CREATE INDEX IF NOT EXISTS idx_devotionals_user_id ON public.devotionals (user_id);
-
--- ======== CONFIGURAÇÕES DE AUTENTICAÇÃO ========
-
--- Importante: Habilitar e-mail confirmação e redefinição de senha
--- Isso deve ser feito na interface do Supabase:
--- 1. Acesse Authentication > Settings
--- 2. Habilite "Enable Email Confirmations"
--- 3. Configure os templates de e-mail
-
--- ======== INSTRUÇÕES ADICIONAIS ========
-
--- Após executar este script, você deve:
--- 1. Configurar o provedor OAuth do Google se desejar autenticação com Google
--- 2. Verificar se as políticas de RLS estão funcionando corretamente
--- 3. Configurar variáveis de ambiente no seu aplicativo
--- 4. Testar se todos os endpoints estão funcionando corretamente 
\ No newline at end of file
+-- Um registro de uso por usuário (alvo do upsert em lote da geração em massa)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_usages_user_id_unique ON public.usages (user_id);
@@ -0,0 +1,90 @@
+-- Devocionais salvos e configurações do usuário (já consultados pela API, mas
+-- ausentes do esquema inicial), views resumidas do histórico e os índices das
+-- listagens.
+
+-- ======== TABELAS ========
+
+-- Devocionais salvos pelo usuário no painel
+CREATE TABLE IF NOT EXISTS public.saved_devotionals (
+  id UUID DEFAULT uuid_generate_v4() PRIMARY KEY,
+  user_id UUID REFERENCES public.profiles(id) ON DELETE CASCADE NOT NULL,
+  sentimento TEXT NOT NULL,
+  greeting TEXT,
+  verse_text TEXT,
+  verse_reference TEXT,
+  content TEXT NOT NULL,
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL
+);
+
+-- Configurações do painel, uma linha por usuário
+CREATE TABLE IF NOT EXISTS public.user_settings (
+  user_id UUID REFERENCES public.profiles(id) ON DELETE CASCADE NOT NULL PRIMARY KEY,
+  email_notifications BOOLEAN DEFAULT TRUE NOT NULL,
+  save_history BOOLEAN DEFAULT TRUE NOT NULL,
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL
+);
+
+-- ======== SEGURANÇA (RLS) ========
+
+ALTER TABLE public.saved_devotionals ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.user_settings ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Usuários podem ver seus devocionais salvos" ON public.saved_devotionals;
+CREATE POLICY "Usuários podem ver seus devocionais salvos"
+  ON public.saved_devotionals FOR SELECT
+  USING (auth.uid() = user_id);
+
+DROP POLICY IF EXISTS "Usuários podem salvar devocionais" ON public.saved_devotionals;
+CREATE POLICY "Usuários podem salvar devocionais"
+  ON public.saved_devotionals FOR INSERT
+  WITH CHECK (auth.uid() = user_id);
+
+DROP POLICY IF EXISTS "Usuários podem remover seus devocionais salvos" ON public.saved_devotionals;
+CREATE POLICY "Usuários podem remover seus devocionais salvos"
+  ON public.saved_devotionals FOR DELETE
+  USING (auth.uid() = user_id);
+
+DROP POLICY IF EXISTS "Usuários podem ver suas configurações" ON public.user_settings;
+CREATE POLICY "Usuários podem ver suas configurações"
+  ON public.user_settings FOR SELECT
+  USING (auth.uid() = user_id);
+
+DROP POLICY IF EXISTS "Usuários podem alterar suas configurações" ON public.user_settings;
+CREATE POLICY "Usuários podem alterar suas configurações"
+  ON public.user_settings FOR ALL
+  USING (auth.uid() = user_id)
+  WITH CHECK (auth.uid() = user_id);
+
+DROP TRIGGER IF EXISTS update_user_settings_updated_at ON public.user_settings;
+CREATE TRIGGER update_user_settings_updated_at
+BEFORE UPDATE ON public.user_settings
+FOR EACH ROW
+EXECUTE FUNCTION public.handle_updated_at();
+
+-- ======== ÍNDICES ========
+
+-- Paginação por chave do histórico: (user_id, created_at desc, id desc).
+-- Também atendem as consultas só por user_id, que dispensam os índices simples.
+CREATE INDEX IF NOT EXISTS idx_devotionals_user_created ON public.devotionals (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_saved_devotionals_user_created ON public.saved_devotionals (user_id, created_at DESC, id DESC);
+DROP INDEX IF EXISTS public.idx_devotionals_user_id;
+DROP INDEX IF EXISTS public.idx_usages_user_id;
+
+-- Sentimentos mais recentes de todos os usuários (pré-aquecimento do pool de devocionais)
+CREATE INDEX IF NOT EXISTS idx_devotionals_created_at ON public.devotionals (created_at DESC);
+
+-- ======== HISTÓRICO DE DEVOCIONAIS ========
+
+-- Versão resumida para as listagens (id, data, sentimento, primeiro versículo e
+-- trecho); o texto completo só é lido no detalhe. security_invoker mantém o RLS das tabelas.
+CREATE OR REPLACE VIEW public.devotional_summaries WITH (security_invoker = true) AS
+SELECT id, user_id, created_at, sentimento,
+       versiculos[1] AS versiculo,
+       left(texto, 200) AS resumo
+  FROM public.devotionals;
+
+CREATE OR REPLACE VIEW public.saved_devotional_summaries WITH (security_invoker = true) AS
+SELECT id, user_id, created_at, sentimento,
+       verse_reference AS versiculo,
+       left(content, 200) AS resumo
+  FROM public.saved_devotionals;
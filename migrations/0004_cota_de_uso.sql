@@ -0,0 +1,102 @@
+-- Cota de uso: direitos de uso consolidados (assinatura com validade e uso) e
+-- reserva atômica de devocionais, executadas pelo backend com a service_role.
+
+-- Assinaturas ativas de cada usuário, lidas pela view abaixo sem tocar nas inativas
+CREATE INDEX IF NOT EXISTS idx_subscriptions_active_user
+  ON public.subscriptions (user_id, valid_until)
+  WHERE is_active;
+
+-- Direitos de uso de cada usuário: assinatura ativa (com a validade aplicada),
+-- validade da assinatura ativa e contagem de uso, em uma única consulta
+CREATE OR REPLACE VIEW public.user_entitlements WITH (security_invoker = true) AS
+SELECT p.id AS user_id,
+       COALESCE(s.subscribed, FALSE) AS subscribed,
+       s.valid_until,
+       COALESCE(u.devotional_count, 0) AS usage_count
+  FROM public.profiles p
+  LEFT JOIN LATERAL (
+    SELECT bool_or(sub.valid_until IS NULL OR sub.valid_until > now()) AS subscribed,
+           max(sub.valid_until) AS valid_until
+      FROM public.subscriptions sub
+     WHERE sub.user_id = p.id
+       AND sub.is_active
+  ) s ON TRUE
+  LEFT JOIN public.usages u ON u.user_id = p.id;
+
+-- Direitos de uso com os usos gratuitos restantes (NULL para assinantes: ilimitado)
+CREATE OR REPLACE FUNCTION public.get_entitlements(p_user_id UUID, p_free_limit INTEGER)
+RETURNS TABLE (subscribed BOOLEAN, valid_until TIMESTAMP WITH TIME ZONE, usage_count INTEGER, remaining_free INTEGER) AS $$
+  SELECT e.subscribed,
+         e.valid_until,
+         e.usage_count,
+         CASE WHEN e.subscribed THEN NULL ELSE GREATEST(p_free_limit - e.usage_count, 0) END
+    FROM public.user_entitlements e
+   WHERE e.user_id = p_user_id;
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public;
+
+-- Verifica o direito de uso e reserva um devocional em uma única ida ao banco.
+-- O UPDATE condicional é atômico: requisições concorrentes do mesmo usuário
+-- esperam o lock da linha e reavaliam o limite, então a cota gratuita nunca é excedida.
+-- Retorna também os direitos de uso atualizados (mesmas colunas de get_entitlements).
+DROP FUNCTION IF EXISTS public.reserve_usage(UUID, INTEGER);
+CREATE FUNCTION public.reserve_usage(p_user_id UUID, p_free_limit INTEGER)
+RETURNS TABLE (
+  allowed BOOLEAN, subscribed BOOLEAN, valid_until TIMESTAMP WITH TIME ZONE,
+  usage_count INTEGER, remaining_free INTEGER
+) AS $$
+DECLARE
+  v_subscribed BOOLEAN;
+  v_valid_until TIMESTAMP WITH TIME ZONE;
+  v_count INTEGER;
+  v_allowed BOOLEAN := TRUE;
+BEGIN
+  SELECT e.subscribed, e.valid_until INTO v_subscribed, v_valid_until
+    FROM public.user_entitlements e
+   WHERE e.user_id = p_user_id;
+  v_subscribed := COALESCE(v_subscribed, FALSE);
+
+  -- Cria o registro de uso na primeira vez (depende de idx_usages_user_id_unique)
+  INSERT INTO public.usages (user_id, devotional_count)
+  VALUES (p_user_id, 0)
+  ON CONFLICT (user_id) DO NOTHING;
+
+  UPDATE public.usages u
+     SET devotional_count = u.devotional_count + 1,
+         last_used = now()
+   WHERE u.user_id = p_user_id
+     AND (v_subscribed OR u.devotional_count < p_free_limit)
+  RETURNING u.devotional_count INTO v_count;
+
+  IF v_count IS NULL THEN
+    v_allowed := FALSE;
+    SELECT u.devotional_count INTO v_count FROM public.usages u WHERE u.user_id = p_user_id;
+  END IF;
+
+  RETURN QUERY SELECT
+    v_allowed, v_subscribed, v_valid_until, v_count,
+    CASE WHEN v_subscribed THEN NULL ELSE GREATEST(p_free_limit - v_count, 0) END;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Devolve a reserva de uma geração que falhou (ou que serviu um devocional de contingência)
+CREATE OR REPLACE FUNCTION public.release_usage(p_user_id UUID)
+RETURNS INTEGER AS $$
+DECLARE
+  v_count INTEGER;
+BEGIN
+  UPDATE public.usages u
+     SET devotional_count = GREATEST(u.devotional_count - 1, 0)
+   WHERE u.user_id = p_user_id
+  RETURNING u.devotional_count INTO v_count;
+
+  RETURN COALESCE(v_count, 0);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Somente o backend (service_role) pode consultar, reservar e devolver cota
+REVOKE EXECUTE ON FUNCTION public.get_entitlements(UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.reserve_usage(UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.release_usage(UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.get_entitlements(UUID, INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION public.reserve_usage(UUID, INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION public.release_usage(UUID) TO service_role;
@@ -0,0 +1,129 @@
+-- Estatísticas do painel: atividade diária e totais por usuário mantidos por
+-- triggers, e a sequência de dias calculada pela chave primária.
+
+-- Dia de uma atividade no fuso dos usuários (a sequência de dias vira à meia-noite local)
+CREATE OR REPLACE FUNCTION public.activity_day(p_at TIMESTAMP WITH TIME ZONE)
+RETURNS DATE AS $$
+  SELECT (p_at AT TIME ZONE 'America/Sao_Paulo')::date;
+$$ LANGUAGE sql STABLE;
+
+-- Atividade diária de cada usuário (devocionais gerados e salvos no dia),
+-- mantida pelos triggers abaixo; a sequência de dias é lida pela chave primária
+CREATE TABLE IF NOT EXISTS public.user_activity_days (
+  user_id UUID REFERENCES public.profiles(id) ON DELETE CASCADE NOT NULL,
+  day DATE NOT NULL,
+  generated_count INTEGER DEFAULT 0 NOT NULL,
+  saved_count INTEGER DEFAULT 0 NOT NULL,
+  PRIMARY KEY (user_id, day)
+);
+
+-- Totais de cada usuário, mantidos pelos mesmos triggers
+CREATE TABLE IF NOT EXISTS public.user_stats (
+  user_id UUID REFERENCES public.profiles(id) ON DELETE CASCADE NOT NULL PRIMARY KEY,
+  generated_count INTEGER DEFAULT 0 NOT NULL,
+  saved_count INTEGER DEFAULT 0 NOT NULL,
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL
+);
+
+-- Sem políticas: só o backend (service_role) e as funções abaixo acessam
+ALTER TABLE public.user_activity_days ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.user_stats ENABLE ROW LEVEL SECURITY;
+
+-- Atualiza atividade do dia e totais a cada devocional gerado ou salvo.
+-- Remover um devocional salvo diminui o total, mas o dia continua com atividade.
+CREATE OR REPLACE FUNCTION public.track_user_activity()
+RETURNS TRIGGER AS $$
+DECLARE
+  v_generated INTEGER := CASE WHEN TG_TABLE_NAME = 'devotionals' THEN 1 ELSE 0 END;
+  v_saved INTEGER := CASE WHEN TG_TABLE_NAME = 'devotionals' THEN 0 ELSE 1 END;
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    UPDATE public.user_stats st
+       SET generated_count = GREATEST(st.generated_count - v_generated, 0),
+           saved_count = GREATEST(st.saved_count - v_saved, 0),
+           updated_at = now()
+     WHERE st.user_id = OLD.user_id;
+    RETURN OLD;
+  END IF;
+
+  INSERT INTO public.user_activity_days AS a (user_id, day, generated_count, saved_count)
+  VALUES (NEW.user_id, public.activity_day(now()), v_generated, v_saved)
+  ON CONFLICT (user_id, day) DO UPDATE
+    SET generated_count = a.generated_count + EXCLUDED.generated_count,
+        saved_count = a.saved_count + EXCLUDED.saved_count;
+
+  INSERT INTO public.user_stats AS st (user_id, generated_count, saved_count)
+  VALUES (NEW.user_id, v_generated, v_saved)
+  ON CONFLICT (user_id) DO UPDATE
+    SET generated_count = st.generated_count + EXCLUDED.generated_count,
+        saved_count = st.saved_count + EXCLUDED.saved_count,
+        updated_at = now();
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Triggers nas duas tabelas de devocionais
+DROP TRIGGER IF EXISTS track_user_activity ON public.devotionals;
+CREATE TRIGGER track_user_activity
+AFTER INSERT OR DELETE ON public.devotionals
+FOR EACH ROW
+EXECUTE FUNCTION public.track_user_activity();
+
+DROP TRIGGER IF EXISTS track_user_activity ON public.saved_devotionals;
+CREATE TRIGGER track_user_activity
+AFTER INSERT OR DELETE ON public.saved_devotionals
+FOR EACH ROW
+EXECUTE FUNCTION public.track_user_activity();
+
+-- Preenche atividade e totais a partir do histórico (só quando user_stats ainda
+-- está vazia, ou seja, em bancos que ainda não tinham os triggers)
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM public.user_stats) THEN
+    RETURN;
+  END IF;
+
+  INSERT INTO public.user_activity_days AS a (user_id, day, generated_count)
+  SELECT user_id, public.activity_day(created_at), count(*)
+    FROM public.devotionals
+   GROUP BY 1, 2
+  ON CONFLICT (user_id, day) DO UPDATE SET generated_count = EXCLUDED.generated_count;
+
+  INSERT INTO public.user_activity_days AS a (user_id, day, saved_count)
+  SELECT user_id, public.activity_day(created_at), count(*)
+    FROM public.saved_devotionals
+   GROUP BY 1, 2
+  ON CONFLICT (user_id, day) DO UPDATE SET saved_count = EXCLUDED.saved_count;
+
+  INSERT INTO public.user_stats (user_id, generated_count, saved_count)
+  SELECT user_id, sum(generated_count), sum(saved_count)
+    FROM public.user_activity_days
+   GROUP BY user_id;
+END $$;
+
+-- Estatísticas do painel: totais mantidos pelos triggers e a sequência atual de
+-- dias com atividade (terminando hoje ou ontem), percorrida dia a dia pela chave
+-- primária. O custo depende do tamanho da sequência, não do histórico.
+CREATE OR REPLACE FUNCTION public.get_user_stats(p_user_id UUID)
+RETURNS TABLE (generated_count INTEGER, saved_count INTEGER, streak INTEGER) AS $$
+  WITH RECURSIVE streak_days AS (
+    (SELECT a.day
+       FROM public.user_activity_days a
+      WHERE a.user_id = p_user_id
+        AND a.day >= public.activity_day(now()) - 1
+      ORDER BY a.day DESC
+      LIMIT 1)
+    UNION ALL
+    SELECT a.day
+      FROM streak_days s
+      JOIN public.user_activity_days a ON a.user_id = p_user_id AND a.day = s.day - 1
+  )
+  SELECT COALESCE(st.generated_count, 0),
+         COALESCE(st.saved_count, 0),
+         (SELECT count(*)::integer FROM streak_days)
+    FROM (SELECT p_user_id AS user_id) u
+    LEFT JOIN public.user_stats st ON st.user_id = u.user_id;
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION public.get_user_stats(UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.get_user_stats(UUID) TO service_role;
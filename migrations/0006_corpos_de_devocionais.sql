@@ -0,0 +1,191 @@
+-- Corpos de devocionais endereçados pelo conteúdo: o texto de cada devocional
+-- gerado é gravado uma única vez em devotional_bodies, com o hash do conteúdo
+-- como chave, e devotionals guarda só a referência (body_hash). Devocionais
+-- servidos pelo cache ou pelo pool não repetem o texto.
+-- Salvar um devocional pelo painel referencia o mesmo corpo do gerado:
+-- saved_devotionals guarda body_hash e só os extras de exibição (greeting).
+
+-- ======== HASH DO CONTEÚDO ========
+
+-- SHA-256 (hex) dos campos do corpo em ordem fixa, separados por \x1f (os
+-- versículos entre si por \x1e); campos nulos contam como texto vazio.
+-- services/devotional_bodies.body_hash calcula o mesmo valor no backend.
+CREATE OR REPLACE FUNCTION public.devotional_body_hash(
+  p_texto TEXT, p_versiculos TEXT[], p_reflexao TEXT, p_oracao TEXT
+)
+RETURNS TEXT AS $$
+  SELECT encode(sha256(convert_to(concat_ws(chr(31),
+    COALESCE(p_texto, ''),
+    COALESCE(array_to_string(p_versiculos, chr(30), ''), ''),
+    COALESCE(p_reflexao, ''),
+    COALESCE(p_oracao, '')
+  ), 'UTF8')), 'hex');
+$$ LANGUAGE sql IMMUTABLE;
+
+-- ======== TABELA ========
+
+-- Um corpo por conteúdo. A restrição impede gravar um corpo com o hash de outro conteúdo.
+CREATE TABLE IF NOT EXISTS public.devotional_bodies (
+  hash TEXT PRIMARY KEY,
+  texto TEXT NOT NULL,
+  versiculos TEXT[] DEFAULT '{}' NOT NULL,
+  reflexao TEXT,
+  oracao TEXT,
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+  CONSTRAINT devotional_bodies_hash_check CHECK (
+    hash = public.devotional_body_hash(texto, versiculos, reflexao, oracao)
+  )
+);
+
+ALTER TABLE public.devotionals ADD COLUMN IF NOT EXISTS body_hash TEXT REFERENCES public.devotional_bodies(hash);
+ALTER TABLE public.saved_devotionals ADD COLUMN IF NOT EXISTS body_hash TEXT REFERENCES public.devotional_bodies(hash);
+
+-- ======== CONVERSÃO DAS LINHAS EXISTENTES ========
+
+-- Só roda enquanto as colunas de texto antigas existem (são removidas abaixo)
+DO $$
+BEGIN
+  IF EXISTS (
+    SELECT 1 FROM information_schema.columns
+     WHERE table_schema = 'public' AND table_name = 'devotionals' AND column_name = 'texto'
+  ) THEN
+    -- Devocionais gerados: um corpo por conteúdo distinto
+    INSERT INTO public.devotional_bodies (hash, texto, versiculos, reflexao, oracao)
+    SELECT DISTINCT ON (d.hash) d.hash, d.texto, d.versiculos, d.reflexao, d.oracao
+      FROM (
+        SELECT public.devotional_body_hash(texto, versiculos, reflexao, oracao) AS hash,
+               texto, versiculos, reflexao, oracao
+          FROM public.devotionals
+         WHERE body_hash IS NULL
+      ) d
+    ON CONFLICT (hash) DO NOTHING;
+
+    UPDATE public.devotionals
+       SET body_hash = public.devotional_body_hash(texto, versiculos, reflexao, oracao)
+     WHERE body_hash IS NULL;
+  END IF;
+
+  IF EXISTS (
+    SELECT 1 FROM information_schema.columns
+     WHERE table_schema = 'public' AND table_name = 'saved_devotionals' AND column_name = 'content'
+  ) THEN
+    -- Devocionais salvos: o gerado do mesmo usuário com o mesmo texto
+    UPDATE public.saved_devotionals s
+       SET body_hash = d.body_hash
+      FROM public.devotionals d
+      JOIN public.devotional_bodies b ON b.hash = d.body_hash
+     WHERE s.body_hash IS NULL
+       AND d.user_id = s.user_id
+       AND b.texto = s.content;
+
+    -- Sem o gerado correspondente (histórico apagado): um corpo com o texto
+    -- salvo e o versículo exibido
+    INSERT INTO public.devotional_bodies (hash, texto, versiculos)
+    SELECT DISTINCT ON (l.hash) l.hash, l.texto, l.versiculos
+      FROM (
+        SELECT public.devotional_body_hash(content, v.versiculos, NULL, NULL) AS hash,
+               content AS texto, v.versiculos
+          FROM public.saved_devotionals,
+               LATERAL (SELECT CASE WHEN COALESCE(verse_reference, '') = '' THEN '{}'::TEXT[]
+                                    ELSE ARRAY[concat_ws(' - ', verse_reference, NULLIF(verse_text, ''))]
+                               END AS versiculos) v
+         WHERE body_hash IS NULL
+      ) l
+    ON CONFLICT (hash) DO NOTHING;
+
+    UPDATE public.saved_devotionals
+       SET body_hash = public.devotional_body_hash(
+             content,
+             CASE WHEN COALESCE(verse_reference, '') = '' THEN '{}'::TEXT[]
+                  ELSE ARRAY[concat_ws(' - ', verse_reference, NULLIF(verse_text, ''))]
+             END,
+             NULL, NULL)
+     WHERE body_hash IS NULL;
+  END IF;
+END $$;
+
+-- O mesmo devocional salvo mais de uma vez pelo usuário: fica o salvo primeiro
+DELETE FROM public.saved_devotionals s
+ USING public.saved_devotionals f
+ WHERE f.user_id = s.user_id
+   AND f.body_hash = s.body_hash
+   AND (f.created_at, f.id) < (s.created_at, s.id);
+
+ALTER TABLE public.devotionals ALTER COLUMN body_hash SET NOT NULL;
+ALTER TABLE public.saved_devotionals ALTER COLUMN body_hash SET NOT NULL;
+
+-- ======== ÍNDICES ========
+
+-- Salvar o mesmo devocional de novo não cria outra linha (upsert por esta chave)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_saved_devotionals_user_body ON public.saved_devotionals (user_id, body_hash);
+-- Referências a um corpo (política de leitura abaixo e verificação ao salvar)
+CREATE INDEX IF NOT EXISTS idx_devotionals_body_user ON public.devotionals (body_hash, user_id);
+
+-- ======== HISTÓRICO DE DEVOCIONAIS ========
+
+-- Mesmas colunas das views de 0003, agora lidas do corpo referenciado
+CREATE OR REPLACE VIEW public.devotional_summaries WITH (security_invoker = true) AS
+SELECT d.id, d.user_id, d.created_at, d.sentimento,
+       b.versiculos[1] AS versiculo,
+       left(b.texto, 200) AS resumo
+  FROM public.devotionals d
+  JOIN public.devotional_bodies b ON b.hash = d.body_hash;
+
+CREATE OR REPLACE VIEW public.saved_devotional_summaries WITH (security_invoker = true) AS
+SELECT s.id, s.user_id, s.created_at, s.sentimento,
+       b.versiculos[1] AS versiculo,
+       left(b.texto, 200) AS resumo
+  FROM public.saved_devotionals s
+  JOIN public.devotional_bodies b ON b.hash = s.body_hash;
+
+-- Devocional completo (detalhe)
+CREATE OR REPLACE VIEW public.devotional_details WITH (security_invoker = true) AS
+SELECT d.id, d.user_id, d.sentimento,
+       b.texto, b.versiculos, b.reflexao, b.oracao,
+       d.modelo, d.nivel_modelo, d.motivo_roteamento, d.created_at
+  FROM public.devotionals d
+  JOIN public.devotional_bodies b ON b.hash = d.body_hash;
+
+CREATE OR REPLACE VIEW public.saved_devotional_details WITH (security_invoker = true) AS
+SELECT s.id, s.user_id, s.sentimento, s.greeting,
+       b.texto, b.versiculos, b.reflexao, b.oracao,
+       s.body_hash, s.created_at
+  FROM public.saved_devotionals s
+  JOIN public.devotional_bodies b ON b.hash = s.body_hash;
+
+-- ======== COLUNAS DE TEXTO ANTIGAS ========
+
+-- O corpo é a única fonte do texto. As views de 0003 liam estas colunas: o
+-- script único (python -m migrations bundle) serve a um banco novo; num banco
+-- existente, aplique só as pendentes com python -m migrations apply.
+ALTER TABLE public.devotionals
+  DROP COLUMN IF EXISTS texto,
+  DROP COLUMN IF EXISTS versiculos,
+  DROP COLUMN IF EXISTS reflexao,
+  DROP COLUMN IF EXISTS oracao;
+
+ALTER TABLE public.saved_devotionals
+  DROP COLUMN IF EXISTS content,
+  DROP COLUMN IF EXISTS verse_text,
+  DROP COLUMN IF EXISTS verse_reference;
+
+-- ======== SEGURANÇA (RLS) ========
+
+ALTER TABLE public.devotional_bodies ENABLE ROW LEVEL SECURITY;
+
+-- Um corpo é compartilhado por todos que geraram ou salvaram o mesmo conteúdo;
+-- cada usuário lê os corpos que seus devocionais referenciam. Só o backend
+-- (service_role) grava corpos, no histórico dos devocionais gerados.
+DROP POLICY IF EXISTS "Usuários podem ver os corpos dos seus devocionais" ON public.devotional_bodies;
+CREATE POLICY "Usuários podem ver os corpos dos seus devocionais"
+  ON public.devotional_bodies FOR SELECT
+  USING (
+    EXISTS (
+      SELECT 1 FROM public.devotionals d
+       WHERE d.body_hash = devotional_bodies.hash AND d.user_id = auth.uid()
+    )
+    OR EXISTS (
+      SELECT 1 FROM public.saved_devotionals s
+       WHERE s.body_hash = devotional_bodies.hash AND s.user_id = auth.uid()
+    )
+  );
@@ -0,0 +1,18 @@
+-- Incremento de uso em lote (geração em lote, api/bulk.py), executado pelo
+-- backend com a service_role. A soma acontece no próprio UPSERT, sem ler e
+-- regravar a contagem, então reservas e lotes concorrentes do mesmo usuário
+-- não se sobrescrevem.
+CREATE OR REPLACE FUNCTION public.increment_usages(p_user_ids UUID[], p_counts INTEGER[])
+RETURNS VOID AS $$
+  -- Cria o registro de uso na primeira vez (depende de idx_usages_user_id_unique)
+  INSERT INTO public.usages (user_id, devotional_count, last_used)
+  SELECT i.user_id, sum(i.n)::INTEGER, now()
+    FROM unnest(p_user_ids, p_counts) AS i(user_id, n)
+   GROUP BY i.user_id
+  ON CONFLICT (user_id) DO UPDATE
+    SET devotional_count = public.usages.devotional_count + EXCLUDED.devotional_count,
+        last_used = now();
+$$ LANGUAGE sql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION public.increment_usages(UUID[], INTEGER[]) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.increment_usages(UUID[], INTEGER[]) TO service_role;
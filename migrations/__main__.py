@@ -0,0 +1,42 @@
+"""
+Aplica as migrações do banco.
+
+Uso:
+  python -m migrations [status|apply]   (usa DATABASE_URL, a string de conexão do Postgres)
+  python -m migrations bundle > setup.sql   (script único para o Editor SQL do Supabase)
+"""
+import os
+import sys
+
+from dotenv import load_dotenv
+
+from migrations.runner import apply, bundle, discover, pending
+
+def main(command: str = "apply") -> int:
+    if command == "bundle":
+        sys.stdout.write(bundle())
+        return 0
+    if command not in ("apply", "status"):
+        print(__doc__)
+        return 2
+
+    load_dotenv()
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        print("DATABASE_URL não definido")
+        return 1
+
+    import psycopg
+
+    with psycopg.connect(database_url, autocommit=True) as conn:
+        if command == "status":
+            todo = {migration.version for migration in pending(conn)}
+            for migration in discover():
+                state = "pendente" if migration.version in todo else "aplicada"
+                print(f"{migration.version:04d}_{migration.name}: {state}")
+        elif not apply(conn):
+            print("Nenhuma migração pendente")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:2]))
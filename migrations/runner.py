@@ -0,0 +1,115 @@
+import hashlib
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent
+
+# Arquivos NNNN_nome.sql, aplicados em ordem numérica
+FILENAME_PATTERN = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+# Trava consultiva que impede dois processos de migrar o mesmo banco ao mesmo tempo
+ADVISORY_LOCK_ID = 73112024
+
+class MigrationError(RuntimeError):
+    """Migração inválida ou alterada depois de aplicada"""
+
+class Migration:
+    """
+    Uma migração numerada do diretório migrations/. O SQL deve ser idempotente
+    (IF NOT EXISTS, OR REPLACE, DROP ... IF EXISTS), para poder ser aplicado
+    também sobre bancos criados antes do controle de versões.
+    """
+    def __init__(self, path: Path):
+        match = FILENAME_PATTERN.match(path.name)
+        if not match:
+            raise MigrationError(f"Nome de migração inválido: {path.name}")
+        self.path = path
+        self.version = int(match.group(1))
+        self.name = match.group(2)
+
+    @property
+    def sql(self) -> str:
+        return self.path.read_text(encoding="utf-8")
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.sql.encode("utf-8")).hexdigest()
+
+    def __repr__(self) -> str:
+        return f"Migration({self.version:04d}_{self.name})"
+
+def discover(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    """
+    Migrações do diretório, em ordem; números repetidos são um erro
+    """
+    migrations = sorted(
+        (Migration(path) for path in directory.glob("*.sql") if FILENAME_PATTERN.match(path.name)),
+        key=lambda migration: migration.version,
+    )
+    versions = [migration.version for migration in migrations]
+    duplicated = sorted({version for version in versions if versions.count(version) > 1})
+    if duplicated:
+        raise MigrationError(f"Migrações com o mesmo número: {duplicated}")
+    return migrations
+
+def bundle(migrations: Optional[List[Migration]] = None) -> str:
+    """
+    Todas as migrações num único script, para colar no Editor SQL do Supabase
+    """
+    parts = []
+    for migration in migrations if migrations is not None else discover():
+        parts.append(f"-- ======== {migration.version:04d}_{migration.name} ========\n\n{migration.sql.rstrip()}\n")
+    return "\n".join(parts)
+
+def _ensure_table(conn: Any) -> None:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS public.schema_migrations (
+          version INTEGER PRIMARY KEY,
+          name TEXT NOT NULL,
+          checksum TEXT NOT NULL,
+          applied_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL
+        )
+    """)
+
+def applied_versions(conn: Any) -> Dict[int, str]:
+    """
+    Versões já aplicadas no banco e o checksum de cada uma
+    """
+    _ensure_table(conn)
+    rows = conn.execute("SELECT version, checksum FROM public.schema_migrations").fetchall()
+    return {version: checksum for version, checksum in rows}
+
+def pending(conn: Any, migrations: Optional[List[Migration]] = None) -> List[Migration]:
+    """
+    Migrações ainda não aplicadas. Lança MigrationError se uma migração
+    aplicada foi alterada depois (crie uma nova em vez de editar a antiga).
+    """
+    migrations = migrations if migrations is not None else discover()
+    applied = applied_versions(conn)
+    for migration in migrations:
+        if migration.version in applied and applied[migration.version] != migration.checksum:
+            raise MigrationError(f"{migration!r} foi alterada depois de aplicada")
+    return [migration for migration in migrations if migration.version not in applied]
+
+def apply(conn: Any, migrations: Optional[List[Migration]] = None) -> List[Migration]:
+    """
+    Aplica as migrações pendentes, cada uma na sua transação, e retorna as
+    aplicadas. conn é uma conexão psycopg em modo autocommit.
+    """
+    _ensure_table(conn)
+    conn.execute("SELECT pg_advisory_lock(%s)", (ADVISORY_LOCK_ID,))
+    try:
+        done = []
+        for migration in pending(conn, migrations):
+            with conn.transaction():
+                conn.execute(migration.sql)
+                conn.execute(
+                    "INSERT INTO public.schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                    (migration.version, migration.name, migration.checksum),
+                )
+            print(f"Migração aplicada: {migration.version:04d}_{migration.name}")
+            done.append(migration)
+        return done
+    finally:
+        conn.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_ID,))
@@ -0,0 +1,200 @@
+import os
+import math
+import time
+import asyncio
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, AsyncIterator
+
+from services.metrics import metrics
+
+SUBSCRIBER_LANE = "subscriber"
+FREE_LANE = "free"
+# Jobs já aceitos (com a cota reservada): esperam a vaga em vez de serem recusados
+JOB_LANE = "jobs"
+LANES = (SUBSCRIBER_LANE, FREE_LANE, JOB_LANE)
+
+class AdmissionRejected(Exception):
+    """
+    Requisição recusada pelo controle de admissão (fila cheia ou limite por usuário)
+    """
+    def __init__(self, message: str, status_code: int, retry_after: int, reason: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+class AdmissionController:
+    """
+    Limita as chamadas simultâneas ao LLM com uma fila de espera limitada.
+    Assinantes são atendidos antes dos usuários gratuitos, cada usuário tem um
+    limite de requisições na fila e, com a fila cheia, a requisição é recusada
+    imediatamente com uma estimativa de Retry-After. Jobs em segundo plano
+    (wait=True) entram na fila de jobs, atendida por último, e aguardam a vaga
+    sem limite por usuário, de fila ou de tempo.
+    """
+    def __init__(
+        self,
+        max_in_flight: int = 8,
+        max_queue: int = 32,
+        max_per_user: int = 2,
+        queue_timeout: float = 30.0,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self.queue_timeout = queue_timeout
+        self._in_flight = 0
+        self._lanes: Dict[str, deque] = {lane: deque() for lane in LANES}
+        self._per_user: Dict[str, int] = defaultdict(int)
+        # Média móvel do tempo de cada chamada, usada para estimar o Retry-After
+        self._service_time = 5.0
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        """
+        Cria o controlador a partir das variáveis LLM_* do .env
+        """
+        return cls(
+            max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "8")),
+            max_queue=int(os.getenv("LLM_MAX_QUEUE", "32")),
+            max_per_user=int(os.getenv("LLM_MAX_PER_USER", "2")),
+            queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "30")),
+        )
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def queue_depth(self, lane: Optional[str] = None) -> int:
+        if lane is not None:
+            return len(self._lanes[lane])
+        return sum(len(queue) for queue in self._lanes.values())
+
+    def retry_after(self) -> int:
+        """
+        Estima em quantos segundos há chance de uma vaga
+        """
+        waves = (self.queue_depth() + 1) / max(1, self.max_in_flight)
+        return max(1, math.ceil(self._service_time * waves))
+
+    @asynccontextmanager
+    async def slot(self, user_id: Optional[str] = None, subscriber: bool = False, wait: bool = False) -> AsyncIterator[None]:
+        """
+        Reserva uma vaga de chamada ao LLM durante o bloco
+        """
+        if wait:
+            # Jobs não contam no limite por usuário (o número de workers já os limita)
+            user_id = None
+        await self.acquire(user_id, subscriber, wait)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - start)
+            self.release(user_id)
+
+    async def acquire(self, user_id: Optional[str] = None, subscriber: bool = False, wait: bool = False) -> None:
+        lane = JOB_LANE if wait else SUBSCRIBER_LANE if subscriber else FREE_LANE
+
+        if not wait and user_id and self._per_user[user_id] >= self.max_per_user:
+            raise self._reject(
+                "Você já tem devocionais sendo gerados. Aguarde a conclusão para enviar outro.",
+                429, "user_limit"
+            )
+
+        if self._in_flight < self.max_in_flight and self.queue_depth() == 0:
+            self._admit(user_id)
+            metrics.observe("admission_wait_seconds", 0.0, lane=lane)
+            return
+
+        if not wait and self.queue_depth() >= self.max_queue and not (subscriber and self._shed_free_waiter()):
+            raise self._reject("Servidor ocupado. Tente novamente em instantes.", 503, "queue_full")
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        entry = (waiter, user_id)
+        self._lanes[lane].append(entry)
+        if user_id:
+            self._per_user[user_id] += 1
+        self._update_gauges()
+
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), None if wait else self.queue_timeout)
+        except BaseException as e:
+            granted = waiter.done() and not waiter.cancelled() and waiter.exception() is None
+            if granted:
+                # A vaga foi concedida ao mesmo tempo em que o chamador desistiu
+                self.release(user_id)
+            else:
+                self._abandon(lane, entry, user_id)
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._reject("Tempo de espera esgotado. Tente novamente em instantes.", 503, "queue_timeout")
+            raise
+        finally:
+            metrics.observe("admission_wait_seconds", time.monotonic() - start, lane=lane)
+
+    def release(self, user_id: Optional[str] = None) -> None:
+        self._in_flight -= 1
+        if user_id:
+            self._decrement_user(user_id)
+        self._dispatch()
+
+    def _admit(self, user_id: Optional[str]) -> None:
+        self._in_flight += 1
+        if user_id:
+            self._per_user[user_id] += 1
+        self._update_gauges()
+
+    def _dispatch(self) -> None:
+        # Assinantes primeiro; usuários gratuitos quando não houver assinantes na
+        # fila e jobs quando não houver requisições interativas esperando
+        while self._in_flight < self.max_in_flight:
+            lane = next((lane for lane in LANES if self._lanes[lane]), None)
+            if lane is None:
+                break
+            waiter, _ = self._lanes[lane].popleft()
+            if waiter.done():
+                continue
+            self._in_flight += 1
+            waiter.set_result(True)
+        self._update_gauges()
+
+    def _shed_free_waiter(self) -> bool:
+        """
+        Descarta o usuário gratuito mais recente da fila para abrir espaço a um assinante
+        """
+        free_lane = self._lanes[FREE_LANE]
+        while free_lane:
+            waiter, _ = free_lane.pop()
+            if not waiter.done():
+                waiter.set_exception(self._reject("Servidor ocupado. Tente novamente em instantes.", 503, "shed"))
+                return True
+        return False
+
+    def _abandon(self, lane: str, entry, user_id: Optional[str]) -> None:
+        waiter, _ = entry
+        if not waiter.done():
+            waiter.cancel()
+        try:
+            self._lanes[lane].remove(entry)
+        except ValueError:
+            pass
+        if user_id:
+            self._decrement_user(user_id)
+        self._update_gauges()
+
+    def _decrement_user(self, user_id: str) -> None:
+        self._per_user[user_id] -= 1
+        if self._per_user[user_id] <= 0:
+            del self._per_user[user_id]
+
+    def _reject(self, message: str, status_code: int, reason: str) -> AdmissionRejected:
+        metrics.increment("admission_rejected", reason=reason)
+        return AdmissionRejected(message, status_code, self.retry_after(), reason)
+
+    def _update_gauges(self) -> None:
+        metrics.set_gauge("admission_in_flight", self._in_flight)
+        for lane in LANES:
+            metrics.set_gauge("admission_queue_depth", len(self._lanes[lane]), lane=lane)
@@ -1,10 +1,10 @@
-import os
 from typing import Dict, Any, Optional
-from datetime import datetime, timedelta
-from jose import jwt, JWTError
+from datetime import datetime
+from jose import JWTError
 from dotenv import load_dotenv
 
-from services.supabase_client import get_supabase_client
+from services.supabase_client import get_supabase_client, get_supabase_auth_client
+from services import tokens
 
 # Carregando variáveis de ambiente
 load_dotenv()
@@ -12,26 +12,19 @@ load_dotenv()
 class AuthService:
     def __init__(self):
         self.supabase = get_supabase_client()
-        self.secret_key = os.getenv("SECRET_KEY")
-        self.algorithm = os.getenv("ALGORITHM", "HS256")
-        self.access_token_expire_minutes = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
     
     def create_access_token(self, data: dict) -> str:
         """
         Cria um token JWT para autenticação
         """
-        to_encode = data.copy()
-        expire = datetime.utcnow() + timedelta(minutes=self.access_token_expire_minutes)
-        to_encode.update({"exp": expire})
-        encoded_jwt = jwt.encode(to_encode, self.secret_key, algorithm=self.algorithm)
-        return encoded_jwt
+        return tokens.create_access_token(data)
     
     def verify_token(self, token: str) -> Optional[Dict[str, Any]]:
         """
         Verifica a validade de um token JWT
         """
         try:
-            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+            payload = tokens.decode_access_token(token)
             user_id: str = payload.get("sub")
             
             if user_id is None:
@@ -48,7 +41,7 @@ class AuthService:
         """
         try:
             # Registrar usuário no Supabase Auth
-            auth_response = self.supabase.auth.sign_up({
+            auth_response = get_supabase_auth_client().auth.sign_up({
                 "email": email,
                 "password": password
             })
@@ -90,7 +83,7 @@ class AuthService:
         """
         try:
             # Autenticar usuário no Supabase
-            auth_response = self.supabase.auth.sign_in_with_password({
+            auth_response = get_supabase_auth_client().auth.sign_in_with_password({
                 "email": email,
                 "password": password
             })
@@ -0,0 +1,198 @@
+import os
+import time
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional, Set
+
+from services.metrics import metrics, _percentile
+from services.circuit_breaker import CircuitBreaker, CircuitOpen
+
+Attempt = Callable[[], Awaitable[Any]]
+
+class RetryBudget:
+    """
+    Orçamento de novas tentativas: numa janela deslizante, as tentativas extras
+    (retries e hedges) não podem passar de uma fração das requisições originais.
+    Assim, durante uma queda do provedor, os retries não multiplicam a carga.
+    """
+    def __init__(self, ratio: float = 0.2, min_retries: int = 3, window_seconds: float = 10.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window_seconds = window_seconds
+        self._requests: deque = deque()
+        self._retries: deque = deque()
+
+    def record_request(self) -> None:
+        self._requests.append(time.monotonic())
+
+    def try_spend(self, kind: str = "retry") -> bool:
+        """
+        Consome uma tentativa extra se o orçamento permitir
+        """
+        self._expire()
+        allowed = max(self.min_retries, self.ratio * len(self._requests))
+        if len(self._retries) >= allowed:
+            metrics.increment("llm_retry_budget_exhausted", kind=kind)
+            return False
+        self._retries.append(time.monotonic())
+        return True
+
+    def _expire(self) -> None:
+        limit = time.monotonic() - self.window_seconds
+        for samples in (self._requests, self._retries):
+            while samples and samples[0] < limit:
+                samples.popleft()
+
+class CallPolicy:
+    """
+    Executa chamadas ao modelo com prazo total, tempo limite por tentativa,
+    retries com backoff limitados pelo RetryBudget e hedging: se a primeira
+    tentativa não responder até o percentil configurado da latência recente,
+    uma segunda é disparada e vale a que terminar primeiro. Com um disjuntor,
+    cada tentativa alimenta o seu histórico e, aberto, ele interrompe os retries.
+    """
+    def __init__(
+        self,
+        deadline: float = 45.0,
+        attempt_timeout: float = 20.0,
+        max_attempts: int = 5,
+        retry_delay: float = 2.0,
+        hedge_percentile: float = 95.0,
+        hedge_min_delay: float = 0.5,
+        hedge_initial_delay: Optional[float] = None,
+        min_samples: int = 20,
+        budget: Optional[RetryBudget] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        name: str = "llm",
+    ):
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_initial_delay = hedge_initial_delay
+        self.min_samples = min_samples
+        self.budget = budget or RetryBudget()
+        self.breaker = breaker
+        self.name = name
+        self._latencies: deque = deque(maxlen=512)
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "CallPolicy":
+        """
+        Cria a política a partir das variáveis LLM_* do .env
+        """
+        initial = os.getenv("LLM_HEDGE_INITIAL_DELAY_SECONDS")
+        return cls(
+            deadline=float(os.getenv("LLM_DEADLINE_SECONDS", "45")),
+            attempt_timeout=float(os.getenv("LLM_ATTEMPT_TIMEOUT_SECONDS", "20")),
+            max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", "5")),
+            retry_delay=float(os.getenv("LLM_RETRY_DELAY_SECONDS", "2")),
+            hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "95")),
+            hedge_min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "0.5")),
+            hedge_initial_delay=float(initial) if initial else None,
+            budget=RetryBudget(
+                ratio=float(os.getenv("LLM_RETRY_BUDGET_RATIO", "0.2")),
+                min_retries=int(os.getenv("LLM_RETRY_BUDGET_MIN", "3")),
+            ),
+            **kwargs,
+        )
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        Tempo de espera antes de disparar a tentativa de hedge, ou None se desativado
+        """
+        if self.hedge_percentile <= 0:
+            return None
+        if len(self._latencies) < self.min_samples:
+            return self.hedge_initial_delay
+        return max(self.hedge_min_delay, _percentile(sorted(self._latencies), self.hedge_percentile))
+
+    def remaining(self, started: float) -> float:
+        return self.deadline - (time.monotonic() - started)
+
+    def can_retry(self, attempt: int, started: float, delay: float = 0.0) -> bool:
+        """
+        Indica se ainda cabe outra tentativa no prazo, no limite e no orçamento
+        """
+        if attempt >= self.max_attempts or self.remaining(started) <= delay:
+            return False
+        # Com o circuito aberto não adianta insistir
+        if self.breaker is not None and self.breaker.is_open:
+            return False
+        return self.budget.try_spend("retry")
+
+    async def call(self, attempt: Attempt) -> Any:
+        started = time.monotonic()
+        self.budget.record_request()
+        delay = self.retry_delay
+        number = 0
+
+        while True:
+            number += 1
+            if self.breaker is not None and not self.breaker.allow():
+                raise CircuitOpen(f"Circuito {self.breaker.name} aberto")
+            timeout = min(self.attempt_timeout, self.remaining(started))
+            try:
+                result = await self._hedged(attempt, timeout)
+                if self.breaker is not None:
+                    self.breaker.record_success()
+                return result
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                kind = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+                metrics.increment("llm_attempt_failures", policy=self.name, reason=kind)
+                if self.breaker is not None:
+                    self.breaker.record_failure(kind)
+                print(f"Erro na tentativa {number}: {str(e) or 'tempo limite da tentativa esgotado'}")
+                if not self.can_retry(number, started, delay):
+                    raise
+            metrics.increment("llm_retries", policy=self.name)
+            await asyncio.sleep(delay)
+            delay *= 1.5
+
+    async def _timed(self, attempt: Attempt) -> Any:
+        start = time.monotonic()
+        result = await attempt()
+        elapsed = time.monotonic() - start
+        self._latencies.append(elapsed)
+        metrics.observe("llm_call_seconds", elapsed, policy=self.name)
+        return result
+
+    async def _hedged(self, attempt: Attempt, timeout: float) -> Any:
+        if timeout <= 0:
+            raise asyncio.TimeoutError()
+
+        loop = asyncio.get_running_loop()
+        end = loop.time() + timeout
+        primary = asyncio.ensure_future(self._timed(attempt))
+        pending: Set[asyncio.Future] = {primary}
+        hedge_delay = self.hedge_delay()
+        error: Optional[BaseException] = None
+
+        try:
+            if hedge_delay is not None and hedge_delay < timeout:
+                done, pending = await asyncio.wait(pending, timeout=hedge_delay)
+                if not done and self.budget.try_spend("hedge"):
+                    metrics.increment("llm_hedges", policy=self.name, result="fired")
+                    pending.add(asyncio.ensure_future(self._timed(attempt)))
+                pending |= done
+
+            while pending:
+                remaining = end - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            metrics.increment("llm_hedges", policy=self.name, result="won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # A tentativa que perdeu a corrida (ou estourou o tempo) é cancelada
+            for task in pending:
+                task.cancel()
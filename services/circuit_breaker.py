@@ -0,0 +1,124 @@
+import os
+import time
+from collections import deque
+
+from services.metrics import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+class CircuitOpen(Exception):
+    """
+    Chamada recusada porque o circuito do provedor está aberto
+    """
+
+class CircuitBreaker:
+    """
+    Disjuntor das chamadas ao modelo. Fechado, registra o resultado das chamadas
+    recentes e abre quando a taxa de erros e timeouts passa do limite. Aberto,
+    recusa chamadas até o tempo de espera terminar; depois fica meio-aberto e
+    libera poucas chamadas de teste, que decidem se ele fecha ou reabre.
+    """
+    def __init__(
+        self,
+        name: str = "llm",
+        failure_rate: float = 0.5,
+        min_calls: int = 10,
+        window_seconds: float = 30.0,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 1,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_at = 0.0
+        self._outcomes: deque = deque()
+        metrics.set_gauge("circuit_breaker_state", STATE_VALUES[CLOSED], breaker=name)
+
+    @classmethod
+    def from_env(cls, name: str = "llm") -> "CircuitBreaker":
+        """
+        Cria o disjuntor a partir das variáveis LLM_BREAKER_* do .env
+        """
+        return cls(
+            name,
+            failure_rate=float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5")),
+            min_calls=int(os.getenv("LLM_BREAKER_MIN_CALLS", "10")),
+            window_seconds=float(os.getenv("LLM_BREAKER_WINDOW_SECONDS", "30")),
+            open_seconds=float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30")),
+        )
+
+    @property
+    def state(self) -> str:
+        # O estado aberto expira sozinho: a próxima consulta já vê o meio-aberto
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == OPEN
+
+    def allow(self) -> bool:
+        """
+        Indica se uma chamada pode seguir; no meio-aberto reserva uma chamada de teste
+        """
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN:
+            # Uma chamada de teste cancelada não pode prender o circuito no meio-aberto
+            if self._probes >= self.half_open_calls and time.monotonic() - self._probe_at >= self.open_seconds:
+                self._probes = 0
+            if self._probes < self.half_open_calls:
+                self._probes += 1
+                self._probe_at = time.monotonic()
+                return True
+        metrics.increment("circuit_breaker_rejected", breaker=self.name)
+        return False
+
+    def record_success(self) -> None:
+        if self._state == HALF_OPEN:
+            self._transition(CLOSED)
+            return
+        self._record(True)
+
+    def record_failure(self, reason: str = "error") -> None:
+        metrics.increment("circuit_breaker_failures", breaker=self.name, reason=reason)
+        if self._state == HALF_OPEN:
+            self._transition(OPEN)
+            return
+        self._record(False)
+        if self._state == CLOSED and self._should_open():
+            self._transition(OPEN)
+
+    def _record(self, ok: bool) -> None:
+        now = time.monotonic()
+        self._outcomes.append((now, ok))
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+
+    def _should_open(self) -> bool:
+        if len(self._outcomes) < self.min_calls:
+            return False
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        return failures / len(self._outcomes) >= self.failure_rate
+
+    def _transition(self, state: str) -> None:
+        previous, self._state = self._state, state
+        self._probes = 0
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state == CLOSED:
+            self._outcomes.clear()
+        print(f"Circuito {self.name}: {previous} -> {state}")
+        metrics.increment("circuit_breaker_transitions", breaker=self.name, source=previous, target=state)
+        metrics.set_gauge("circuit_breaker_state", STATE_VALUES[state], breaker=self.name)
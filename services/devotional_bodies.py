@@ -0,0 +1,41 @@
+import hashlib
+from typing import Any, Dict, List, Tuple
+
+Row = Dict[str, Any]
+
+# Campos do corpo de um devocional gerado, na ordem usada pelo hash
+# (public.devotional_body_hash, em migrations/0006_corpos_de_devocionais.sql)
+BODY_FIELDS = ("texto", "versiculos", "reflexao", "oracao")
+
+def body_hash(body: Row) -> str:
+    """
+    Hash do conteúdo do corpo: SHA-256 (hex) dos campos em ordem fixa,
+    separados por \\x1f (os versículos entre si por \\x1e); campos ausentes
+    contam como texto vazio. É o mesmo valor calculado pelo banco.
+    """
+    parts = []
+    for field in BODY_FIELDS:
+        value = body.get(field)
+        if field == "versiculos":
+            value = "\x1e".join(verse or "" for verse in value or [])
+        parts.append(value or "")
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+def split_body(row: Row) -> Tuple[Row, Row]:
+    """
+    Separa uma linha de devocional no corpo (com o hash, para devotional_bodies)
+    e na linha que o referencia por body_hash
+    """
+    body = {field: row.get(field) for field in BODY_FIELDS}
+    body["versiculos"] = list(body["versiculos"] or [])
+    body["hash"] = body_hash(body)
+
+    reference = {key: value for key, value in row.items() if key not in BODY_FIELDS}
+    reference["body_hash"] = body["hash"]
+    return body, reference
+
+def unique_bodies(bodies: List[Row]) -> List[Row]:
+    """
+    Um corpo por hash (o mesmo conteúdo repetido num lote é gravado uma vez)
+    """
+    return list({body["hash"]: body for body in bodies}.values())
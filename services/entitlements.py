@@ -0,0 +1,61 @@
+import os
+from typing import Dict, Any
+
+from services.metrics import metrics
+from services.profile_cache import ProfileCache
+from services.repository import admin_repository
+
+# Cache curto dos direitos de uso; o webhook de pagamento invalida a entrada do usuário
+entitlement_cache = ProfileCache.from_env("entitlement", ttl_seconds=15, negative_ttl_seconds=15)
+
+def free_usage_limit() -> int:
+    return int(os.getenv("FREE_USAGE_LIMIT", "5"))
+
+def _entitlements(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "subscribed": bool(row.get("subscribed")),
+        "valid_until": row.get("valid_until"),
+        "usage_count": row.get("usage_count") or 0,
+        "remaining_free": row.get("remaining_free"),
+    }
+
+async def _load_entitlements(user_id: str) -> Dict[str, Any]:
+    row = await admin_repository.get_entitlements(user_id, free_usage_limit())
+    if row is None:
+        # Usuário ainda sem registros: sem assinatura e com todos os usos gratuitos
+        row = {"subscribed": False, "usage_count": 0, "remaining_free": free_usage_limit()}
+    return _entitlements(row)
+
+async def get_entitlements(user_id: str) -> Dict[str, Any]:
+    """
+    Direitos de uso do usuário (assinatura ativa com a validade aplicada,
+    validade, contagem de uso e usos gratuitos restantes, None para assinantes),
+    lidos do cache ou em uma única chamada ao banco
+    """
+    return await entitlement_cache.get(user_id, _load_entitlements)
+
+async def reserve_usage(user_id: str) -> Dict[str, Any]:
+    """
+    Reserva um devocional para o usuário e retorna os direitos de uso
+    atualizados, com "allowed". Quem o cache já mostra sem assinatura e sem
+    usos restantes é recusado sem ir ao banco; os demais, em uma chamada.
+    """
+    cached = await entitlement_cache.peek(user_id)
+    if cached is not None and not cached["subscribed"] and cached["remaining_free"] == 0:
+        metrics.increment("usage_reservations", result="denied_cached")
+        return {**cached, "allowed": False}
+
+    epoch = entitlement_cache.epoch
+    reservation = await admin_repository.reserve_usage(user_id, free_usage_limit())
+    entitlements = _entitlements(reservation)
+    await entitlement_cache.put(user_id, entitlements, epoch)
+    metrics.increment("usage_reservations", result="allowed" if reservation["allowed"] else "denied")
+    return {**entitlements, "allowed": bool(reservation["allowed"])}
+
+async def release_usage(user_id: str) -> None:
+    """
+    Devolve uma reserva de uso (geração que falhou ou devocional de contingência)
+    """
+    await admin_repository.release_usage(user_id)
+    await entitlement_cache.invalidate(user_id)
+    metrics.increment("usage_reservations", result="released")
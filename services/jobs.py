@@ -0,0 +1,313 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+from typing import Dict, Any, Optional, Callable, Awaitable, List
+
+from services.metrics import metrics
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+FINISHED_STATUSES = (DONE, FAILED)
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+class InMemoryJobBackend:
+    """
+    Fila de jobs em memória (perdida ao reiniciar o processo)
+    """
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._pending: List[str] = []
+
+    async def add(self, job: Dict[str, Any]) -> None:
+        self._jobs[job["id"]] = job
+        self._pending.append(job["id"])
+
+    async def claim(self) -> Optional[Dict[str, Any]]:
+        while self._pending:
+            job = self._jobs.get(self._pending.pop(0))
+            if job is not None and job["status"] == PENDING:
+                job.update(status=RUNNING, updated_at=time.time())
+                return dict(job)
+        return None
+
+    async def finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.update(status=status, result=result, error=error, updated_at=time.time())
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    async def count(self, status: str) -> int:
+        return sum(1 for job in self._jobs.values() if job["status"] == status)
+
+    async def prune(self, finished_before: float) -> int:
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["status"] in FINISHED_STATUSES and job["updated_at"] < finished_before
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+        return len(expired)
+
+    async def recover(self) -> int:
+        return 0
+
+class SQLiteJobBackend:
+    """
+    Fila de jobs persistida em SQLite, que sobrevive a reinícios em um único servidor
+    """
+    def __init__(self, path: str = "jobs.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at)")
+        return self._conn
+
+    def _run(self, operation: Callable[[sqlite3.Connection], Any]) -> Awaitable[Any]:
+        def locked():
+            with self._lock:
+                return operation(self._connection())
+        return asyncio.to_thread(locked)
+
+    @staticmethod
+    def _to_job(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    async def add(self, job: Dict[str, Any]) -> None:
+        await self._run(lambda conn: conn.execute(
+            "INSERT INTO jobs (id, kind, payload, status, result, error, created_at, updated_at) VALUES (?, ?, ?, ?, NULL, NULL, ?, ?)",
+            (job["id"], job["kind"], json.dumps(job["payload"]), job["status"], job["created_at"], job["updated_at"])
+        ))
+
+    async def claim(self) -> Optional[Dict[str, Any]]:
+        def operation(conn):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (PENDING,)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?",
+                        (RUNNING, time.time(), row["id"])
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            job = self._to_job(row)
+            if job is not None:
+                job["status"] = RUNNING
+            return job
+        return await self._run(operation)
+
+    async def finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        await self._run(lambda conn: conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+        ))
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(lambda conn: self._to_job(
+            conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        ))
+
+    async def count(self, status: str) -> int:
+        return await self._run(lambda conn: conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)
+        ).fetchone()[0])
+
+    async def prune(self, finished_before: float) -> int:
+        return await self._run(lambda conn: conn.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+            (*FINISHED_STATUSES, finished_before)
+        ).rowcount)
+
+    async def recover(self) -> int:
+        """
+        Devolve à fila os jobs que estavam em execução quando o processo parou
+        """
+        return await self._run(lambda conn: conn.execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ?",
+            (PENDING, time.time(), RUNNING)
+        ).rowcount)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+class JobQueue:
+    """
+    Fila de jobs assíncronos com pool de workers e espera por resultado (long-poll)
+    """
+    def __init__(self, backend, workers: int = 4, poll_interval: float = 1.0, result_ttl: float = 3600):
+        self.backend = backend
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.result_ttl = result_ttl
+        self._handlers: Dict[str, JobHandler] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._finished: Dict[str, asyncio.Event] = {}
+        # Quantas chamadas de wait() aguardam cada job; o evento sai com a última
+        self._waiters: Dict[str, int] = {}
+        self._last_prune = time.time()
+
+    @classmethod
+    def from_env(cls) -> "JobQueue":
+        """
+        Cria a fila a partir das variáveis JOB_* do .env
+        """
+        if os.getenv("JOB_BACKEND", "memory").lower() == "sqlite":
+            backend = SQLiteJobBackend(os.getenv("JOB_SQLITE_PATH", "jobs.db"))
+        else:
+            backend = InMemoryJobBackend()
+        return cls(
+            backend,
+            workers=int(os.getenv("JOB_WORKERS", "4")),
+            result_ttl=float(os.getenv("JOB_RESULT_TTL_SECONDS", "3600")),
+        )
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        recovered = await self.backend.recover()
+        if recovered:
+            print(f"{recovered} job(s) recolocados na fila após reinício")
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if hasattr(self.backend, "close"):
+            self.backend.close()
+
+    async def enqueue(self, kind: str, payload: Dict[str, Any]) -> str:
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "payload": payload,
+            "status": PENDING,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        await self.backend.add(job)
+        metrics.increment("jobs_enqueued", kind=kind)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job["id"]
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.backend.get(job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Aguarda até o job terminar ou o tempo limite expirar e retorna o estado atual
+        """
+        deadline = time.monotonic() + timeout
+        self._waiters[job_id] = self._waiters.get(job_id, 0) + 1
+        try:
+            while True:
+                job = await self.backend.get(job_id)
+                remaining = deadline - time.monotonic()
+                if job is None or job["status"] in FINISHED_STATUSES or remaining <= 0:
+                    return job
+
+                event = self._finished.setdefault(job_id, asyncio.Event())
+                try:
+                    # O polling cobre jobs concluídos por outro processo (backend SQLite)
+                    await asyncio.wait_for(event.wait(), min(remaining, self.poll_interval))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # Jobs que expiram, são removidos ou nunca existiram não deixam eventos para trás
+            self._waiters[job_id] -= 1
+            if self._waiters[job_id] == 0:
+                del self._waiters[job_id]
+                self._finished.pop(job_id, None)
+
+    async def _worker(self) -> None:
+        while True:
+            self._wakeup.clear()
+            job = await self.backend.claim()
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._execute(job)
+
+    async def _execute(self, job: Dict[str, Any]) -> None:
+        metrics.observe("job_queue_wait_seconds", time.time() - job["created_at"], kind=job["kind"])
+        handler = self._handlers.get(job["kind"])
+        try:
+            if handler is None:
+                raise Exception(f"Tipo de job desconhecido: {job['kind']}")
+            result = await handler(job["payload"])
+            await self.backend.finish(job["id"], DONE, result=result)
+            metrics.increment("jobs_finished", kind=job["kind"], status=DONE)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Erro ao processar job {job['id']}: {e}")
+            await self.backend.finish(job["id"], FAILED, error=str(e))
+            metrics.increment("jobs_finished", kind=job["kind"], status=FAILED)
+        finally:
+            event = self._finished.pop(job["id"], None)
+            if event is not None:
+                event.set()
+
+        if time.time() - self._last_prune > 60:
+            self._last_prune = time.time()
+            await self.backend.prune(time.time() - self.result_ttl)
+
+# Instância única usada pela aplicação
+job_queue = JobQueue.from_env()
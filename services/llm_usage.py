@@ -0,0 +1,155 @@
+import threading
+from collections import Counter, deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from services.metrics import metrics, _percentile, DEFAULT_WINDOW
+
+GROUP_FIELDS = ("model", "endpoint", "tier")
+SUMMARY_FIELDS = ("prompt_tokens", "output_tokens", "total_tokens", "ttft_seconds", "latency_seconds", "retries")
+TOKEN_FIELDS = ("prompt_tokens", "output_tokens", "total_tokens")
+SUMMARY_PERCENTILES = (50, 90, 99)
+
+# Tier usado nas chamadas feitas pela própria aplicação (ex.: pool de pré-geração)
+SYSTEM_TIER = "system"
+# Motivo de término que indica resposta cortada por max_output_tokens
+TRUNCATED_FINISH_REASON = "MAX_TOKENS"
+
+def usage_from_response(response: Any) -> Dict[str, Optional[int]]:
+    """
+    Lê a contagem de tokens de usage_metadata da resposta do Gemini
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return {field: None for field in TOKEN_FIELDS}
+    return {
+        "prompt_tokens": getattr(usage, "prompt_token_count", None),
+        "output_tokens": getattr(usage, "candidates_token_count", None),
+        "total_tokens": getattr(usage, "total_token_count", None),
+    }
+
+def finish_reason_from_response(response: Any) -> Optional[str]:
+    """
+    Motivo de término do primeiro candidato (STOP, MAX_TOKENS, SAFETY...)
+    """
+    candidates = getattr(response, "candidates", None) or []
+    reason = getattr(candidates[0], "finish_reason", None) if candidates else None
+    if reason is None:
+        return None
+    return getattr(reason, "name", None) or str(reason)
+
+class _Group:
+    __slots__ = ("calls", "errors", "tokens", "finish_reasons", "samples")
+
+    def __init__(self, window: int):
+        self.calls = 0
+        self.errors = 0
+        self.tokens: Counter = Counter()
+        self.finish_reasons: Counter = Counter()
+        self.samples = {field: deque(maxlen=window) for field in SUMMARY_FIELDS}
+
+class LLMUsageTracker:
+    """
+    Contabiliza tokens, latência, retries e motivo de término de cada requisição
+    ao modelo, agrupados por modelo, endpoint e tier do usuário, com percentis
+    sobre uma janela de amostras recentes.
+    """
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._groups: Dict[Tuple[str, str, str], _Group] = {}
+
+    def record(
+        self,
+        model: str,
+        endpoint: str,
+        tier: str,
+        latency: float,
+        ttft: Optional[float] = None,
+        retries: int = 0,
+        finish_reason: Optional[str] = None,
+        prompt_tokens: Optional[int] = None,
+        output_tokens: Optional[int] = None,
+        total_tokens: Optional[int] = None,
+        error: bool = False,
+    ) -> None:
+        labels = {"model": model, "endpoint": endpoint, "tier": tier}
+        values = {
+            "prompt_tokens": prompt_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": total_tokens,
+            "ttft_seconds": ttft,
+            "latency_seconds": latency,
+            "retries": retries,
+        }
+
+        with self._lock:
+            group = self._groups.get((model, endpoint, tier))
+            if group is None:
+                group = self._groups[(model, endpoint, tier)] = _Group(self.window)
+            group.calls += 1
+            group.errors += int(error)
+            if finish_reason:
+                group.finish_reasons[finish_reason] += 1
+            for field, value in values.items():
+                if value is not None:
+                    group.samples[field].append(value)
+                    if field in TOKEN_FIELDS:
+                        group.tokens[field] += value
+
+        metrics.increment("llm_requests", outcome="error" if error else "ok", **labels)
+        for field in TOKEN_FIELDS:
+            if values[field]:
+                metrics.increment("llm_tokens", values[field], kind=field, **labels)
+        if finish_reason:
+            metrics.increment("llm_finish_reasons", reason=finish_reason, **labels)
+            if finish_reason == TRUNCATED_FINISH_REASON:
+                print(f"Resposta do modelo {model} cortada por max_output_tokens ({output_tokens} tokens)")
+
+    def summary(self, group_by: Iterable[str] = GROUP_FIELDS, **filters: Optional[str]) -> List[Dict[str, Any]]:
+        """
+        Agrega os grupos pelos campos pedidos (model, endpoint, tier), aplicando
+        filtros opcionais, com totais de tokens e percentis p50/p90/p99
+        """
+        group_by = [field for field in GROUP_FIELDS if field in set(group_by)]
+        merged: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+
+        with self._lock:
+            for key, group in self._groups.items():
+                labels = dict(zip(GROUP_FIELDS, key))
+                if any(value and labels[field] != value for field, value in filters.items()):
+                    continue
+                bucket_key = tuple(labels[field] for field in group_by)
+                bucket = merged.setdefault(bucket_key, {
+                    "calls": 0, "errors": 0, "tokens": Counter(), "finish_reasons": Counter(),
+                    "samples": {field: [] for field in SUMMARY_FIELDS},
+                })
+                bucket["calls"] += group.calls
+                bucket["errors"] += group.errors
+                bucket["tokens"].update(group.tokens)
+                bucket["finish_reasons"].update(group.finish_reasons)
+                for field in SUMMARY_FIELDS:
+                    bucket["samples"][field].extend(group.samples[field])
+
+        result = []
+        for bucket_key, bucket in sorted(merged.items()):
+            percentiles = {}
+            for field, values in bucket["samples"].items():
+                if values:
+                    values.sort()
+                    percentiles[field] = {f"p{p}": _percentile(values, p) for p in SUMMARY_PERCENTILES}
+            result.append({
+                **dict(zip(group_by, bucket_key)),
+                "calls": bucket["calls"],
+                "errors": bucket["errors"],
+                "tokens": {field: bucket["tokens"][field] for field in TOKEN_FIELDS},
+                "finish_reasons": dict(bucket["finish_reasons"]),
+                "percentiles": percentiles,
+            })
+        return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._groups.clear()
+
+# Instância única usada pela aplicação
+llm_usage = LLMUsageTracker()
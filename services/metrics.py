@@ -0,0 +1,92 @@
+import threading
+from collections import defaultdict, deque
+from typing import Dict, Any, Optional
+
+# Quantidade de amostras mantidas por métrica para cálculo de percentis
+DEFAULT_WINDOW = 1024
+
+def _metric_key(name: str, labels: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Monta a chave da métrica no formato nome{label=valor,...}
+    """
+    if not labels:
+        return name
+    rendered = ",".join(f"{key}={labels[key]}" for key in sorted(labels))
+    return f"{name}{{{rendered}}}"
+
+def _percentile(sorted_values: list, percentile: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(percentile / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class MetricsRegistry:
+    """
+    Registro em memória de contadores, gauges e resumos com janela deslizante
+    """
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._samples: Dict[str, deque] = {}
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        with self._lock:
+            self._counters[_metric_key(name, labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._gauges[_metric_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _metric_key(name, labels)
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(value)
+
+    def counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(_metric_key(name, labels), 0)
+
+    def percentile(self, name: str, percentile: float, **labels) -> Optional[float]:
+        """
+        Retorna o percentil das amostras recentes, ou None se não houver amostras
+        """
+        with self._lock:
+            samples = self._samples.get(_metric_key(name, labels))
+            if not samples:
+                return None
+            values = sorted(samples)
+        return _percentile(values, percentile)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Retorna uma cópia de todas as métricas com resumos p50/p90/p99
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            samples = {key: sorted(values) for key, values in self._samples.items()}
+
+        summaries = {}
+        for key, values in samples.items():
+            summaries[key] = {
+                "count": len(values),
+                "p50": _percentile(values, 50),
+                "p90": _percentile(values, 90),
+                "p99": _percentile(values, 99),
+            }
+
+        return {"counters": counters, "gauges": gauges, "summaries": summaries}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._samples.clear()
+
+# Instância única usada pela aplicação
+metrics = MetricsRegistry()
@@ -0,0 +1,57 @@
+import base64
+import binascii
+import json
+from typing import Dict, Any, List, Optional, Tuple
+
+# Tamanho de página padrão e máximo das listagens de histórico
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Colunas da listagem leve (views devotional_summaries e saved_devotional_summaries)
+SUMMARY_COLUMNS = "id,created_at,sentimento,versiculo,resumo"
+
+class InvalidCursor(ValueError):
+    """Cursor de paginação malformado ou adulterado"""
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """
+    Cursor opaco com a posição (created_at, id) do último item da página
+    """
+    position = json.dumps({"created_at": row["created_at"], "id": row["id"]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    Retorna (created_at, id) do cursor. Lança InvalidCursor se for inválido.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at, row_id = position["created_at"], position["id"]
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError) as e:
+        raise InvalidCursor("Cursor de paginação inválido") from e
+    if not isinstance(created_at, str) or not isinstance(row_id, str):
+        raise InvalidCursor("Cursor de paginação inválido")
+    return created_at, row_id
+
+def _quote(value: str) -> str:
+    # Valores entre aspas no filtro or do PostgREST (datas têm ":" e "+")
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def keyset_filter(cursor: str) -> str:
+    """
+    Filtro "or" do PostgREST para os itens depois do cursor na ordem
+    (created_at desc, id desc): mais antigos, ou da mesma data com id menor
+    """
+    created_at, row_id = decode_cursor(cursor)
+    created_at, row_id = _quote(created_at), _quote(row_id)
+    return f"created_at.lt.{created_at},and(created_at.eq.{created_at},id.lt.{row_id})"
+
+def paginate(rows: List[Dict[str, Any]], limit: int) -> Dict[str, Any]:
+    """
+    Monta a página a partir de até limit + 1 linhas: a linha extra só indica
+    que há uma próxima página
+    """
+    items = rows[:limit]
+    next_cursor: Optional[str] = encode_cursor(items[-1]) if len(rows) > limit and items else None
+    return {"devotionals": items, "next_cursor": next_cursor}
@@ -0,0 +1,252 @@
+import os
+import copy
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable, Awaitable, Tuple
+
+from chains.single_flight import SingleFlight
+from services.metrics import metrics
+
+Profile = Optional[Dict[str, Any]]
+ProfileLoader = Callable[[str], Awaitable[Profile]]
+# (expira_em, perfil); perfil None é uma entrada negativa (id desconhecido)
+CachedProfile = Tuple[float, Profile]
+
+class InMemoryProfileBackend:
+    """
+    Perfis em memória do processo, em LRU limitado por número de entradas
+    """
+    def __init__(self, max_entries: int = 10000, name: str = "profile_cache"):
+        self.max_entries = max(1, max_entries)
+        self.name = name
+        self._entries: "OrderedDict[str, CachedProfile]" = OrderedDict()
+
+    async def get(self, user_id: str) -> Optional[CachedProfile]:
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            self._entries.move_to_end(user_id)
+        return entry
+
+    async def set(self, user_id: str, profile: Profile, expires_at: float) -> None:
+        self._entries[user_id] = (expires_at, copy.deepcopy(profile))
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            metrics.increment(f"{self.name}_evictions")
+
+    async def delete(self, user_id: str) -> None:
+        self._entries.pop(user_id, None)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+
+    async def size(self) -> int:
+        return len(self._entries)
+
+class SQLiteProfileBackend:
+    """
+    Perfis em um arquivo SQLite compartilhado pelos workers do mesmo servidor,
+    de modo que uma invalidação feita em um worker vale para todos
+    """
+    def __init__(self, path: str = "profile_cache.db", max_entries: int = 10000, table: str = "profile_cache"):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    user_id TEXT PRIMARY KEY,
+                    profile TEXT,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_accessed ON {self.table} (accessed_at)")
+        return self._conn
+
+    def _run(self, operation: Callable[[sqlite3.Connection], Any]) -> Awaitable[Any]:
+        def locked():
+            with self._lock:
+                return operation(self._connection())
+        return asyncio.to_thread(locked)
+
+    async def get(self, user_id: str) -> Optional[CachedProfile]:
+        def operation(conn):
+            row = conn.execute(
+                f"SELECT expires_at, profile FROM {self.table} WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE user_id = ?", (time.time(), user_id))
+            return row
+        row = await self._run(operation)
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]) if row[1] is not None else None
+
+    async def set(self, user_id: str, profile: Profile, expires_at: float) -> None:
+        def operation(conn):
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (user_id, profile, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (user_id, json.dumps(profile) if profile is not None else None, expires_at, time.time())
+            )
+            # Remove as entradas menos usadas recentemente acima do limite
+            evicted = conn.execute(
+                f"DELETE FROM {self.table} WHERE user_id IN ("
+                f"SELECT user_id FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            ).rowcount
+            if evicted > 0:
+                metrics.increment(f"{self.table}_evictions", evicted)
+        await self._run(operation)
+
+    async def delete(self, user_id: str) -> None:
+        await self._run(lambda conn: conn.execute(f"DELETE FROM {self.table} WHERE user_id = ?", (user_id,)))
+
+    async def clear(self) -> None:
+        await self._run(lambda conn: conn.execute(f"DELETE FROM {self.table}"))
+
+    async def size(self) -> int:
+        return await self._run(lambda conn: conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0])
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+class ProfileCache:
+    """
+    Cache por id de usuário com TTL curto: perfis lidos em get_current_user e,
+    com outra instância, direitos de uso (services/entitlements.py).
+    Ids desconhecidos também são guardados, com TTL próprio (cache negativo).
+    Leituras concorrentes de uma entrada ausente ou expirada viram uma única
+    consulta ao banco, evitando o efeito manada na expiração.
+    """
+    def __init__(
+        self,
+        backend=None,
+        ttl_seconds: float = 30,
+        negative_ttl_seconds: float = 10,
+        enabled: bool = True,
+        name: str = "profile",
+    ):
+        self.backend = backend if backend is not None else InMemoryProfileBackend(name=f"{name}_cache")
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.enabled = enabled
+        self.name = name
+        self._flight = SingleFlight(f"{name}s")
+        # Incrementado a cada invalidação: uma leitura iniciada antes dela não grava no cache
+        self._epoch = 0
+        # Contados por instância: perfis e direitos de uso têm estatísticas separadas
+        self._hits = 0
+        self._misses = 0
+
+    @classmethod
+    def from_env(cls, name: str = "profile", ttl_seconds: float = 30, negative_ttl_seconds: float = 10) -> "ProfileCache":
+        """
+        Cria o cache a partir das variáveis <NAME>_CACHE_* do .env
+        (ex.: PROFILE_CACHE_TTL_SECONDS); os argumentos são os valores padrão
+        """
+        prefix = f"{name.upper()}_CACHE"
+        table = f"{name}_cache"
+        max_entries = int(os.getenv(f"{prefix}_MAX_ENTRIES", "10000"))
+        if os.getenv(f"{prefix}_BACKEND", "memory").lower() == "sqlite":
+            backend = SQLiteProfileBackend(os.getenv(f"{prefix}_SQLITE_PATH", f"{table}.db"), max_entries, table)
+        else:
+            backend = InMemoryProfileBackend(max_entries, table)
+        return cls(
+            backend,
+            ttl_seconds=float(os.getenv(f"{prefix}_TTL_SECONDS", str(ttl_seconds))),
+            negative_ttl_seconds=float(os.getenv(f"{prefix}_NEGATIVE_TTL_SECONDS", str(negative_ttl_seconds))),
+            enabled=os.getenv(f"{prefix}_ENABLED", "true").lower() == "true",
+            name=name,
+        )
+
+    async def get(self, user_id: str, loader: ProfileLoader) -> Profile:
+        """
+        Retorna o perfil do usuário (ou None se não existir), consultando
+        loader apenas quando não há entrada válida no cache
+        """
+        if not self.enabled:
+            return await loader(user_id)
+
+        cached = await self.backend.get(user_id)
+        if cached is not None and cached[0] > time.time():
+            profile = cached[1]
+            self._hits += 1
+            metrics.increment(f"{self.name}_cache_requests", result="hit" if profile is not None else "negative_hit")
+            return copy.deepcopy(profile)
+
+        self._misses += 1
+        metrics.increment(f"{self.name}_cache_requests", result="miss")
+        return await self._flight.do(user_id, lambda: self._load(user_id, loader))
+
+    async def _load(self, user_id: str, loader: ProfileLoader) -> Profile:
+        epoch = self._epoch
+        profile = await loader(user_id)
+        if epoch == self._epoch:
+            ttl = self.ttl_seconds if profile is not None else self.negative_ttl_seconds
+            await self.backend.set(user_id, profile, time.time() + ttl)
+        return profile
+
+    async def peek(self, user_id: str) -> Profile:
+        """
+        Retorna a entrada ainda válida do usuário, sem consultar o banco
+        """
+        if not self.enabled:
+            return None
+        cached = await self.backend.get(user_id)
+        if cached is None or cached[0] <= time.time():
+            return None
+        return copy.deepcopy(cached[1])
+
+    @property
+    def epoch(self) -> int:
+        return self._epoch
+
+    async def put(self, user_id: str, value: Dict[str, Any], epoch: Optional[int] = None) -> None:
+        """
+        Grava um valor recém-obtido do banco (ex.: o resultado de uma escrita).
+        Com epoch (lido antes da consulta), não grava se houve invalidação no meio.
+        """
+        if not self.enabled or (epoch is not None and epoch != self._epoch):
+            return
+        await self.backend.set(user_id, value, time.time() + self.ttl_seconds)
+
+    async def invalidate(self, user_id: str) -> None:
+        """
+        Descarta a entrada do usuário (ex.: perfil alterado no cadastro ou login)
+        """
+        self._epoch += 1
+        await self.backend.delete(user_id)
+        metrics.increment(f"{self.name}_cache_invalidations")
+
+    async def clear(self) -> None:
+        self._epoch += 1
+        self._hits = 0
+        self._misses = 0
+        await self.backend.clear()
+
+    async def stats(self) -> Dict[str, Any]:
+        hits, misses = self._hits, self._misses
+        total = hits + misses
+        return {
+            "entries": await self.backend.size(),
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / total if total else 0.0,
+        }
+
+# Instância única usada pela aplicação
+profile_cache = ProfileCache.from_env()
@@ -0,0 +1,235 @@
+import asyncio
+import inspect
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from postgrest.types import ReturnMethod
+
+from services.supabase_client import supabase_clients
+from services.devotional_bodies import split_body, unique_bodies
+from services.pagination import SUMMARY_COLUMNS, keyset_filter
+
+Row = Dict[str, Any]
+
+async def maybe_await(value: Any) -> Any:
+    """
+    Aguarda o resultado de clientes assíncronos e repassa o de clientes síncronos
+    """
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+class SupabaseRepository:
+    """
+    Acesso assíncrono às tabelas do Supabase: um método por consulta usada pela
+    aplicação. As consultas rodam no cliente assíncrono compartilhado (pool
+    httpx.AsyncClient), então um PostgREST lento não congela o event loop.
+    Clientes síncronos também são aceitos (ex.: os fakes dos testes).
+    """
+    def __init__(self, client_factory: Callable[[], Any]):
+        self._client_factory = client_factory
+
+    @property
+    def client(self) -> Any:
+        return self._client_factory()
+
+    def _table(self, name: str) -> Any:
+        return self.client.table(name)
+
+    async def _execute(self, query: Any) -> List[Row]:
+        result = await maybe_await(query.execute())
+        return result.data or []
+
+    async def _first(self, query: Any) -> Optional[Row]:
+        rows = await self._execute(query)
+        return rows[0] if rows else None
+
+    async def _count(self, query: Any) -> int:
+        result = await maybe_await(query.execute())
+        return result.count or 0
+
+    async def _page(self, view: str, user_id: str, limit: int, cursor: Optional[str]) -> List[Row]:
+        # Paginação por chave (created_at, id): até limit + 1 linhas depois do cursor
+        query = self._table(view).select(SUMMARY_COLUMNS).eq("user_id", user_id)
+        if cursor:
+            query = query.or_(keyset_filter(cursor))
+        return await self._execute(
+            query.order("created_at", desc=True).order("id", desc=True).limit(limit + 1)
+        )
+
+    async def _rpc(self, function: str, params: Row) -> Any:
+        result = await maybe_await(self.client.rpc(function, params).execute())
+        return result.data
+
+    # Perfis
+
+    async def get_profile(self, user_id: str) -> Optional[Row]:
+        return await self._first(self._table("profiles").select("*").eq("id", user_id))
+
+    async def get_existing_profile_ids(self, user_ids: List[str]) -> Set[str]:
+        rows = await self._execute(self._table("profiles").select("id").in_("id", user_ids))
+        return {row["id"] for row in rows}
+
+    async def insert_profile(self, profile: Row) -> None:
+        await self._execute(self._table("profiles").insert(profile))
+
+    async def update_profile(self, user_id: str, fields: Row) -> None:
+        await self._execute(self._table("profiles").update(fields).eq("id", user_id))
+
+    # Assinaturas
+
+    async def get_subscription(self, user_id: str) -> Optional[Row]:
+        return await self._first(self._table("subscriptions").select("*").eq("user_id", user_id))
+
+    async def insert_subscription(self, subscription: Row) -> None:
+        await self._execute(self._table("subscriptions").insert(subscription))
+
+    async def update_subscription(self, user_id: str, fields: Row) -> None:
+        await self._execute(self._table("subscriptions").update(fields).eq("user_id", user_id))
+
+    # Uso
+
+    async def get_usage(self, user_id: str) -> Optional[Row]:
+        return await self._first(self._table("usages").select("*").eq("user_id", user_id))
+
+    async def insert_usage(self, usage: Row) -> None:
+        await self._execute(self._table("usages").insert(usage))
+
+    async def upsert_usages(self, usages: List[Row]) -> None:
+        await self._execute(self._table("usages").upsert(usages, on_conflict="user_id"))
+
+    async def get_entitlements(self, user_id: str, free_limit: int) -> Optional[Row]:
+        """
+        Direitos de uso do usuário em uma chamada (função get_entitlements, em
+        migrations/0004_cota_de_uso.sql): subscribed, valid_until, usage_count
+        e remaining_free. None se o usuário não tiver perfil.
+        """
+        data = await self._rpc("get_entitlements", {"p_user_id": user_id, "p_free_limit": free_limit})
+        if isinstance(data, list):
+            return data[0] if data else None
+        return data
+
+    async def reserve_usage(self, user_id: str, free_limit: int) -> Row:
+        """
+        Verifica o direito de uso e reserva um devocional atomicamente (função
+        reserve_usage, em migrations/0004_cota_de_uso.sql). Retorna allowed e os
+        direitos de uso atualizados, nas colunas de get_entitlements.
+        """
+        data = await self._rpc("reserve_usage", {"p_user_id": user_id, "p_free_limit": free_limit})
+        return data[0] if isinstance(data, list) else data
+
+    async def release_usage(self, user_id: str) -> int:
+        """
+        Devolve uma reserva feita por reserve_usage; retorna a nova contagem
+        """
+        return await self._rpc("release_usage", {"p_user_id": user_id})
+
+    async def increment_usages(self, increments: Dict[str, int]) -> None:
+        """
+        Soma increments[user_id] à contagem de uso de cada usuário num único
+        UPDATE atômico (função increment_usages, em migrations/0007_incremento_de_uso.sql)
+        """
+        user_ids = list(increments)
+        await self._rpc("increment_usages", {"p_user_ids": user_ids, "p_counts": [increments[user_id] for user_id in user_ids]})
+
+    async def get_subscription_and_usage(self, user_id: str) -> Tuple[Optional[Row], Optional[Row]]:
+        """
+        Lê assinatura e uso do usuário em paralelo
+        """
+        subscription, usage = await asyncio.gather(self.get_subscription(user_id), self.get_usage(user_id))
+        return subscription, usage
+
+    # Corpos de devocionais
+
+    async def insert_devotional_bodies(self, bodies: List[Row]) -> None:
+        # Corpos já gravados são mantidos (ON CONFLICT DO NOTHING): o hash identifica o conteúdo
+        await self._execute(
+            self._table("devotional_bodies").upsert(
+                unique_bodies(bodies), on_conflict="hash", ignore_duplicates=True, returning=ReturnMethod.minimal
+            )
+        )
+
+    # Devocionais
+
+    async def insert_devotionals(self, devotionals: List[Row]) -> None:
+        """
+        Grava os devocionais do lote: os corpos ainda não gravados em
+        devotional_bodies e as linhas de devotionals com a referência body_hash
+        """
+        bodies, rows = zip(*(split_body(devotional) for devotional in devotionals))
+        await self.insert_devotional_bodies(list(bodies))
+        await self._execute(self._table("devotionals").insert(list(rows)))
+
+    async def list_devotionals(self, user_id: str, limit: int, cursor: Optional[str] = None) -> List[Row]:
+        return await self._page("devotional_summaries", user_id, limit, cursor)
+
+    async def get_devotional(self, user_id: str, devotional_id: str) -> Optional[Row]:
+        return await self._first(
+            self._table("devotional_details").select("*").eq("id", devotional_id).eq("user_id", user_id)
+        )
+
+    async def list_recent_feelings(self, limit: int) -> List[str]:
+        rows = await self._execute(
+            self._table("devotionals").select("sentimento").order("created_at", desc=True).limit(limit)
+        )
+        return [row["sentimento"] for row in rows if row.get("sentimento")]
+
+    # Devocionais salvos
+
+    async def find_devotional_by_body(self, user_id: str, body_hash: str) -> Optional[Row]:
+        """
+        Um devocional do histórico do usuário com o corpo body_hash
+        """
+        return await self._first(
+            self._table("devotionals").select("id").eq("user_id", user_id).eq("body_hash", body_hash).limit(1)
+        )
+
+    async def save_devotional(self, devotional: Row) -> List[Row]:
+        """
+        Salva para o usuário um devocional gerado, referenciando o corpo dele
+        (body_hash). Salvar de novo o mesmo devocional não cria outra linha:
+        retorna a linha criada ou lista vazia se o usuário já o tinha salvo.
+        """
+        return await self._execute(
+            self._table("saved_devotionals").upsert(devotional, on_conflict="user_id,body_hash", ignore_duplicates=True)
+        )
+
+    async def list_saved_devotionals(self, user_id: str, limit: int, cursor: Optional[str] = None) -> List[Row]:
+        return await self._page("saved_devotional_summaries", user_id, limit, cursor)
+
+    async def get_saved_devotional(self, user_id: str, devotional_id: str) -> Optional[Row]:
+        return await self._first(
+            self._table("saved_devotional_details").select("*").eq("id", devotional_id).eq("user_id", user_id)
+        )
+
+    async def count_saved_devotionals(self, user_id: str) -> int:
+        # Contagem exata no banco (HEAD): nenhuma linha é transferida
+        return await self._count(
+            self._table("saved_devotionals").select("id", count="exact", head=True).eq("user_id", user_id)
+        )
+
+    # Estatísticas
+
+    async def get_user_stats(self, user_id: str) -> Optional[Row]:
+        """
+        Totais e sequência de dias do usuário (função get_user_stats, em
+        migrations/0005_estatisticas_do_usuario.sql): generated_count,
+        saved_count e streak
+        """
+        data = await self._rpc("get_user_stats", {"p_user_id": user_id})
+        if isinstance(data, list):
+            return data[0] if data else None
+        return data
+
+    # Configurações
+
+    async def get_user_settings(self, user_id: str) -> Optional[Row]:
+        # Colunas renomeadas para as chaves usadas pelo painel
+        return await self._first(
+            self._table("user_settings")
+            .select("emailNotifications:email_notifications,saveHistory:save_history")
+            .eq("user_id", user_id)
+        )
+
+# Repositórios usados pela aplicação: chave anon e service_role
+repository = SupabaseRepository(supabase_clients.async_anon)
+admin_repository = SupabaseRepository(supabase_clients.async_service)
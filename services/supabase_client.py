@@ -1,34 +1,216 @@
 import os
-from supabase import create_client, Client
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import httpx
+from supabase import create_client, Client, ClientOptions, AsyncClient, AsyncClientOptions
 from dotenv import load_dotenv
 
 # Carregando variáveis de ambiente
 load_dotenv()
 
+ANON = "anon"
+SERVICE = "service"
+_KEY_VARIABLES = {ANON: "SUPABASE_KEY", SERVICE: "SUPABASE_SERVICE_KEY"}
+
+class SupabaseClients:
+    """
+    Clientes do Supabase compartilhados pelo processo. Os clientes anon e
+    service_role ficam separados, mas usam o mesmo pool de conexões HTTP com
+    keep-alive, criado uma única vez (no lifespan da aplicação ou no primeiro uso).
+    Os clientes compartilhados não guardam sessão de usuário: login e cadastro
+    usam auth_client(), que cria um cliente isolado sobre o mesmo pool.
+    As versões assíncronas (async_anon, async_service, async_auth_client) usam
+    um pool httpx.AsyncClient próprio, com os mesmos limites, e são as usadas
+    pelos handlers (ver services/repository.py).
+    """
+    def __init__(
+        self,
+        max_connections: int = 20,
+        max_keepalive: int = 10,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 10.0,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._http: Optional[httpx.Client] = None
+        self._clients: Dict[str, Client] = {}
+        self._async_http: Optional[httpx.AsyncClient] = None
+        self._async_clients: Dict[str, AsyncClient] = {}
+        self._overrides: Dict[str, Any] = {}
+
+    @classmethod
+    def from_env(cls) -> "SupabaseClients":
+        """
+        Cria o gerenciador a partir das variáveis SUPABASE_* do .env
+        """
+        return cls(
+            max_connections=int(os.getenv("SUPABASE_MAX_CONNECTIONS", "20")),
+            max_keepalive=int(os.getenv("SUPABASE_MAX_KEEPALIVE_CONNECTIONS", "10")),
+            keepalive_expiry=float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY_SECONDS", "30")),
+            timeout=float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "10")),
+        )
+
+    @property
+    def http(self) -> httpx.Client:
+        with self._lock:
+            if self._http is None:
+                self._http = httpx.Client(limits=self.limits, timeout=self.timeout, follow_redirects=True)
+            return self._http
+
+    @property
+    def async_http(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._async_http is None:
+                self._async_http = httpx.AsyncClient(limits=self.limits, timeout=self.timeout, follow_redirects=True)
+            return self._async_http
+
+    def _options(self) -> ClientOptions:
+        return ClientOptions(httpx_client=self.http, auto_refresh_token=False, persist_session=False)
+
+    def _async_options(self) -> AsyncClientOptions:
+        return AsyncClientOptions(httpx_client=self.async_http, auto_refresh_token=False, persist_session=False)
+
+    def _credentials(self, kind: str) -> Tuple[str, str]:
+        url = os.getenv("SUPABASE_URL")
+        key = os.getenv(_KEY_VARIABLES[kind])
+        if not url or not key:
+            raise ValueError(f"SUPABASE_URL e {_KEY_VARIABLES[kind]} devem estar definidos no arquivo .env")
+        return url, key
+
+    def _create(self, kind: str) -> Client:
+        url, key = self._credentials(kind)
+        return create_client(url, key, options=self._options())
+
+    def _create_async(self, kind: str) -> AsyncClient:
+        url, key = self._credentials(kind)
+        return AsyncClient(url, key, options=self._async_options())
+
+    def _get(self, kind: str) -> Client:
+        if kind in self._overrides:
+            return self._overrides[kind]
+        client = self._clients.get(kind)
+        if client is None:
+            client = self._create(kind)
+            with self._lock:
+                client = self._clients.setdefault(kind, client)
+        return client
+
+    def _get_async(self, kind: str) -> AsyncClient:
+        if kind in self._overrides:
+            return self._overrides[kind]
+        client = self._async_clients.get(kind)
+        if client is None:
+            client = self._create_async(kind)
+            with self._lock:
+                client = self._async_clients.setdefault(kind, client)
+        return client
+
+    def anon(self) -> Client:
+        return self._get(ANON)
+
+    def service(self) -> Client:
+        return self._get(SERVICE)
+
+    def auth_client(self) -> Client:
+        """
+        Cliente isolado para login e cadastro: a sessão do usuário não vaza
+        para os clientes compartilhados
+        """
+        if ANON in self._overrides:
+            return self._overrides[ANON]
+        return self._create(ANON)
+
+    def async_anon(self) -> AsyncClient:
+        return self._get_async(ANON)
+
+    def async_service(self) -> AsyncClient:
+        return self._get_async(SERVICE)
+
+    def async_auth_client(self) -> AsyncClient:
+        """
+        Versão assíncrona de auth_client(), sobre o pool assíncrono
+        """
+        if ANON in self._overrides:
+            return self._overrides[ANON]
+        return self._create_async(ANON)
+
+    def start(self) -> None:
+        """
+        Cria o pool de conexões e os clientes configurados no .env
+        """
+        self.http
+        self.async_http
+        for kind in (ANON, SERVICE):
+            try:
+                self._get(kind)
+                self._get_async(kind)
+            except ValueError as e:
+                print(f"Cliente Supabase {kind} não iniciado: {e}")
+
+    def close(self) -> None:
+        """
+        Fecha o pool de conexões; os próximos usos criam clientes novos
+        """
+        with self._lock:
+            http, self._http = self._http, None
+            self._clients.clear()
+        if http is not None:
+            http.close()
+
+    async def aclose(self) -> None:
+        """
+        Fecha os dois pools, o síncrono e o assíncrono
+        """
+        with self._lock:
+            async_http, self._async_http = self._async_http, None
+            self._async_clients.clear()
+        if async_http is not None:
+            await async_http.aclose()
+        self.close()
+
+    @contextmanager
+    def override(self, anon: Any = None, service: Any = None) -> Iterator[None]:
+        """
+        Substitui os clientes durante o bloco (ex.: um fake nos testes)
+        """
+        previous = dict(self._overrides)
+        if anon is not None:
+            self._overrides[ANON] = anon
+        if service is not None:
+            self._overrides[SERVICE] = service
+        try:
+            yield
+        finally:
+            self._overrides = previous
+
+# Instância única usada pela aplicação
+supabase_clients = SupabaseClients.from_env()
+
 def get_supabase_client() -> Client:
     """
-    Retorna um cliente do Supabase configurado com as credenciais do .env
+    Retorna o cliente do Supabase (chave anon) compartilhado pelo processo
     """
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_KEY")
-    
-    if not url or not key:
-        raise ValueError("SUPABASE_URL e SUPABASE_KEY devem estar definidos no arquivo .env")
-    
-    return create_client(url, key)
+    return supabase_clients.anon()
 
 def get_supabase_admin_client() -> Client:
     """
-    Retorna um cliente do Supabase com permissões de administrador (service_role)
+    Retorna o cliente do Supabase com permissões de administrador (service_role)
     Usado para operações que exigem mais privilégios
     """
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_SERVICE_KEY")
-    
-    if not url or not key:
-        raise ValueError("SUPABASE_URL e SUPABASE_SERVICE_KEY devem estar definidos no arquivo .env")
-    
-    return create_client(url, key)
+    return supabase_clients.service()
+
+def get_supabase_auth_client() -> Client:
+    """
+    Retorna um cliente (chave anon) só para o fluxo de login e cadastro
+    """
+    return supabase_clients.auth_client()
 
 def setup_database_tables():
     """
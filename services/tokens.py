@@ -0,0 +1,137 @@
+import os
+import time
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+
+from jose import jwt
+from dotenv import load_dotenv
+
+# Carregando variáveis de ambiente
+load_dotenv()
+
+# Campos do perfil embutidos no token no modo de claims
+PROFILE_CLAIMS = ("id", "email", "nome", "created_at")
+
+def _secret_key() -> Optional[str]:
+    return os.getenv("SECRET_KEY")
+
+def _algorithm() -> str:
+    return os.getenv("ALGORITHM", "HS256")
+
+def claims_enabled() -> bool:
+    """
+    Modo de claims (JWT_EMBED_CLAIMS=true): o token carrega perfil e assinatura
+    e get_current_user não precisa consultar o banco
+    """
+    return os.getenv("JWT_EMBED_CLAIMS", "false").lower() == "true"
+
+def claims_max_age() -> float:
+    """
+    Idade máxima, em segundos, em que as claims são aceitas sem nova consulta
+    ao banco; limita a janela em que uma mudança de plano ainda não foi vista
+    """
+    return float(os.getenv("JWT_CLAIMS_MAX_AGE_SECONDS", "300"))
+
+def token_lifetime() -> float:
+    return int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60")) * 60
+
+class TokenRevocations:
+    """
+    Registro em memória, por usuário, de logouts (tokens anteriores são
+    recusados) e de mudanças de plano (claims anteriores deixam de valer e o
+    perfil é relido do banco). Entradas mais antigas que a validade dos tokens
+    são descartadas, pois todo token anterior a elas já expirou.
+    """
+    def __init__(self, retention_seconds: Optional[float] = None):
+        self.retention_seconds = retention_seconds
+        self._revoked: Dict[str, float] = {}
+        self._changed: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def revoke(self, user_id: str) -> None:
+        self._mark(self._revoked, user_id)
+
+    def mark_changed(self, user_id: str) -> None:
+        self._mark(self._changed, user_id)
+
+    def is_revoked(self, user_id: str, issued_at: float) -> bool:
+        revoked_at = self._revoked.get(user_id)
+        return revoked_at is not None and issued_at <= revoked_at
+
+    def is_stale(self, user_id: str, issued_at: float) -> bool:
+        changed_at = self._changed.get(user_id)
+        return changed_at is not None and issued_at <= changed_at
+
+    def clear(self) -> None:
+        with self._lock:
+            self._revoked.clear()
+            self._changed.clear()
+
+    def _mark(self, entries: Dict[str, float], user_id: str) -> None:
+        now = time.time()
+        retention = self.retention_seconds if self.retention_seconds is not None else token_lifetime()
+        with self._lock:
+            entries[user_id] = now
+            for registry in (self._revoked, self._changed):
+                for expired in [key for key, marked_at in registry.items() if now - marked_at > retention]:
+                    del registry[expired]
+
+# Instância única usada pela aplicação
+token_revocations = TokenRevocations()
+
+def create_access_token(data: dict) -> str:
+    """
+    Cria um token JWT assinado com as claims informadas, mais expiração e
+    instante de emissão ("ver", com fração de segundo, usado nas revogações)
+    """
+    to_encode = data.copy()
+    expire = datetime.utcnow() + timedelta(seconds=token_lifetime())
+    to_encode.update({"exp": expire, "ver": time.time()})
+    return jwt.encode(to_encode, _secret_key(), algorithm=_algorithm())
+
+def decode_access_token(token: str) -> Dict[str, Any]:
+    """
+    Valida assinatura e expiração do token e retorna as claims.
+    Lança JWTError se o token for inválido.
+    """
+    return jwt.decode(token, _secret_key(), algorithms=[_algorithm()])
+
+def issued_at(payload: Dict[str, Any]) -> float:
+    return float(payload.get("ver", 0))
+
+def create_user_token(user: Dict[str, Any], subscription: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Token de login do usuário. No modo de claims, embute os campos do perfil e
+    o plano (tier e validade da assinatura)
+    """
+    claims: Dict[str, Any] = {"sub": user["id"]}
+    if claims_enabled():
+        is_active = bool(subscription and subscription.get("is_active", False))
+        claims.update({
+            "profile": {field: user.get(field) for field in PROFILE_CLAIMS},
+            "tier": "subscriber" if is_active else "free",
+            "subscription_valid_until": subscription.get("valid_until") if subscription else None,
+        })
+    return create_access_token(claims)
+
+def user_from_claims(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Monta o usuário a partir das claims do token, ou None quando o token não
+    as tem, quando são mais antigas que JWT_CLAIMS_MAX_AGE_SECONDS ou quando o
+    plano do usuário mudou depois da emissão
+    """
+    if not claims_enabled() or "profile" not in payload:
+        return None
+    user_id = payload.get("sub")
+    emitted = issued_at(payload)
+    if time.time() - emitted > claims_max_age() or token_revocations.is_stale(user_id, emitted):
+        return None
+    return {
+        **payload["profile"],
+        "id": user_id,
+        "subscription": {
+            "is_active": payload.get("tier") == "subscriber",
+            "valid_until": payload.get("subscription_valid_until"),
+        },
+    }
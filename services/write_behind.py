@@ -0,0 +1,202 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from services.metrics import metrics
+from services.repository import admin_repository
+
+Row = Dict[str, Any]
+BatchWriter = Callable[[List[Row]], Awaitable[Any]]
+
+class WriteChannel:
+    """
+    Escritas pendentes de uma tabela. Com key, escritas repetidas para a mesma
+    chave são combinadas e só a mais recente de cada campo é gravada (upsert);
+    sem key, cada linha é gravada (insert).
+    """
+    def __init__(self, name: str, writer: BatchWriter, key: Optional[str] = None):
+        self.name = name
+        self.writer = writer
+        self.key = key
+        self.failures = 0
+        self._rows: Dict[Any, Row] = {}
+        self._appended: List[Row] = []
+
+    def __len__(self) -> int:
+        return len(self._rows) + len(self._appended)
+
+    def add(self, row: Row) -> None:
+        if self.key is None:
+            self._appended.append(row)
+        else:
+            key = row[self.key]
+            self._rows[key] = {**self._rows.get(key, {}), **row}
+
+    def take(self) -> List[Row]:
+        rows = list(self._rows.values()) + self._appended
+        self._rows, self._appended = {}, []
+        return rows
+
+    def restore(self, rows: List[Row]) -> None:
+        # Devolve um lote que falhou sem sobrescrever escritas mais novas da mesma chave
+        if self.key is None:
+            self._appended = rows + self._appended
+            return
+        for row in rows:
+            key = row[self.key]
+            self._rows[key] = {**row, **self._rows.get(key, {})}
+
+class WriteBehindBuffer:
+    """
+    Buffer em memória para escritas que não precisam acontecer antes da
+    resposta (último acesso, histórico de devocionais). As escritas são
+    gravadas em lote a cada flush_interval segundos ou quando max_batch linhas
+    se acumulam, e no encerramento da aplicação; uma queda do processo perde
+    no máximo uma janela. Sem o flusher rodando (scripts, testes sem lifespan)
+    ou com WRITE_BEHIND_ENABLED=false, a escrita é feita na hora.
+    """
+    def __init__(self, flush_interval: float = 1.0, max_batch: int = 200, max_retries: int = 3, enabled: bool = True):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.enabled = enabled
+        self._channels: Dict[str, WriteChannel] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        # Concluído quando o flush em andamento termina de gravar seus lotes
+        self._flushing: Optional[asyncio.Future] = None
+
+    @classmethod
+    def from_env(cls) -> "WriteBehindBuffer":
+        """
+        Cria o buffer a partir das variáveis WRITE_BEHIND_* do .env
+        """
+        return cls(
+            flush_interval=float(os.getenv("WRITE_BEHIND_FLUSH_SECONDS", "1")),
+            max_batch=int(os.getenv("WRITE_BEHIND_MAX_BATCH", "200")),
+            max_retries=int(os.getenv("WRITE_BEHIND_MAX_RETRIES", "3")),
+            enabled=os.getenv("WRITE_BEHIND_ENABLED", "true").lower() == "true",
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    @property
+    def pending(self) -> int:
+        return sum(len(channel) for channel in self._channels.values())
+
+    @property
+    def flushing(self) -> bool:
+        return self._flushing is not None
+
+    def register(self, name: str, writer: BatchWriter, key: Optional[str] = None) -> None:
+        self._channels[name] = WriteChannel(name, writer, key)
+
+    async def add(self, name: str, row: Row) -> None:
+        """
+        Agenda a escrita de uma linha no canal; grava na hora se o buffer não
+        estiver rodando
+        """
+        channel = self._channels[name]
+        if not self.running:
+            await channel.writer([row])
+            metrics.increment("write_behind_rows", channel=name, result="direct")
+            return
+
+        channel.add(row)
+        metrics.increment("write_behind_rows", channel=name, result="buffered")
+        if len(channel) >= self.max_batch:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Para o flusher e grava o que ainda estiver pendente
+        """
+        if self._task is not None:
+            # Sem cancelar: um lote em gravação termina antes do flush final
+            self._stopping = True
+            self._wakeup.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self._stopping = False
+        await self.flush(final=True)
+
+    async def flush(self, final: bool = False) -> int:
+        """
+        Grava as escritas pendentes em lotes de até max_batch linhas e retorna
+        quantas foram gravadas. Lotes que falham voltam ao buffer e são
+        descartados depois de max_retries tentativas (ou no flush final).
+        Um flush já em andamento termina antes deste começar, então quem
+        chama sabe que tudo o que estava no buffer já foi gravado.
+        """
+        while self._flushing is not None:
+            await asyncio.shield(self._flushing)
+        self._flushing = asyncio.get_running_loop().create_future()
+        try:
+            return await self._flush(final)
+        finally:
+            self._flushing.set_result(None)
+            self._flushing = None
+
+    async def _flush(self, final: bool) -> int:
+        written = 0
+        for channel in self._channels.values():
+            rows = channel.take()
+            if not rows:
+                continue
+            start = time.perf_counter()
+            for index in range(0, len(rows), self.max_batch):
+                batch = rows[index:index + self.max_batch]
+                try:
+                    await channel.writer(batch)
+                except Exception as e:
+                    self._failed(channel, rows[index:], e, final)
+                    break
+                written += len(batch)
+                channel.failures = 0
+                metrics.increment("write_behind_rows", len(batch), channel=channel.name, result="written")
+            metrics.observe("write_behind_flush_seconds", time.perf_counter() - start, channel=channel.name)
+        return written
+
+    def _failed(self, channel: WriteChannel, rows: List[Row], error: Exception, final: bool) -> None:
+        channel.failures += 1
+        if final or channel.failures > self.max_retries:
+            print(f"Escrita em segundo plano descartada ({channel.name}, {len(rows)} linhas): {error}")
+            metrics.increment("write_behind_rows", len(rows), channel=channel.name, result="dropped")
+            channel.failures = 0
+            return
+        print(f"Erro na escrita em segundo plano ({channel.name}), nova tentativa no próximo flush: {error}")
+        channel.restore(rows)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Erro no flush das escritas em segundo plano: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "pending": {name: len(channel) for name, channel in self._channels.items()},
+        }
+
+# Instância única usada pela aplicação: gravada com a service_role, em lote
+write_behind = WriteBehindBuffer.from_env()
+# Último acesso: só o mais recente de cada usuário é gravado
+write_behind.register("usages", admin_repository.upsert_usages, key="user_id")
+# Histórico de devocionais gerados
+write_behind.register("devotionals", admin_repository.insert_devotionals)
@@ -3,6 +3,10 @@
 class Dashboard {
     constructor() {
         this.currentSection = 'devotionals';
+        // Gera devocionais via API de jobs (sem segurar a conexão durante a geração)
+        this.useJobApi = true;
+        // Devocional exibido; body_hash identifica o corpo gerado ao salvar
+        this.currentDevotional = null;
         this.init();
     }
 
@@ -232,22 +236,9 @@ class Dashboard {
 
         try {
             const token = localStorage.getItem('auth_token');
-            const response = await fetch('/generate_devotional', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'Authorization': `Bearer ${token}`
-                },
-                body: JSON.stringify({
-                    sentimento: sentimentoInput.value
-                })
-            });
-
-            if (!response.ok) {
-                throw new Error('Erro na resposta do servidor');
-            }
-
-            const data = await response.json();
+            const data = this.useJobApi
+                ? await this.generateDevotionalViaJob(sentimentoInput.value, token)
+                : await this.generateDevotionalDirect(sentimentoInput.value, token);
             this.displayDevotional(data);
 
         } catch (error) {
@@ -261,7 +252,62 @@ class Dashboard {
         }
     }
 
+    async generateDevotionalDirect(sentimento, token) {
+        const response = await fetch('/generate_devotional', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${token}`
+            },
+            body: JSON.stringify({ sentimento })
+        });
+
+        if (!response.ok) {
+            throw new Error('Erro na resposta do servidor');
+        }
+
+        return response.json();
+    }
+
+    async generateDevotionalViaJob(sentimento, token) {
+        const headers = {
+            'Content-Type': 'application/json',
+            'Authorization': `Bearer ${token}`
+        };
+
+        const response = await fetch('/api/jobs', {
+            method: 'POST',
+            headers,
+            body: JSON.stringify({ sentimento })
+        });
+
+        if (!response.ok) {
+            throw new Error('Erro ao enfileirar devocional');
+        }
+
+        const { job_id: jobId } = await response.json();
+
+        // Long-poll: o servidor segura a requisição até o job terminar (máx. 25s por chamada)
+        while (true) {
+            const statusResponse = await fetch(`/api/jobs/${jobId}?wait=25`, { headers });
+
+            if (!statusResponse.ok) {
+                throw new Error('Erro ao consultar devocional');
+            }
+
+            const job = await statusResponse.json();
+            if (job.status === 'done') {
+                return job.result;
+            }
+            if (job.status === 'failed') {
+                throw new Error(job.error || 'Erro ao gerar devocional');
+            }
+        }
+    }
+
     displayDevotional(data) {
+        this.currentDevotional = data;
+
         // Update devotional content
         document.getElementById('devotional-greeting').innerHTML = data.greeting || '';
         document.getElementById('devotional-verse-text').innerHTML = data.verse_text || '';
@@ -325,14 +371,11 @@ class Dashboard {
         const sentimentoInput = document.getElementById('sentimento');
         const saveBtn = document.getElementById('save-btn');
 
+        // O texto não é reenviado: o salvo referencia o devocional gerado
         const devotionalData = {
             sentimento: sentimentoInput.value,
             greeting: document.getElementById('devotional-greeting').textContent,
-            verse: {
-                text: document.getElementById('devotional-verse-text').textContent,
-                reference: document.getElementById('devotional-verse-reference').textContent
-            },
-            content: document.getElementById('devotional-content').textContent,
+            body_hash: this.currentDevotional && this.currentDevotional.body_hash,
             date: new Date().toISOString()
         };
 
@@ -361,7 +404,19 @@ class Dashboard {
 }
 
 // Logout function
-window.logout = function() {
+window.logout = async function() {
+    const token = localStorage.getItem('auth_token');
+    if (token) {
+        try {
+            // Revoga o token no servidor antes de descartá-lo
+            await fetch('/api/auth/logout', {
+                method: 'POST',
+                headers: { 'Authorization': `Bearer ${token}` }
+            });
+        } catch (error) {
+            console.error('Erro ao encerrar sessão:', error);
+        }
+    }
     localStorage.removeItem('auth_token');
     window.location.href = '/';
 };
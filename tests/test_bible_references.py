@@ -0,0 +1,84 @@
+import re
+import time
+from pathlib import Path
+
+from chains.bible_references import (
+    BOOKS,
+    BibleReference,
+    chapter_count,
+    extract_verses,
+    find_references,
+    make_reference,
+)
+
+FIXTURES = Path(__file__).parent / "fixtures" / "gemini_outputs"
+
+# Regex genérico usado antes do índice de livros
+LEGACY_PATTERN = r'([1-3]?\s*[A-ZÀ-Úa-zà-ú]+)\s+(\d+)[:]\s*(\d+)(?:\s*[-]\s*(\d+))?'
+
+def test_index_covers_the_protestant_canon():
+    assert len(BOOKS) == 66
+    assert sum(chapter_count(book_id) for book_id, _, _, _ in BOOKS) == 1189
+
+def test_aliases_normalize_to_one_canonical_reference():
+    text = "Sl 23:1, depois Salmo 23:1 e Salmos 23:1 de novo; veja também salmos 23:1."
+    assert extract_verses(text) == ["Salmos 23:1"]
+    assert [ref.canonical for ref in find_references(text)] == ["PSA.23.1"]
+
+def test_numbered_books_accents_and_abbreviations():
+    text = "1 Coríntios 13:4-7, I Co 13:13, 1Co 1:1, 2ª Timóteo 1:7, 1Pe 5:7, Jó 3:1 e Jo 3:16"
+    assert extract_verses(text) == [
+        "1 Coríntios 13:4-7",
+        "1 Coríntios 13:13",
+        "1 Coríntios 1:1",
+        "2 Timóteo 1:7",
+        "1 Pedro 5:7",
+        "Jó 3:1",
+        "João 3:16",
+    ]
+
+def test_ranges_lists_and_chapter_only_references():
+    text = "Apocalipse 21:4-22:1; João 3:16,18; 4:1-2. Leia Salmos 91 e Judas 24."
+    assert find_references(text) == [
+        BibleReference("REV", 21, 4, 22, 1),
+        BibleReference("JHN", 3, 16),
+        BibleReference("JHN", 3, 18),
+        BibleReference("JHN", 4, 1, None, 2),
+        BibleReference("PSA", 91),
+        BibleReference("JUD", 1, 24),
+    ]
+
+def test_ranges_are_not_cut_by_the_following_text():
+    assert extract_verses("Filipenses 4:6-7 e Mateus 6:34") == ["Filipenses 4:6-7", "Mateus 6:34"]
+    assert extract_verses("Romanos 8:28-30 diz que 2 coisas") == ["Romanos 8:28-30"]
+    assert extract_verses("Sl 23:1-4 e Salmo 23:1-4") == ["Salmos 23:1-4"]
+    assert extract_verses("João 3:16, 18 e Mateus 6:34") == ["João 3:16", "João 3:18", "Mateus 6:34"]
+    # Só um número seguido de livro numerado e capítulo começa outra referência
+    assert extract_verses("Salmos 23:1-2 Coríntios 5:17") == ["Salmos 23:1", "2 Coríntios 5:17"]
+    assert extract_verses("Rm 8:28, 2 Co 5:17") == ["Romanos 8:28", "2 Coríntios 5:17"]
+
+def test_rejects_false_positives_and_invalid_references():
+    text = (
+        "Ore às 6:30 por 3 dias. Os 3 irmãos leram Salmos 151:1, Salmos 119:177, "
+        "Mateus 2024:3 e Isaías 41:10\n- 2 Timóteo 1:7"
+    )
+    assert extract_verses(text) == ["Isaías 41:10", "2 Timóteo 1:7"]
+    assert make_reference("PSA", 119, 176) == BibleReference("PSA", 119, 176)
+    assert make_reference("PSA", 23, 4, None, 2) is None
+    assert make_reference("JHN", 3, 16, None, 16) == BibleReference("JHN", 3, 16)
+
+def test_faster_than_legacy_regex_on_long_outputs():
+    text = "\n".join(path.read_text(encoding="utf-8") for path in sorted(FIXTURES.iterdir())) * 40
+
+    start = time.perf_counter()
+    legacy = re.findall(LEGACY_PATTERN, text)
+    legacy_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    verses = extract_verses(text)
+    elapsed = time.perf_counter() - start
+
+    # O regex antigo devolve cada ocorrência, com nomes variados; o índice devolve só referências únicas
+    assert len(legacy) > len(verses) * 10
+    assert len(verses) == len(set(verses))
+    assert elapsed < max(legacy_elapsed * 3, 0.5)
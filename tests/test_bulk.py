@@ -0,0 +1,117 @@
+import asyncio
+import json
+import time
+from unittest.mock import patch, MagicMock
+
+import httpx
+import pytest
+
+from main import app
+from api.auth import create_access_token
+from api.bulk import BulkSettings
+from services.supabase_client import supabase_clients
+
+MODEL_LATENCY = 0.1
+
+class FakeGenerator:
+    """Gerador falso que mede a concorrência das gerações do lote"""
+    def __init__(self):
+        self.calls = []
+        self.running = 0
+        self.peak = 0
+
+    async def __call__(self, sentimento, **kwargs):
+        self.calls.append(sentimento)
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(MODEL_LATENCY)
+            if sentimento == "erro":
+                raise RuntimeError("503 Service Unavailable")
+            return {"texto": f"Devocional: {sentimento}", "versiculos": ["Salmos 23:1"], "reflexao": "R", "oracao": "O"}
+        finally:
+            self.running -= 1
+
+def _admin_client(known_users):
+    tables = {name: MagicMock() for name in ("profiles", "usages", "devotional_bodies", "devotionals")}
+    tables["profiles"].select.return_value.in_.return_value.execute.return_value = MagicMock(
+        data=[{"id": user_id} for user_id in known_users]
+    )
+    client = MagicMock(tables=tables)
+    client.table.side_effect = lambda name: tables[name]
+    return client
+
+def _post(payload):
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'test-user-id'})}"}
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/api/bulk/devotionals", headers=headers, json=payload)
+
+    return asyncio.run(run())
+
+@pytest.fixture
+def bulk_env(supabase_stub, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    generator = FakeGenerator()
+    settings = BulkSettings(concurrency=3, batch_size=2, admins=["test-user-id"])
+    admin = _admin_client(["test-user-id", "membro-1", "membro-2"])
+    with patch("api.bulk.bulk_settings", settings), \
+         patch("api.bulk.generate_devotional_async", generator), \
+         supabase_clients.override(service=admin):
+        yield generator, admin
+
+def test_bulk_generates_concurrently_and_dedupes(bulk_env):
+    generator, admin = bulk_env
+    feelings = ["ansioso", "Ansioso!", "triste", "com medo", "cansado", "grato", "erro"]
+    payload = {
+        "sentimentos": feelings,
+        "itens": [
+            {"user_id": "membro-1", "sentimento": "triste"},
+            {"user_id": "membro-2", "sentimento": "sozinho"},
+            {"user_id": "desconhecido", "sentimento": "triste"},
+        ],
+    }
+
+    start = time.perf_counter()
+    response = _post(payload)
+    elapsed = time.perf_counter() - start
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    items, summary = lines[:-1], lines[-1]
+
+    assert sorted(line["index"] for line in items) == list(range(10))
+    assert {line["index"] for line in items if line["status"] == "failed"} == {6, 9}
+    assert summary == {"status": "finished", "total": 10, "unique_feelings": 7, "failed": 2, "unsaved": 0}
+    # "ansioso"/"Ansioso!" e os dois "triste" geram uma vez só
+    assert len(generator.calls) == 7
+    assert generator.peak == 3
+    assert elapsed < MODEL_LATENCY * 7
+
+    # Inserts em lote (nunca uma linha por chamada) e um incremento de uso por lote,
+    # somado no banco em vez de lido e regravado
+    inserts = admin.tables["devotionals"].insert.call_args_list
+    assert sum(len(call.args[0]) for call in inserts) == 8
+    assert len(inserts) <= 5
+    increments = [call.args[1] for call in admin.rpc.call_args_list if call.args[0] == "increment_usages"]
+    assert len(increments) == len(inserts)
+    assert sum(sum(params["p_counts"]) for params in increments) == 8
+    membro = [
+        count for params in increments
+        for user_id, count in zip(params["p_user_ids"], params["p_counts"]) if user_id == "membro-1"
+    ]
+    assert membro == [1]
+    admin.tables["usages"].select.assert_not_called()
+    admin.tables["usages"].upsert.assert_not_called()
+
+def test_bulk_requires_partner_access(bulk_env):
+    generator, _ = bulk_env
+
+    with patch("api.bulk.bulk_settings", BulkSettings(admins=["parceiro-id"])):
+        response = _post({"sentimentos": ["ansioso"]})
+
+    assert response.status_code == 403
+    assert generator.calls == []
@@ -0,0 +1,146 @@
+import gc
+import time
+import random
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from chains.devotional_chain import DevotionalChain
+from services.call_policy import CallPolicy, RetryBudget
+from services.metrics import _percentile
+
+class LongTailModel:
+    """Modelo falso com cauda longa: a maioria das chamadas é rápida, algumas muito lentas"""
+    def __init__(self, seed: int = 7, slow_ratio: float = 0.05, fast=(0.01, 0.03), slow: float = 0.6):
+        self.random = random.Random(seed)
+        self.slow_ratio = slow_ratio
+        self.fast = fast
+        self.slow = slow
+        self.calls = 0
+
+    async def generate(self):
+        self.calls += 1
+        latency = self.slow if self.random.random() < self.slow_ratio else self.random.uniform(*self.fast)
+        await asyncio.sleep(latency)
+        return "ok"
+
+def _p99_latency(policy: CallPolicy, model: LongTailModel, requests: int = 200) -> float:
+    async def timed():
+        start = time.perf_counter()
+        assert await policy.call(model.generate) == "ok"
+        return time.perf_counter() - start
+
+    async def run():
+        return await asyncio.gather(*[timed() for _ in range(requests)])
+
+    # Uma coleta do GC acumulada pelos testes anteriores não deve cair no meio da medição
+    gc.collect()
+    return _percentile(sorted(asyncio.run(run())), 99)
+
+def test_hedging_cuts_p99_of_long_tail_model():
+    plain = CallPolicy(hedge_percentile=0, budget=RetryBudget(ratio=0.2))
+    hedged = CallPolicy(hedge_percentile=90, hedge_min_delay=0.03, hedge_initial_delay=0.05, budget=RetryBudget(ratio=0.2))
+    plain_model, hedged_model = LongTailModel(), LongTailModel()
+
+    plain_p99 = _p99_latency(plain, plain_model)
+    hedged_p99 = _p99_latency(hedged, hedged_model)
+
+    assert plain_p99 >= 0.5
+    assert hedged_p99 < plain_p99 / 3
+    # Os hedges ficam dentro do orçamento de tentativas extras
+    assert hedged_model.calls <= 200 * 1.2
+
+def test_attempt_timeout_is_enforced_and_retried():
+    calls = []
+
+    async def flaky():
+        calls.append(time.perf_counter())
+        if len(calls) == 1:
+            await asyncio.sleep(10)  # primeira tentativa trava
+        return "ok"
+
+    policy = CallPolicy(attempt_timeout=0.1, retry_delay=0.01, hedge_percentile=0)
+    start = time.perf_counter()
+    assert asyncio.run(policy.call(flaky)) == "ok"
+    assert len(calls) == 2
+    assert time.perf_counter() - start < 1
+
+def test_overall_deadline_bounds_retries():
+    async def hung():
+        await asyncio.sleep(10)
+
+    policy = CallPolicy(deadline=0.3, attempt_timeout=0.2, retry_delay=0.01, hedge_percentile=0)
+    start = time.perf_counter()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(policy.call(hung))
+    assert time.perf_counter() - start < 0.6
+
+def test_retry_budget_limits_amplification_during_outage():
+    attempts = []
+
+    async def failing():
+        attempts.append(1)
+        raise RuntimeError("503 Service Unavailable")
+
+    policy = CallPolicy(retry_delay=0, hedge_percentile=0, budget=RetryBudget(ratio=0.1, min_retries=2))
+
+    async def run():
+        for _ in range(20):
+            with pytest.raises(RuntimeError):
+                await policy.call(failing)
+
+    asyncio.run(run())
+    # Sem orçamento seriam 20 x 5 tentativas
+    assert len(attempts) <= 20 + 2
+
+def test_chain_enforces_deadline_on_hung_model():
+    class HungModel:
+        async def generate_content_async(self, prompt, **kwargs):
+            await asyncio.sleep(10)
+
+    chain = DevotionalChain()
+    chain.model = HungModel()
+    chain.call_policy = CallPolicy(deadline=0.2, attempt_timeout=0.1, retry_delay=0.01, hedge_percentile=0)
+
+    start = time.perf_counter()
+    with pytest.raises(Exception, match="Tempo esgotado"):
+        asyncio.run(chain.generate_devotional_uncached("ansioso"))
+    assert time.perf_counter() - start < 0.5
+
+def test_stream_deadline_covers_chunks_after_the_first():
+    class StallingStream:
+        def __init__(self):
+            self.sent = False
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            if not self.sent:
+                self.sent = True
+                return SimpleNamespace(text="Saudação: Olá")
+            await asyncio.sleep(10)  # o stream para no meio
+
+    class StallingModel:
+        async def generate_content_async(self, prompt, **kwargs):
+            return StallingStream()
+
+    chain = DevotionalChain()
+    chain.model = StallingModel()
+    chain.cache.enabled = False
+    chain.call_policy = CallPolicy(deadline=0.2, attempt_timeout=0.1, retry_delay=0.01, hedge_percentile=0)
+
+    async def run():
+        events = []
+        with pytest.raises(Exception, match="tentativas"):
+            async for event in chain.stream_devotional_async("ansioso"):
+                events.append(event)
+        return events
+
+    start = time.perf_counter()
+    events = asyncio.run(run())
+    assert time.perf_counter() - start < 0.5
+    assert events[0]["event"] == "token"
+    # A vaga de admissão foi devolvida
+    assert chain.admission.in_flight == 0
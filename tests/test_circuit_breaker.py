@@ -0,0 +1,154 @@
+import time
+import asyncio
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from main import app
+from api.auth import create_access_token
+from chains.devotional_chain import DevotionalChain
+from chains.fallback_library import FallbackLibrary
+from services.call_policy import CallPolicy
+from services.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+from services.metrics import metrics
+
+class FailingModel:
+    """Modelo falso que simula o Gemini fora do ar"""
+    def __init__(self):
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        self.calls += 1
+        raise RuntimeError("503 Service Unavailable")
+
+@pytest.fixture
+def failing_chain():
+    chain = DevotionalChain()
+    chain.model = FailingModel()
+    chain.breaker = CircuitBreaker("teste", min_calls=3, failure_rate=0.5, open_seconds=60)
+    chain.call_policy = CallPolicy(retry_delay=0, hedge_percentile=0, breaker=chain.breaker)
+    return chain
+
+def test_breaker_opens_half_opens_and_closes():
+    metrics.reset()
+    breaker = CircuitBreaker("teste", min_calls=4, failure_rate=0.5, open_seconds=0.05)
+
+    breaker.record_success()
+    breaker.record_success()
+    breaker.record_failure("timeout")
+    assert breaker.state == CLOSED
+    breaker.record_failure("error")
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # apenas uma chamada de teste por vez
+    breaker.record_failure("error")
+    assert breaker.state == OPEN
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+    assert metrics.counter("circuit_breaker_transitions", breaker="teste", source=CLOSED, target=OPEN) == 1
+    assert metrics.counter("circuit_breaker_transitions", breaker="teste", source=HALF_OPEN, target=OPEN) == 1
+    assert metrics.counter("circuit_breaker_transitions", breaker="teste", source=HALF_OPEN, target=CLOSED) == 1
+
+def test_open_breaker_serves_fallback_without_calling_model(failing_chain):
+    async def run():
+        first = await failing_chain.generate_devotional_async("Estou muito ansiosa")
+        calls = failing_chain.model.calls
+        start = time.perf_counter()
+        second = await failing_chain.generate_devotional_async("me sinto sozinho")
+        return first, calls, second, time.perf_counter() - start
+
+    first, calls, second, elapsed = asyncio.run(run())
+
+    # As tentativas param assim que o circuito abre, em vez de esgotar todos os retries
+    assert calls == 3
+    assert failing_chain.breaker.state == OPEN
+    assert first["fallback"] is True
+    assert "Filipenses 4:6-7" in first["versiculos"]
+    assert second["fallback"] is True
+    assert "Deuteronômio 31:8" in second["versiculos"]
+    assert failing_chain.model.calls == calls
+    assert elapsed < 0.05
+
+def test_stream_serves_fallback_sections_when_breaker_is_open(failing_chain):
+    failing_chain.breaker = CircuitBreaker("teste", min_calls=1, open_seconds=60)
+    failing_chain.breaker.record_failure()
+
+    async def collect():
+        return [event async for event in failing_chain.stream_devotional_async("com medo")]
+
+    events = asyncio.run(collect())
+
+    assert failing_chain.model.calls == 0
+    assert {event["data"]["secao"] for event in events if event["event"] == "section"} >= {"devocional", "oracao"}
+    assert events[-1]["event"] == "done"
+    assert events[-1]["data"]["fallback"] is True
+
+def _half_open_with_probe_in_use(chain):
+    chain.breaker = CircuitBreaker("teste", min_calls=1, open_seconds=0.01)
+    chain.call_policy = CallPolicy(retry_delay=0, hedge_percentile=0, breaker=chain.breaker)
+    chain.breaker.record_failure()
+    time.sleep(0.02)
+    assert chain.breaker.allow()  # a chamada de teste em andamento
+    assert chain.breaker.state == HALF_OPEN
+
+def test_half_open_breaker_serves_fallback_to_calls_beyond_the_probe(failing_chain):
+    _half_open_with_probe_in_use(failing_chain)
+
+    devotional = asyncio.run(failing_chain.generate_devotional_async("Estou muito ansiosa"))
+
+    assert devotional["fallback"] is True
+    assert failing_chain.model.calls == 0
+
+def test_stream_goes_through_the_half_open_gate(failing_chain):
+    _half_open_with_probe_in_use(failing_chain)
+
+    async def collect():
+        return [event async for event in failing_chain.stream_devotional_async("com medo")]
+
+    events = asyncio.run(collect())
+
+    assert failing_chain.model.calls == 0
+    assert events[-1]["event"] == "done"
+    assert events[-1]["data"]["fallback"] is True
+
+def test_fallback_library_classifies_feelings():
+    library = FallbackLibrary()
+
+    assert library.category("Estou muito ansiosa com a prova") == "ansiedade"
+    assert library.category("cansada de tudo") == "cansaco"
+    assert library.category("estou feliz") == "alegria"
+    assert library.category("não estou feliz") == "tristeza"
+    assert library.category("sei lá") == "geral"
+    for category in library.categories:
+        devotional = library.get("", category=category)
+        assert devotional["reflexao"] and devotional["oracao"] and devotional["versiculos"]
+
+def test_fallback_devotional_does_not_consume_quota(supabase_stub, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'test-user-id'})}"}
+    fallback = FallbackLibrary().get("ansioso")
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/api/feelings", headers=headers, json={"sentimento": "ansioso"})
+
+    with patch("api.routes.generate_devotional_async", return_value=fallback):
+        response = asyncio.run(run())
+
+    assert response.status_code == 200
+    assert response.json()["fallback"] is True
+    tables = [call.args[0] for call in supabase_stub.table.call_args_list]
+    assert "devotionals" in tables
+    supabase_stub.table.return_value.update.assert_not_called()
+    # A reserva feita antes da geração é devolvida
+    supabase_stub.rpc.assert_any_call("release_usage", {"p_user_id": "test-user-id"})
@@ -0,0 +1,161 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from supabase import AsyncClientOptions, acreate_client
+
+from main import app
+from api.auth import create_access_token
+from services.devotional_bodies import body_hash, split_body
+from services.repository import SupabaseRepository
+
+DEVOTIONAL = {
+    "user_id": "user-1",
+    "sentimento": "ansioso",
+    "texto": "Devocional: não andeis ansiosos…",
+    "versiculos": ["Filipenses 4:6", "Salmos 23:1"],
+    "reflexao": "Reflexão",
+    "oracao": "Oração",
+    "modelo": "gemini",
+}
+
+SAVED = {
+    "sentimento": "ansioso",
+    "greeting": "Olá!",
+    "body_hash": body_hash(DEVOTIONAL),
+    "date": "2024-01-01T00:00:00Z",
+}
+
+def _headers():
+    return {"Authorization": f"Bearer {create_access_token({'sub': 'test-user-id'})}"}
+
+def test_hash_identifies_the_content():
+    body, row = split_body(DEVOTIONAL)
+
+    assert body["hash"] == body_hash(DEVOTIONAL)
+    assert row == {"user_id": "user-1", "sentimento": "ansioso", "modelo": "gemini", "body_hash": body["hash"]}
+    # Metadados da linha não mudam o corpo; qualquer mudança no conteúdo muda o hash
+    assert split_body({**DEVOTIONAL, "user_id": "user-2", "modelo": "outro"})[0] == body
+    assert body_hash({**DEVOTIONAL, "versiculos": ["Filipenses 4:6"]}) != body["hash"]
+    assert body_hash({**DEVOTIONAL, "versiculos": ["Filipenses 4:6 Salmos 23:1"]}) != body["hash"]
+
+def test_batch_writes_each_body_once():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(201, json=[])
+
+    async def run():
+        client = await acreate_client(
+            "http://supabase.test", "service-key",
+            AsyncClientOptions(httpx_client=httpx.AsyncClient(transport=httpx.MockTransport(handler))),
+        )
+        # O mesmo devocional servido pelo pool a dois usuários e um terceiro diferente
+        await SupabaseRepository(lambda: client).insert_devotionals([
+            DEVOTIONAL, {**DEVOTIONAL, "user_id": "user-2"}, {**DEVOTIONAL, "texto": "Outro devocional"},
+        ])
+
+    asyncio.run(run())
+
+    bodies, devotionals = requests
+    assert bodies.url.path == "/rest/v1/devotional_bodies"
+    assert bodies.url.params["on_conflict"] == "hash"
+    assert "resolution=ignore-duplicates" in bodies.headers["Prefer"]
+    assert len(json.loads(bodies.content)) == 2
+
+    assert devotionals.url.path == "/rest/v1/devotionals"
+    rows = json.loads(devotionals.content)
+    assert [row["user_id"] for row in rows] == ["user-1", "user-2", "user-1"]
+    assert rows[0]["body_hash"] == rows[1]["body_hash"] != rows[2]["body_hash"]
+    assert all("texto" not in row for row in rows)
+
+def test_saving_the_same_devotional_twice_is_idempotent(supabase_stub, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    supabase_stub.table.return_value.select.return_value.eq.return_value.eq.return_value.limit.return_value.execute.return_value = MagicMock(
+        data=[{"id": "devotional-1"}]
+    )
+    upsert = supabase_stub.table.return_value.upsert
+    # Salvo na primeira vez; na segunda a linha já existe
+    upsert.return_value.execute.side_effect = [MagicMock(data=[{"id": "saved-1"}]), MagicMock(data=[])]
+    client = TestClient(app)
+
+    first = client.post("/api/devotional/save", headers=_headers(), json=SAVED)
+    second = client.post("/api/devotional/save", headers=_headers(), json=SAVED)
+
+    assert first.status_code == second.status_code == 200
+    assert first.json()["message"] == "Devocional salvo com sucesso"
+    assert second.json()["message"] == "Devocional já estava salvo"
+    # Só a linha salva é gravada, com a referência ao corpo do devocional gerado
+    assert [call.kwargs["on_conflict"] for call in upsert.call_args_list] == ["user_id,body_hash"] * 2
+    assert all(call.kwargs["ignore_duplicates"] for call in upsert.call_args_list)
+    row = upsert.call_args_list[0].args[0]
+    assert row["body_hash"] == body_hash(DEVOTIONAL) and row["greeting"] == "Olá!"
+    assert "content" not in row and "verse_text" not in row
+
+def test_generated_devotional_returns_the_hash_saved_by_the_dashboard(supabase_stub, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    generated = {key: DEVOTIONAL[key] for key in ("texto", "versiculos", "reflexao", "oracao")}
+    monkeypatch.setattr("api.routes.generate_devotional_async", AsyncMock(return_value=generated))
+    monkeypatch.setattr("api.routes.reserve_usage", AsyncMock(return_value=(False, None)))
+    client = TestClient(app)
+
+    response = client.post("/api/feelings", headers=_headers(), json={"sentimento": "ansioso"})
+
+    assert response.status_code == 200
+    assert response.json()["body_hash"] == SAVED["body_hash"]
+    # O devocional devolvido pela cadeia (talvez do cache) não é alterado
+    assert "body_hash" not in generated
+
+def test_only_generated_devotionals_can_be_saved(supabase_stub, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    supabase_stub.table.return_value.select.return_value.eq.return_value.eq.return_value.limit.return_value.execute.return_value = MagicMock(data=[])
+    client = TestClient(app)
+
+    response = client.post("/api/devotional/save", headers=_headers(), json={**SAVED, "body_hash": "0" * 64})
+
+    assert response.status_code == 404
+    supabase_stub.table.return_value.upsert.assert_not_called()
+
+def test_database_hash_matches_and_saves_reference_the_generated_body(db_user):
+    import psycopg
+
+    conn, user_id = db_user
+    body, _ = split_body(DEVOTIONAL)
+
+    database_hash = conn.execute(
+        "SELECT public.devotional_body_hash(%s, %s, %s, %s)",
+        (body["texto"], body["versiculos"], body["reflexao"], body["oracao"]),
+    ).fetchone()[0]
+    assert database_hash == body["hash"]
+
+    # Um corpo com o hash de outro conteúdo é recusado
+    with pytest.raises(psycopg.errors.CheckViolation):
+        conn.execute("INSERT INTO public.devotional_bodies (hash, texto) VALUES (%s, 'outro')", (body["hash"],))
+
+    conn.execute(
+        "INSERT INTO public.devotional_bodies (hash, texto, versiculos, reflexao, oracao) VALUES (%s, %s, %s, %s, %s)",
+        (body["hash"], body["texto"], body["versiculos"], body["reflexao"], body["oracao"]),
+    )
+    conn.execute(
+        "INSERT INTO public.devotionals (user_id, sentimento, body_hash) VALUES (%s, 'ansioso', %s)",
+        (user_id, body["hash"]),
+    )
+    for _ in range(2):
+        conn.execute(
+            "INSERT INTO public.saved_devotionals (user_id, sentimento, greeting, body_hash) VALUES (%s, 'ansioso', 'Olá!', %s)"
+            " ON CONFLICT (user_id, body_hash) DO NOTHING",
+            (user_id, body["hash"]),
+        )
+    rows = conn.execute(
+        "SELECT greeting, texto FROM public.saved_devotional_details WHERE user_id = %s", (user_id,)
+    ).fetchall()
+    assert rows == [("Olá!", body["texto"])]
+    # O texto fica só no corpo
+    assert conn.execute("SELECT count(*) FROM public.devotional_bodies WHERE hash = %s", (body["hash"],)).fetchone()[0] == 1
+    conn.execute("DELETE FROM public.saved_devotionals WHERE user_id = %s", (user_id,))
+    conn.execute("DELETE FROM public.devotionals WHERE user_id = %s", (user_id,))
+    conn.execute("DELETE FROM public.devotional_bodies WHERE hash = %s", (body["hash"],))
@@ -0,0 +1,550 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+import httpx
+import pytest
+
+from main import app
+from api.auth import create_access_token
+from chains.devotional_chain import DevotionalChain, devotional_chain_instance
+from chains.devotional_cache import DevotionalCache, normalize_feeling
+from chains.single_flight import SingleFlight
+from chains.warm_pool import WarmPool
+from services.metrics import metrics
+from services.admission import AdmissionController, AdmissionRejected
+
+# Latência simulada do modelo (segundos)
+MODEL_LATENCY = 0.3
+CONCURRENT_REQUESTS = 10
+
+DEVOTIONAL_JSON = json.dumps({
+    "texto": "Devocional de teste.",
+    "versiculos": ["Filipenses 4:6"],
+    "reflexao": "Reflexão de teste.",
+    "oracao": "Oração de teste."
+})
+
+SECTIONED_TEXT = """Uma pena que você se sente assim, mas tenho certeza que Deus irá mudar isso!
+
+1. **Versículo(s) chave:** Filipenses 4:6-7
+
+2. **Devocional:**
+Nós não precisamos carregar a ansiedade sozinhos.
+
+3. **Aplicação prática:** Separe dez minutos para orar.
+
+4. **Oração final:**
+Senhor, entregamos a ti nossa ansiedade.
+
+5. **Aprofundamento:**
+Mateus 6:25-34; 1 Pedro 5:7"""
+
+class _FakeStream:
+    def __init__(self, chunks, delay):
+        self.chunks = chunks
+        self.delay = delay
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(self.delay)
+            yield SimpleNamespace(text=chunk)
+
+class SlowFakeModel:
+    """Modelo falso que simula a latência do Gemini sem bloquear o event loop"""
+    def __init__(self, latency: float = MODEL_LATENCY):
+        self.latency = latency
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        self.calls += 1
+        if stream:
+            chunks = [SECTIONED_TEXT[i:i + 20] for i in range(0, len(SECTIONED_TEXT), 20)]
+            return _FakeStream(chunks, self.latency / len(chunks))
+        await asyncio.sleep(self.latency)
+        return SimpleNamespace(text=DEVOTIONAL_JSON)
+
+@pytest.fixture
+def slow_chain():
+    chain = DevotionalChain()
+    chain.model = SlowFakeModel()
+    chain.admission = AdmissionController(max_in_flight=CONCURRENT_REQUESTS, max_per_user=CONCURRENT_REQUESTS)
+    return chain
+
+def test_concurrent_generations_run_in_parallel(slow_chain):
+    async def run():
+        start = time.perf_counter()
+        results = await asyncio.gather(*[
+            slow_chain.generate_devotional_async(f"sentimento {i}")
+            for i in range(CONCURRENT_REQUESTS)
+        ])
+        return results, time.perf_counter() - start
+
+    results, elapsed = asyncio.run(run())
+
+    assert len(results) == CONCURRENT_REQUESTS
+    assert all(result["texto"] == "Devocional de teste." for result in results)
+    # N gerações concorrentes devem levar ~1 latência do modelo, não N
+    assert elapsed < MODEL_LATENCY * 2
+
+def test_endpoints_do_not_block_event_loop(supabase_stub, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    token = create_access_token({"sub": "test-user-id"})
+    headers = {"Authorization": f"Bearer {token}"}
+    fake_model = SlowFakeModel()
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            start = time.perf_counter()
+            generations = [
+                asyncio.create_task(client.post("/api/feelings", headers=headers, json={"sentimento": f"ansioso {i}"}))
+                for i in range(CONCURRENT_REQUESTS // 2)
+            ] + [
+                asyncio.create_task(client.post("/generate_devotional", headers=headers, json={"sentimento": f"grato {i}"}))
+                for i in range(CONCURRENT_REQUESTS // 2)
+            ]
+
+            # O health check deve responder enquanto as gerações estão em andamento
+            await asyncio.sleep(MODEL_LATENCY / 4)
+            health_start = time.perf_counter()
+            health = await client.get("/health")
+            health_elapsed = time.perf_counter() - health_start
+
+            responses = await asyncio.gather(*generations)
+            return responses, health, health_elapsed, time.perf_counter() - start
+
+    unbounded = AdmissionController(max_in_flight=CONCURRENT_REQUESTS, max_per_user=CONCURRENT_REQUESTS)
+    with patch.object(devotional_chain_instance.router.default, "provider", fake_model), \
+         patch.object(devotional_chain_instance, "admission", unbounded):
+        responses, health, health_elapsed, elapsed = asyncio.run(run())
+
+    assert all(response.status_code == 200 for response in responses)
+    assert fake_model.calls == CONCURRENT_REQUESTS
+    assert health.status_code == 200
+    assert health_elapsed < MODEL_LATENCY / 2
+    assert elapsed < MODEL_LATENCY * 2
+
+# Testes do cache de respostas
+def test_normalize_feeling_folds_variations():
+    assert normalize_feeling("ansioso") == "ansioso"
+    assert normalize_feeling("Estou ansioso!") == "ansioso"
+    assert normalize_feeling("me sinto ansiosa") == "ansioso"
+    assert normalize_feeling("Tô muito CANSADA hoje...") == "cansado"
+    assert normalize_feeling("não estou bem") != normalize_feeling("estou bem")
+
+def test_cache_near_duplicate_matching():
+    cache = DevotionalCache(variants_per_key=1, similarity_threshold=0.75)
+    cache.put("Estou ansioso com a prova", {"texto": "prova"})
+
+    assert cache.get("ansiosa com a prova!") == {"texto": "prova"}
+    assert cache.get("ansiosos com as provas") == {"texto": "prova"}
+    assert cache.get("ansioso com o trabalho") is None
+    assert cache.get("não ansioso com a prova") is None
+
+def test_cache_rotates_variants():
+    cache = DevotionalCache(variants_per_key=2)
+    cache.put("triste", {"texto": "um"})
+    # Enquanto o pool de variantes não está cheio, a consulta é um miss
+    assert cache.get("triste") is None
+
+    cache.put("triste", {"texto": "dois"})
+    served = [cache.get("Triste.")["texto"] for _ in range(4)]
+    assert served == ["um", "dois", "um", "dois"]
+
+def test_cache_ttl_and_lru_eviction():
+    cache = DevotionalCache(variants_per_key=1, ttl_seconds=0.05, max_entries=2)
+    cache.put("alegre", {"texto": "alegre"})
+    time.sleep(0.06)
+    assert cache.get("alegre") is None
+
+    cache.put("grato", {"texto": "grato"})
+    cache.put("cansado", {"texto": "cansado"})
+    cache.get("grato")
+    cache.put("sozinho", {"texto": "sozinho"})
+    assert cache.get("cansado") is None
+    assert cache.get("grato") == {"texto": "grato"}
+
+    small = DevotionalCache(variants_per_key=1, max_bytes=60)
+    small.put("grato", {"texto": "x" * 20})
+    small.put("cansado", {"texto": "y" * 20})
+    assert len(small) == 1
+    assert small.get("cansado") is not None
+
+def test_chain_cache_avoids_model_calls(slow_chain):
+    slow_chain.cache = DevotionalCache(variants_per_key=2)
+    feelings = ["ansioso", "Estou ansioso!", "me sinto ansiosa", "ansioso", "ansiosa"]
+
+    async def run():
+        for sentimento in feelings:
+            await slow_chain.generate_devotional_async(sentimento)
+
+    asyncio.run(run())
+
+    # Apenas as gerações necessárias para preencher o pool de variantes vão ao modelo
+    assert slow_chain.model.calls == 2
+    stats = slow_chain.cache.stats()
+    assert (stats["hits"], stats["misses"]) == (3, 2)
+
+    slow_chain.cache.clear()
+    stats = slow_chain.cache.stats()
+    assert (stats["hits"], stats["misses"]) == (0, 0)
+
+# Testes do streaming
+def test_stream_emits_tokens_before_full_generation(slow_chain):
+    async def run():
+        start = time.perf_counter()
+        events = []
+        first_token_at = None
+        async for event in slow_chain.stream_devotional_async("ansioso"):
+            if event["event"] == "token" and first_token_at is None:
+                first_token_at = time.perf_counter() - start
+            events.append(event)
+        return events, first_token_at, time.perf_counter() - start
+
+    events, first_token_at, elapsed = asyncio.run(run())
+
+    assert first_token_at < elapsed / 4
+    sections = [event["data"]["secao"] for event in events if event["event"] == "section"]
+    assert sections == ["saudacao", "versiculo_chave", "devocional", "aplicacao", "oracao", "aprofundamento"]
+
+    done = events[-1]
+    assert done["event"] == "done"
+    assert set(done["data"]) == {"texto", "versiculos", "reflexao", "oracao", "modelo", "nivel_modelo", "motivo_roteamento"}
+    assert done["data"]["texto"] == SECTIONED_TEXT
+    assert done["data"]["reflexao"] == "Nós não precisamos carregar a ansiedade sozinhos."
+    assert done["data"]["oracao"] == "Senhor, entregamos a ti nossa ansiedade."
+
+def test_stream_endpoint_persists_once(supabase_stub, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    token = create_access_token({"sub": "test-user-id"})
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            async with client.stream(
+                "POST", "/api/feelings/stream",
+                headers={"Authorization": f"Bearer {token}"},
+                json={"sentimento": "preocupado com o futuro"}
+            ) as response:
+                body = "".join([chunk async for chunk in response.aiter_text()])
+                return response, body
+
+    with patch.object(devotional_chain_instance.router.default, "provider", SlowFakeModel()), \
+         patch.object(devotional_chain_instance, "cache", DevotionalCache(enabled=False)):
+        response, body = asyncio.run(run())
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = [block for block in body.split("\n\n") if block]
+    names = [block.split("\n")[0].removeprefix("event: ") for block in events]
+    assert names[0] == "token"
+    assert names[-1] == "done"
+    assert names.count("section") == 6
+
+    final = json.loads(events[-1].split("\n")[1].removeprefix("data: "))
+    assert set(final) == {"texto", "versiculos", "reflexao", "oracao", "modelo", "nivel_modelo", "motivo_roteamento", "body_hash"}
+
+    inserted_tables = [call.args[0] for call in supabase_stub.table.call_args_list]
+    assert inserted_tables.count("devotionals") == 1
+
+# Testes de coalescência (single-flight)
+def test_single_flight_coalesces_identical_feelings(slow_chain):
+    slow_chain.cache = DevotionalCache(enabled=False)
+
+    async def run():
+        return await asyncio.gather(*[
+            slow_chain.generate_devotional_async(sentimento)
+            for sentimento in ["Estou ansioso!", "ansioso", "me sinto ansiosa"] * 4
+        ])
+
+    before = metrics.counter("singleflight_calls", flight="devotional", result="coalesced")
+    results = asyncio.run(run())
+
+    assert slow_chain.model.calls == 1
+    assert len(results) == 12
+    assert results[0] is not results[1]
+    assert metrics.counter("singleflight_calls", flight="devotional", result="coalesced") - before == 11
+
+def test_single_flight_isolates_cancellation_and_failure():
+    flight = SingleFlight("test")
+
+    async def slow_value():
+        await asyncio.sleep(0.05)
+        return {"value": 1}
+
+    async def failing():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("modelo indisponível")
+
+    async def run():
+        # Cancelar o primeiro chamador (líder) não afeta os demais
+        leader = asyncio.create_task(flight.do("chave", slow_value))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(flight.do("chave", slow_value)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        waiters[0].cancel()
+        results = await asyncio.gather(*waiters[1:])
+
+        failures = await asyncio.gather(
+            *[flight.do("erro", failing) for _ in range(3)],
+            return_exceptions=True
+        )
+        return leader, results, failures
+
+    leader, results, failures = asyncio.run(run())
+
+    assert leader.cancelled()
+    assert results == [{"value": 1}, {"value": 1}]
+    assert all(isinstance(failure, RuntimeError) for failure in failures)
+    assert len(flight) == 0
+
+# Testes do controle de admissão
+def test_admission_serves_subscribers_first_and_limits_users():
+    controller = AdmissionController(max_in_flight=1, max_queue=3, max_per_user=1, queue_timeout=1)
+    order = []
+
+    async def call(user_id, subscriber):
+        async with controller.slot(user_id, subscriber):
+            order.append(user_id)
+            await asyncio.sleep(0.02)
+
+    async def run():
+        first = asyncio.create_task(call("primeiro", False))
+        await asyncio.sleep(0)
+        queued = [
+            asyncio.create_task(call("gratuito", False)),
+            asyncio.create_task(call("assinante", True)),
+        ]
+        await asyncio.sleep(0)
+        assert controller.queue_depth() == 2
+
+        # O mesmo usuário não pode ocupar mais de uma vaga
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("gratuito", False)
+        assert rejected.value.status_code == 429
+
+        await asyncio.gather(first, *queued)
+
+    asyncio.run(run())
+
+    assert order == ["primeiro", "assinante", "gratuito"]
+    assert controller.in_flight == 0
+    assert controller.queue_depth() == 0
+
+def test_admission_sheds_load_when_queue_is_full():
+    controller = AdmissionController(max_in_flight=1, max_queue=1, max_per_user=5, queue_timeout=1)
+
+    async def run():
+        await controller.acquire("a", False)
+        waiting_free = asyncio.create_task(controller.acquire("b", False))
+        await asyncio.sleep(0)
+
+        # Fila cheia: usuário gratuito é recusado imediatamente
+        with pytest.raises(AdmissionRejected) as full:
+            await controller.acquire("c", False)
+
+        # Assinante desloca o usuário gratuito mais recente da fila
+        waiting_subscriber = asyncio.create_task(controller.acquire("d", True))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as shed:
+            await waiting_free
+
+        controller.release("a")
+        await waiting_subscriber
+        controller.release("d")
+        return full.value, shed.value
+
+    full, shed = asyncio.run(run())
+
+    assert full.status_code == 503 and full.retry_after >= 1
+    assert shed.reason == "shed"
+    assert controller.in_flight == 0
+
+def test_cancelled_leader_keeps_the_slot_until_the_model_finishes(slow_chain):
+    slow_chain.cache = DevotionalCache(enabled=False)
+
+    async def run():
+        leader = asyncio.create_task(slow_chain.generate_devotional_async("ansioso", user_id="usuario"))
+        await asyncio.sleep(MODEL_LATENCY / 3)
+        leader.cancel()
+        await asyncio.sleep(0)
+        # A geração compartilhada continua chamando o modelo e mantém a vaga
+        in_flight_after_cancel = slow_chain.admission.in_flight
+        follower = await slow_chain.generate_devotional_async("ansioso")
+        return in_flight_after_cancel, follower
+
+    in_flight_after_cancel, follower = asyncio.run(run())
+
+    assert in_flight_after_cancel == 1
+    assert follower["texto"] == "Devocional de teste."
+    assert slow_chain.model.calls == 1
+    assert slow_chain.admission.in_flight == 0
+
+def test_admission_jobs_wait_for_a_slot_instead_of_being_rejected():
+    controller = AdmissionController(max_in_flight=1, max_queue=1, max_per_user=1, queue_timeout=0.01)
+    order = []
+
+    async def job(name):
+        async with controller.slot("usuario", False, wait=True):
+            order.append(name)
+
+    async def run():
+        # Usuário no limite e fila cheia: requisições interativas seriam recusadas
+        await controller.acquire("usuario", False)
+        waiting = asyncio.create_task(controller.acquire("outro", False))
+        jobs = [asyncio.create_task(job("job-1")), asyncio.create_task(job("job-2"))]
+        # Além do tempo limite da fila, os jobs continuam esperando
+        await asyncio.sleep(0.05)
+        with pytest.raises(AdmissionRejected):
+            await waiting
+        assert controller.queue_depth() == 2
+
+        controller.release("usuario")
+        await asyncio.gather(*jobs)
+
+    asyncio.run(run())
+
+    assert order == ["job-1", "job-2"]
+    assert controller.in_flight == 0 and controller.queue_depth() == 0
+
+def test_feelings_returns_retry_after_when_queue_is_full(supabase_stub, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    token = create_access_token({"sub": "test-user-id"})
+    saturated = AdmissionController(max_in_flight=0, max_queue=0)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(
+                "/api/feelings",
+                headers={"Authorization": f"Bearer {token}"},
+                json={"sentimento": "sobrecarregado com tudo"}
+            )
+
+    with patch.object(devotional_chain_instance, "admission", saturated), \
+         patch.object(devotional_chain_instance, "cache", DevotionalCache(enabled=False)):
+        response = asyncio.run(run())
+
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+
+# Testes do pool de pré-geração
+def test_warm_pool_ranks_history_and_serves_each_item_once():
+    generated = []
+
+    async def generator(sentimento):
+        generated.append(sentimento)
+        return {"texto": f"devocional {len(generated)}"}
+
+    async def history():
+        return ["Estou ansioso!", "ansioso", "ansiosa", "triste", "Triste", "grato"]
+
+    pool = WarmPool(generator, history_loader=history, top_n=2, per_feeling=2, enabled=True)
+
+    async def run():
+        await pool.refresh_ranking()
+        while await pool.refill_once():
+            pass
+
+    asyncio.run(run())
+
+    assert pool.top_feelings == ["ansioso", "triste"]
+    assert pool.size == 4
+    # O texto mais frequente de cada grupo é usado como prompt
+    assert set(generated) == {"Estou ansioso!", "triste"}
+
+    first = pool.take("me sinto ansioso")
+    second = pool.take("ansioso!")
+    assert first != second
+    assert pool.take("ansioso") is None
+    assert pool.take("grato") is None
+
+def test_warm_pool_discards_stale_items_and_respects_window():
+    async def generator(sentimento):
+        return {"texto": sentimento}
+
+    async def history():
+        return ["cansado"]
+
+    pool = WarmPool(generator, history_loader=history, per_feeling=1, max_age_seconds=0.05,
+                    refill_hours="22-6", enabled=True)
+
+    async def run():
+        await pool.refresh_ranking()
+        await pool.refill_once()
+
+    asyncio.run(run())
+    time.sleep(0.06)
+
+    assert pool.take("cansado") is None
+    assert pool.in_refill_window(23) and pool.in_refill_window(3)
+    assert not pool.in_refill_window(12)
+
+def test_chain_serves_pooled_devotional_without_model_call(slow_chain):
+    slow_chain.cache = DevotionalCache(enabled=False)
+    slow_chain.warm_pool.enabled = True
+
+    async def history():
+        return ["sozinho"]
+
+    slow_chain.warm_pool.history_loader = history
+
+    async def run():
+        await slow_chain.warm_pool.refresh_ranking()
+        await slow_chain.warm_pool.refill_once()
+        calls_after_refill = slow_chain.model.calls
+        start = time.perf_counter()
+        devotional = await slow_chain.generate_devotional_async("Estou me sentindo sozinha")
+        return calls_after_refill, devotional, time.perf_counter() - start
+
+    calls_after_refill, devotional, elapsed = asyncio.run(run())
+
+    assert devotional["texto"] == "Devocional de teste."
+    assert slow_chain.model.calls == calls_after_refill
+    assert elapsed < MODEL_LATENCY / 10
+
+def test_stream_labels_pooled_devotionals_as_pool(slow_chain):
+    slow_chain.cache = DevotionalCache(enabled=False)
+    slow_chain.warm_pool.enabled = True
+
+    async def history():
+        return ["sozinho"]
+
+    slow_chain.warm_pool.history_loader = history
+
+    async def run():
+        await slow_chain.warm_pool.refresh_ranking()
+        await slow_chain.warm_pool.refill_once()
+        metrics.reset()
+        return [event async for event in slow_chain.stream_devotional_async("Estou me sentindo sozinha")]
+
+    events = asyncio.run(run())
+
+    assert events[-1]["event"] == "done"
+    assert metrics.percentile("devotional_generation_seconds", 50, source="pool") is not None
+    assert metrics.percentile("devotional_generation_seconds", 50, source="cache") is None
+
+def test_warm_pool_refill_takes_an_admission_slot(slow_chain):
+    slow_chain.cache = DevotionalCache(enabled=False)
+    slow_chain.warm_pool.enabled = True
+
+    async def history():
+        return ["sozinho"]
+
+    slow_chain.warm_pool.history_loader = history
+
+    async def run():
+        await slow_chain.warm_pool.refresh_ranking()
+        refill = asyncio.create_task(slow_chain.warm_pool.refill_once())
+        await asyncio.sleep(MODEL_LATENCY / 3)
+        in_flight = slow_chain.admission.in_flight
+        await refill
+        return in_flight
+
+    assert asyncio.run(run()) == 1
+    assert slow_chain.admission.in_flight == 0
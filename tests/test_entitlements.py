@@ -0,0 +1,61 @@
+from unittest.mock import patch, MagicMock
+
+from fastapi.testclient import TestClient
+
+from main import app
+from api.auth import create_access_token
+from services.metrics import metrics
+
+EXHAUSTED = {"subscribed": False, "valid_until": None, "usage_count": 5, "remaining_free": 0}
+
+def _headers():
+    return {"Authorization": f"Bearer {create_access_token({'sub': 'test-user-id'})}"}
+
+def _rpc_calls(supabase_stub):
+    return [call.args[0] for call in supabase_stub.rpc.call_args_list]
+
+def test_status_reads_entitlements_once_from_cache(supabase_stub, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    supabase_stub.rpc.return_value.execute.return_value = MagicMock(data=[EXHAUSTED])
+    client = TestClient(app)
+
+    for _ in range(3):
+        status = client.get("/api/status", headers=_headers()).json()
+
+    assert status == {"usos_restantes": 0, "assinatura_ativa": False, "validade": None}
+    assert _rpc_calls(supabase_stub) == ["get_entitlements"]
+    tables = {call.args[0] for call in supabase_stub.table.call_args_list}
+    assert "subscriptions" not in tables and "usages" not in tables
+
+def test_exhausted_free_quota_is_denied_without_database(supabase_stub, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    metrics.reset()
+    supabase_stub.rpc.return_value.execute.return_value = MagicMock(data=[{**EXHAUSTED, "allowed": False}])
+    client = TestClient(app)
+
+    for _ in range(3):
+        response = client.post("/api/feelings", headers=_headers(), json={"sentimento": "ansioso"})
+        assert response.status_code == 402
+
+    # Só a primeira recusa vai ao banco; as seguintes usam os direitos em cache
+    assert _rpc_calls(supabase_stub) == ["reserve_usage"]
+    assert metrics.counter("usage_reservations", result="denied_cached") == 2
+
+def test_payment_webhook_invalidates_cached_entitlements(supabase_stub, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    supabase_stub.rpc.return_value.execute.return_value = MagicMock(data=[EXHAUSTED])
+    client = TestClient(app)
+    assert client.get("/api/status", headers=_headers()).json()["assinatura_ativa"] is False
+
+    payment = {"status": 200, "response": {"status": "approved", "external_reference": "test-user-id"}}
+    with patch("api.webhook.mp_client") as mp_client:
+        mp_client.payment.return_value.get.return_value = payment
+        webhook = client.post("/api/mp/webhook", json={"action": "payment.updated", "data": {"id": "pay-1"}})
+    assert webhook.status_code == 200
+
+    subscribed = {"subscribed": True, "valid_until": "2030-01-01T00:00:00+00:00", "usage_count": 5, "remaining_free": None}
+    supabase_stub.rpc.return_value.execute.return_value = MagicMock(data=[subscribed])
+    status = client.get("/api/status", headers=_headers()).json()
+
+    assert status["assinatura_ativa"] is True and status["usos_restantes"] == "ilimitado"
+    assert _rpc_calls(supabase_stub) == ["get_entitlements", "get_entitlements"]
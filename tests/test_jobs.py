@@ -0,0 +1,157 @@
+import asyncio
+import time
+from unittest.mock import patch, AsyncMock, MagicMock
+
+import httpx
+import pytest
+
+from main import app
+from api.auth import create_access_token
+from services.devotional_bodies import body_hash
+from services.jobs import JobQueue, InMemoryJobBackend, SQLiteJobBackend, job_queue
+
+DEVOTIONAL = {
+    "texto": "Devocional de teste.",
+    "versiculos": ["Salmos 23:1"],
+    "reflexao": "Reflexão de teste.",
+    "oracao": "Oração de teste."
+}
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryJobBackend()
+    return SQLiteJobBackend(str(tmp_path / "jobs.db"))
+
+def test_job_queue_runs_jobs_with_worker_pool(backend):
+    queue = JobQueue(backend, workers=3, poll_interval=0.05)
+    running = []
+    peak = []
+
+    async def handler(payload):
+        running.append(payload["n"])
+        peak.append(len(running))
+        await asyncio.sleep(0.05)
+        running.remove(payload["n"])
+        if payload["n"] == 4:
+            raise RuntimeError("falha simulada")
+        return {"n": payload["n"]}
+
+    queue.register("teste", handler)
+
+    async def run():
+        await queue.start()
+        job_ids = [await queue.enqueue("teste", {"n": n}) for n in range(6)]
+        jobs = [await queue.wait(job_id, timeout=2) for job_id in job_ids]
+        await queue.stop()
+        return jobs
+
+    jobs = asyncio.run(run())
+
+    assert [job["status"] for job in jobs] == ["done"] * 4 + ["failed", "done"]
+    assert jobs[0]["result"] == {"n": 0}
+    assert "falha simulada" in jobs[4]["error"]
+    assert max(peak) == 3
+
+def test_wait_timeouts_do_not_leave_events_behind(backend):
+    # Sem workers: o job nunca termina e todas as esperas expiram
+    queue = JobQueue(backend, workers=0, poll_interval=0.02)
+
+    async def run():
+        job_id = await queue.enqueue("teste", {"n": 1})
+        jobs = await asyncio.gather(
+            queue.wait(job_id, timeout=0.05),
+            queue.wait(job_id, timeout=0.1),
+            queue.wait("desconhecido", timeout=0.05),
+        )
+        return jobs
+
+    pending, still_pending, unknown = asyncio.run(run())
+
+    assert pending["status"] == still_pending["status"] == "pending"
+    assert unknown is None
+    assert queue._finished == {} and queue._waiters == {}
+
+def test_sqlite_backend_recovers_jobs_after_restart(tmp_path):
+    path = str(tmp_path / "jobs.db")
+
+    async def crash_mid_job():
+        queue = JobQueue(SQLiteJobBackend(path), workers=1, poll_interval=0.05)
+        started = asyncio.Event()
+
+        async def stuck(payload):
+            started.set()
+            await asyncio.sleep(60)
+
+        queue.register("teste", stuck)
+        await queue.start()
+        job_id = await queue.enqueue("teste", {"n": 1})
+        await started.wait()
+        await queue.stop()
+        return job_id
+
+    async def restart(job_id):
+        queue = JobQueue(SQLiteJobBackend(path), workers=1, poll_interval=0.05)
+
+        async def handler(payload):
+            return {"n": payload["n"]}
+
+        queue.register("teste", handler)
+        await queue.start()
+        job = await queue.wait(job_id, timeout=2)
+        await queue.stop()
+        return job
+
+    job_id = asyncio.run(crash_mid_job())
+    job = asyncio.run(restart(job_id))
+
+    assert job["status"] == "done"
+    assert job["result"] == {"n": 1}
+
+def test_job_endpoints_enqueue_and_long_poll(supabase_stub, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'test-user-id'})}"}
+    other_headers = {"Authorization": f"Bearer {create_access_token({'sub': 'outro-usuario'})}"}
+
+    # O perfil retornado corresponde ao id consultado, para distinguir os usuários
+    row = {"email": "test@example.com", "is_active": True, "devotional_count": 0}
+    supabase_stub.table.return_value.select.return_value.eq.side_effect = lambda column, value: MagicMock(
+        execute=MagicMock(return_value=MagicMock(data=[{**row, "id": value}]))
+    )
+
+    async def slow_generation(*args, **kwargs):
+        await asyncio.sleep(0.3)
+        return dict(DEVOTIONAL)
+
+    async def run():
+        await job_queue.start()
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                created = await client.post("/api/jobs", headers=headers, json={"sentimento": "ansioso"})
+                job_id = created.json()["job_id"]
+                pending = await client.get(f"/api/jobs/{job_id}", headers=headers)
+                # O job de outro usuário é recusado sem esperar o long-poll
+                start = time.perf_counter()
+                forbidden = await client.get(f"/api/jobs/{job_id}?wait=5", headers=other_headers)
+                forbidden_elapsed = time.perf_counter() - start
+                finished = await client.get(f"/api/jobs/{job_id}?wait=5", headers=headers)
+                return created, pending, finished, forbidden, forbidden_elapsed
+        finally:
+            await job_queue.stop()
+
+    generation = AsyncMock(side_effect=slow_generation)
+    with patch("api.routes.generate_devotional_async", new=generation):
+        created, pending, finished, forbidden, forbidden_elapsed = asyncio.run(run())
+
+    assert created.status_code == 202
+    assert pending.json()["status"] in ("pending", "running")
+    assert finished.json()["status"] == "done"
+    assert finished.json()["result"] == {**DEVOTIONAL, "body_hash": body_hash(DEVOTIONAL)}
+    assert forbidden.status_code == 404 and forbidden_elapsed < 0.2
+    # Jobs esperam a vaga no controle de admissão em vez de serem recusados
+    assert generation.call_args.kwargs["wait"] is True
+
+    # Uso e persistência acontecem na conclusão do job
+    inserted_tables = [call.args[0] for call in supabase_stub.table.call_args_list]
+    assert inserted_tables.count("devotionals") == 1
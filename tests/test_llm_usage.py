@@ -0,0 +1,139 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from main import app
+from api.auth import create_access_token
+from chains.devotional_chain import DevotionalChain
+from services.admission import AdmissionController
+from services.llm_usage import LLMUsageTracker, llm_usage
+from services.metrics import metrics
+
+DEVOTIONAL_JSON = json.dumps({
+    "texto": "Devocional de teste.",
+    "versiculos": ["Filipenses 4:6"],
+    "reflexao": "Reflexão de teste.",
+    "oracao": "Oração de teste."
+})
+
+def _response(text, prompt_tokens=None, output_tokens=None, finish_reason=None):
+    """Resposta falsa com o mesmo formato de usage_metadata e candidates do Gemini"""
+    usage = None
+    if prompt_tokens is not None:
+        usage = SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=output_tokens,
+            total_token_count=prompt_tokens + output_tokens,
+        )
+    candidates = [SimpleNamespace(finish_reason=SimpleNamespace(name=finish_reason))] if finish_reason else []
+    return SimpleNamespace(text=text, usage_metadata=usage, candidates=candidates)
+
+class _FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(0.01)
+            yield chunk
+
+class MeteredModel:
+    """Modelo falso que devolve contagem de tokens e motivo de término"""
+    def __init__(self, finish_reason="STOP"):
+        self.finish_reason = finish_reason
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        if stream:
+            return _FakeStream([
+                _response("**Devocional:**\nNós não estamos sozinhos.\n"),
+                _response("**Oração final:**\nSenhor, obrigado.", 120, 40, self.finish_reason),
+            ])
+        await asyncio.sleep(0.01)
+        return _response(DEVOTIONAL_JSON, 100, 300, self.finish_reason)
+
+@pytest.fixture
+def metered_chain():
+    llm_usage.reset()
+    metrics.reset()
+    chain = DevotionalChain()
+    chain.model = MeteredModel()
+    chain.admission = AdmissionController(max_in_flight=4, max_per_user=4)
+    return chain
+
+def test_tracker_aggregates_by_requested_fields():
+    tracker = LLMUsageTracker()
+    for latency in (0.1, 0.2, 0.3, 0.4):
+        tracker.record("gemini", "feelings", "free", latency, ttft=latency / 2, prompt_tokens=10, output_tokens=20, total_tokens=30)
+    tracker.record("gemini", "jobs", "subscriber", 1.0, retries=2, error=True)
+
+    by_tier = {group["tier"]: group for group in tracker.summary(["tier"])}
+    assert set(by_tier) == {"free", "subscriber"}
+    assert "endpoint" not in by_tier["free"]
+    assert by_tier["free"]["calls"] == 4
+    assert by_tier["free"]["tokens"] == {"prompt_tokens": 40, "output_tokens": 80, "total_tokens": 120}
+    assert by_tier["free"]["percentiles"]["latency_seconds"]["p99"] == pytest.approx(0.4)
+    assert by_tier["subscriber"]["errors"] == 1
+    assert by_tier["subscriber"]["percentiles"]["retries"]["p99"] == 2
+
+    assert [group["endpoint"] for group in tracker.summary(endpoint="jobs")] == ["jobs"]
+
+def test_chain_records_usage_per_endpoint_and_tier(metered_chain):
+    metered_chain.model = MeteredModel(finish_reason="MAX_TOKENS")
+
+    async def run():
+        await metered_chain.generate_devotional_async("ansioso", subscriber=True, endpoint="feelings")
+        return [event async for event in metered_chain.stream_devotional_async("com medo", endpoint="feelings_stream")]
+
+    events = asyncio.run(run())
+    assert events[-1]["event"] == "done"
+
+    groups = {group["endpoint"]: group for group in llm_usage.summary()}
+    assert groups["feelings"]["tier"] == "subscriber"
+    assert groups["feelings"]["model"] == metered_chain.model_name
+    assert groups["feelings"]["tokens"]["output_tokens"] == 300
+    assert groups["feelings"]["finish_reasons"] == {"MAX_TOKENS": 1}
+    assert groups["feelings_stream"]["tier"] == "free"
+    assert groups["feelings_stream"]["tokens"]["total_tokens"] == 160
+    # No streaming o primeiro token chega antes do fim da resposta
+    stream = groups["feelings_stream"]["percentiles"]
+    assert stream["ttft_seconds"]["p50"] < stream["latency_seconds"]["p50"]
+    assert metrics.counter(
+        "llm_finish_reasons", reason="MAX_TOKENS", model=metered_chain.model_name, endpoint="feelings", tier="subscriber"
+    ) == 1
+
+def test_llm_metrics_endpoint_groups_and_validates(supabase_stub, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'test-user-id'})}"}
+    llm_usage.reset()
+    llm_usage.record("gemini", "feelings", "free", 0.5, prompt_tokens=10, output_tokens=5, total_tokens=15)
+    llm_usage.record("gemini", "jobs", "free", 0.7, prompt_tokens=10, output_tokens=5, total_tokens=15)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            anonymous = await client.get("/api/metrics/llm")
+            forbidden = await client.get("/api/metrics/llm", headers=headers)
+            monkeypatch.setenv("METRICS_ADMIN_USER_IDS", "test-user-id")
+            grouped = await client.get("/api/metrics/llm", headers=headers, params={"group_by": "tier"})
+            invalid = await client.get("/api/metrics/llm", headers=headers, params={"group_by": "user"})
+            return grouped, invalid, anonymous, forbidden
+
+    grouped, invalid, anonymous, forbidden = asyncio.run(run())
+
+    assert anonymous.status_code == 401
+    assert forbidden.status_code == 403
+
+    assert grouped.status_code == 200
+    assert grouped.json()["groups"] == [{
+        "tier": "free",
+        "calls": 2,
+        "errors": 0,
+        "tokens": {"prompt_tokens": 20, "output_tokens": 10, "total_tokens": 30},
+        "finish_reasons": {},
+        "percentiles": grouped.json()["groups"][0]["percentiles"],
+    }]
+    assert invalid.status_code == 400
+    llm_usage.reset()
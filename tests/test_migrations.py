@@ -0,0 +1,44 @@
+import pytest
+
+from migrations.runner import Migration, MigrationError, bundle, discover, pending
+
+class FakeConnection:
+    """Conexão falsa: só responde à leitura de schema_migrations"""
+    def __init__(self, applied):
+        self.applied = applied
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+        return self
+
+    def fetchall(self):
+        return list(self.applied.items())
+
+def test_migrations_are_numbered_in_order_and_bundled():
+    migrations = discover()
+
+    assert [migration.version for migration in migrations] == list(range(1, len(migrations) + 1))
+    script = bundle(migrations)
+    for migration in migrations:
+        assert f"-- ======== {migration.version:04d}_{migration.name} ========" in script
+    # As tabelas consultadas pela API fazem parte do esquema
+    for table in ("profiles", "devotionals", "saved_devotionals", "user_settings"):
+        assert f"CREATE TABLE IF NOT EXISTS public.{table} (" in script
+
+def test_pending_skips_applied_and_rejects_edited_migrations(tmp_path):
+    for name in ("0001_a.sql", "0002_b.sql"):
+        (tmp_path / name).write_text(f"SELECT '{name}';", encoding="utf-8")
+    first, second = discover(tmp_path)
+
+    assert pending(FakeConnection({1: first.checksum}), [first, second]) == [second]
+    with pytest.raises(MigrationError):
+        pending(FakeConnection({1: "outro"}), [first, second])
+
+def test_invalid_or_duplicated_names_are_rejected(tmp_path):
+    with pytest.raises(MigrationError):
+        Migration(tmp_path / "1_sem_zeros.sql")
+    (tmp_path / "0001_a.sql").write_text("", encoding="utf-8")
+    (tmp_path / "0001_b.sql").write_text("", encoding="utf-8")
+    with pytest.raises(MigrationError):
+        discover(tmp_path)
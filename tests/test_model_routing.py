@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+import pytest
+
+from chains.devotional_chain import DevotionalChain
+from chains.llm_providers import FakeProvider, ModelRouter, ModelTier
+from services.call_policy import CallPolicy
+from services.circuit_breaker import CircuitBreaker
+from services.metrics import metrics
+
+class BrokenProvider:
+    """Provedor falso que simula um nível de modelo fora do ar"""
+    def __init__(self):
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        self.calls += 1
+        raise RuntimeError("503 Service Unavailable")
+
+def _router(**kwargs):
+    return ModelRouter(
+        [
+            ModelTier("standard", "fake-standard", FakeProvider("fake-standard", latency=0.05)),
+            ModelTier("lite", "fake-lite", FakeProvider("fake-lite", latency=0.01)),
+        ],
+        **kwargs,
+    )
+
+@pytest.fixture
+def routed_chain():
+    chain = DevotionalChain()
+    chain.router = _router(user_tiers={"subscriber": "standard"}, short_input_tier="lite", short_input_chars=12)
+    chain.breaker = CircuitBreaker("teste", min_calls=100)
+    chain.call_policy = CallPolicy(retry_delay=0, hedge_percentile=0, breaker=chain.breaker)
+    return chain
+
+def test_router_rules_and_latency_switch():
+    router = _router(
+        user_tiers={"subscriber": "standard"}, short_input_tier="lite", short_input_chars=12,
+        latency_threshold=0.1, min_samples=3,
+    )
+
+    assert router.route("ansioso", "subscriber").reason == "user_tier"
+    assert router.route("ansioso", "subscriber").primary.name == "standard"
+    assert router.route("ansioso", "free").primary.name == "lite"
+    long_feeling = router.route("estou preocupado com o trabalho", "free")
+    assert (long_feeling.primary.name, long_feeling.reason) == ("standard", "default")
+    assert [tier.name for tier in long_feeling.tiers] == ["standard", "lite"]
+
+    # Com o nível padrão lento, as requisições vão para o mais rápido
+    for _ in range(3):
+        router.tiers["standard"].observe(0.5)
+        router.tiers["lite"].observe(0.05)
+    slow = router.route("estou preocupado com o trabalho", "free")
+    assert (slow.primary.name, slow.reason) == ("lite", "latency")
+
+    with pytest.raises(ValueError):
+        _router(short_input_tier="premium")
+
+def test_router_recovers_tiers_excluded_by_latency():
+    router = _router(latency_threshold=0.1, min_samples=3)
+    for tier in router.tiers.values():
+        tier.max_age = 0.05
+    for _ in range(3):
+        router.tiers["standard"].observe(0.5)
+        router.tiers["lite"].observe(0.05)
+    assert router.route("estou preocupado com o trabalho").primary.name == "lite"
+
+    # Sem tráfego, as amostras lentas expiram e o nível volta a ser escolhido pelas regras
+    time.sleep(0.06)
+    recovered = router.route("estou preocupado com o trabalho")
+    assert (recovered.primary.name, recovered.reason) == ("standard", "default")
+
+    # Uma fração das requisições mede o nível que não se sabe se é rápido
+    probing = _router(latency_threshold=0.1, min_samples=3, probe_ratio=1.0)
+    for _ in range(3):
+        probing.tiers["standard"].observe(0.05)
+    probe = probing.route("estou preocupado com o trabalho")
+    assert (probe.primary.name, probe.reason) == ("lite", "probe")
+
+def test_devotional_records_routing_choice(routed_chain):
+    async def run():
+        short = await routed_chain.generate_devotional_uncached("ansioso", tier="free")
+        events = [event async for event in routed_chain.stream_devotional_async("estou preocupado com o trabalho")]
+        return short, events[-1]["data"]
+
+    short, streamed = asyncio.run(run())
+
+    assert (short["modelo"], short["nivel_modelo"], short["motivo_roteamento"]) == ("fake-lite", "lite", "short_input")
+    assert short["reflexao"] and short["versiculos"]
+    assert (streamed["nivel_modelo"], streamed["motivo_roteamento"]) == ("standard", "default")
+    assert streamed["oracao"].startswith("Senhor")
+
+def test_failover_to_next_tier(routed_chain):
+    metrics.reset()
+    broken = BrokenProvider()
+    routed_chain.router.tiers["standard"].provider = broken
+
+    async def run():
+        devotional = await routed_chain.generate_devotional_uncached("estou preocupado com o trabalho", tier="free")
+        events = [event async for event in routed_chain.stream_devotional_async("estou muito preocupado com a família")]
+        return devotional, events[-1]["data"]
+
+    devotional, streamed = asyncio.run(run())
+
+    assert broken.calls == 2
+    assert devotional["nivel_modelo"] == "lite"
+    assert streamed["nivel_modelo"] == "lite"
+    assert metrics.counter("llm_failovers", source="standard", target="lite") == 2
+
+def test_fake_provider_is_deterministic_and_simulates_latency():
+    provider = FakeProvider(latency=0.05, jitter=0.01, seed=3)
+
+    async def run():
+        start = time.perf_counter()
+        first = await provider.generate_content_async('Sentimento: "triste"')
+        elapsed = time.perf_counter() - start
+        second = await provider.generate_content_async('Sentimento: "triste"')
+        return first, second, elapsed
+
+    first, second, elapsed = asyncio.run(run())
+
+    assert first.text == second.text
+    assert 0.04 <= elapsed < 0.2
+    assert first.usage_metadata.total_token_count > 0
+    assert first.candidates[0].finish_reason.name == "STOP"
@@ -0,0 +1,85 @@
+import asyncio
+from unittest.mock import MagicMock
+from urllib.parse import parse_qs
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from supabase import AsyncClientOptions, acreate_client
+
+from main import app
+from api.auth import create_access_token
+from services.pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_filter, paginate
+from services.repository import SupabaseRepository
+
+def _rows(count, start=0):
+    return [
+        {"id": f"id-{index:04}", "created_at": f"2024-01-01T00:00:{59 - index % 60:02}+00:00", "sentimento": "grato"}
+        for index in range(start, start + count)
+    ]
+
+def _headers():
+    return {"Authorization": f"Bearer {create_access_token({'sub': 'test-user-id'})}"}
+
+def test_cursor_round_trip_and_keyset_filter():
+    cursor = encode_cursor({"id": "abc", "created_at": "2024-01-01T10:00:00+00:00", "texto": "ignorado"})
+
+    assert decode_cursor(cursor) == ("2024-01-01T10:00:00+00:00", "abc")
+    assert keyset_filter(cursor) == (
+        'created_at.lt."2024-01-01T10:00:00+00:00",'
+        'and(created_at.eq."2024-01-01T10:00:00+00:00",id.lt."abc")'
+    )
+    for invalid in ("nao-e-cursor", encode_cursor({"id": 1, "created_at": "2024-01-01"})):
+        with pytest.raises(InvalidCursor):
+            decode_cursor(invalid)
+
+def test_paginate_uses_extra_row_only_as_next_page_marker():
+    last_page = paginate(_rows(3), 5)
+    assert len(last_page["devotionals"]) == 3 and last_page["next_cursor"] is None
+
+    page = paginate(_rows(6), 5)
+    assert [row["id"] for row in page["devotionals"]] == [f"id-{index:04}" for index in range(5)]
+    assert decode_cursor(page["next_cursor"])[1] == "id-0004"
+
+def test_list_query_projects_summary_columns_after_cursor():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json=_rows(3))
+
+    async def run():
+        client = await acreate_client(
+            "http://supabase.test", "anon-key",
+            AsyncClientOptions(httpx_client=httpx.AsyncClient(transport=httpx.MockTransport(handler))),
+        )
+        cursor = encode_cursor({"id": "id-9", "created_at": "2024-01-02T00:00:00+00:00"})
+        return await SupabaseRepository(lambda: client).list_devotionals("user-1", 2, cursor)
+
+    assert len(asyncio.run(run())) == 3
+    assert requests[0].url.path == "/rest/v1/devotional_summaries"
+    params = parse_qs(requests[0].url.query.decode())
+    assert params["select"] == ["id,created_at,sentimento,versiculo,resumo"]
+    assert params["order"] == ["created_at.desc,id.desc"]
+    assert params["limit"] == ["3"]
+    assert params["or"][0].startswith('(created_at.lt."2024-01-02T00:00:00+00:00"')
+
+def test_history_endpoints_page_and_fetch_detail(supabase_stub, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    client = TestClient(app)
+    listing = supabase_stub.table.return_value.select.return_value.eq.return_value
+    listing.order.return_value.order.return_value.limit.return_value.execute.return_value = MagicMock(data=_rows(3))
+
+    page = client.get("/api/devotionals?limit=2", headers=_headers()).json()
+    assert [row["id"] for row in page["devotionals"]] == ["id-0000", "id-0001"]
+    assert page["next_cursor"]
+
+    assert client.get("/api/devotionals?limit=500", headers=_headers()).status_code == 422
+    assert client.get("/api/devotional/saved?cursor=%%%", headers=_headers()).status_code == 400
+
+    # Detalhe: o devocional completo, só do próprio usuário
+    detail = listing.eq.return_value.execute
+    detail.return_value = MagicMock(data=[{"id": "id-0000", "texto": "Texto completo"}])
+    assert client.get("/api/devotionals/id-0000", headers=_headers()).json()["texto"] == "Texto completo"
+    detail.return_value = MagicMock(data=[])
+    assert client.get("/api/devotional/saved/id-0000", headers=_headers()).status_code == 404
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from api.auth import create_access_token
+from services.metrics import metrics
+from services.profile_cache import ProfileCache, InMemoryProfileBackend, SQLiteProfileBackend
+
+class FakeProfiles:
+    """Tabela de perfis falsa que conta as consultas e simula latência"""
+    def __init__(self, profiles, latency=0.0):
+        self.profiles = profiles
+        self.latency = latency
+        self.calls = 0
+
+    async def __call__(self, user_id):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self.profiles.get(user_id)
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(request, tmp_path):
+    if request.param == "sqlite":
+        backend = SQLiteProfileBackend(str(tmp_path / "profiles.db"), max_entries=2)
+    else:
+        backend = InMemoryProfileBackend(max_entries=2)
+    yield ProfileCache(backend, ttl_seconds=30, negative_ttl_seconds=30)
+    if request.param == "sqlite":
+        backend.close()
+
+def test_hits_negative_entries_and_lru(cache):
+    loader = FakeProfiles({"user-1": {"id": "user-1"}, "user-2": {"id": "user-2"}})
+
+    async def run():
+        first = await cache.get("user-1", loader)
+        first["nome"] = "alterado"
+        again = await cache.get("user-1", loader)
+        unknown = [await cache.get("fantasma", loader) for _ in range(3)]
+        # Limite de 2 entradas: user-1 é o menos usado e sai
+        await cache.get("user-2", loader)
+        await cache.get("user-1", loader)
+        return again, unknown
+
+    again, unknown = asyncio.run(run())
+
+    assert again == {"id": "user-1"}
+    assert unknown == [None, None, None]
+    assert loader.calls == 4
+
+def test_stats_are_counted_per_instance():
+    loader = FakeProfiles({"user-1": {"id": "user-1"}})
+    profiles, entitlements = ProfileCache(name="profile"), ProfileCache(name="profile")
+
+    async def run():
+        for _ in range(3):
+            await profiles.get("user-1", loader)
+        await entitlements.get("user-1", loader)
+        return await profiles.stats(), await entitlements.stats()
+
+    profile_stats, entitlement_stats = asyncio.run(run())
+
+    assert (profile_stats["hits"], profile_stats["misses"]) == (2, 1)
+    assert (entitlement_stats["hits"], entitlement_stats["misses"]) == (0, 1)
+
+def test_invalidation_and_expiry(cache):
+    loader = FakeProfiles({"user-1": {"id": "user-1", "nome": ""}})
+    cache.ttl_seconds = 0.05
+
+    async def run():
+        await cache.get("user-1", loader)
+        loader.profiles["user-1"] = {"id": "user-1", "nome": "Maria"}
+        stale = await cache.get("user-1", loader)
+        await cache.invalidate("user-1")
+        fresh = await cache.get("user-1", loader)
+        await asyncio.sleep(0.06)
+        await cache.get("user-1", loader)
+        return stale, fresh
+
+    stale, fresh = asyncio.run(run())
+
+    assert stale["nome"] == "" and fresh["nome"] == "Maria"
+    assert loader.calls == 3
+
+def test_concurrent_misses_share_one_query():
+    cache = ProfileCache(ttl_seconds=30)
+    loader = FakeProfiles({"user-1": {"id": "user-1"}}, latency=0.05)
+
+    async def run():
+        return await asyncio.gather(*(cache.get("user-1", loader) for _ in range(20)))
+
+    profiles = asyncio.run(run())
+
+    assert all(profile == {"id": "user-1"} for profile in profiles)
+    assert loader.calls == 1
+
+def test_authenticated_requests_reuse_cached_profile(supabase_stub, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    metrics.reset()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'test-user-id'})}"}
+    client = TestClient(app)
+
+    for _ in range(4):
+        assert client.get("/api/devotionals", headers=headers).status_code == 200
+
+    profile_reads = [call for call in supabase_stub.table.call_args_list if call.args[0] == "profiles"]
+    assert len(profile_reads) == 1
+    # Métricas só para administradores; a própria requisição também usa o perfil em cache
+    assert client.get("/api/metrics").status_code == 401
+    assert client.get("/api/metrics", headers=headers).status_code == 403
+    monkeypatch.setenv("METRICS_ADMIN_USER_IDS", "test-user-id")
+    stats = client.get("/api/metrics", headers=headers).json()["profile_cache"]
+    assert stats["hits"] == 5 and stats["hit_ratio"] == 5 / 6
@@ -0,0 +1,106 @@
+import pytest
+
+# Volume suficiente para o planejador preferir índices a varreduras sequenciais
+SEED_USERS = 5000
+ROWS_PER_USER = 20
+
+# Equivalentes em SQL das consultas que a API faz pelo PostgREST e pelas funções do banco
+HOT_QUERIES = {
+    "perfil (get_current_user)": "SELECT * FROM public.profiles WHERE id = %(user)s",
+    "assinatura (webhook)": "SELECT * FROM public.subscriptions WHERE user_id = %(user)s",
+    "uso": "SELECT * FROM public.usages WHERE user_id = %(user)s",
+    "direitos de uso (get_entitlements, reserve_usage)": "SELECT * FROM public.user_entitlements WHERE user_id = %(user)s",
+    "histórico, primeira página": """
+        SELECT id, created_at, sentimento, versiculo, resumo FROM public.devotional_summaries
+         WHERE user_id = %(user)s ORDER BY created_at DESC, id DESC LIMIT 21
+    """,
+    "histórico, página seguinte": """
+        SELECT id, created_at, sentimento, versiculo, resumo FROM public.devotional_summaries
+         WHERE user_id = %(user)s AND (created_at < %(at)s OR (created_at = %(at)s AND id < %(id)s))
+         ORDER BY created_at DESC, id DESC LIMIT 21
+    """,
+    "devocional (detalhe)": "SELECT * FROM public.devotional_details WHERE id = %(id)s AND user_id = %(user)s",
+    "salvos, primeira página": """
+        SELECT id, created_at, sentimento, versiculo, resumo FROM public.saved_devotional_summaries
+         WHERE user_id = %(user)s ORDER BY created_at DESC, id DESC LIMIT 21
+    """,
+    "salvos, página seguinte": """
+        SELECT id, created_at, sentimento, versiculo, resumo FROM public.saved_devotional_summaries
+         WHERE user_id = %(user)s AND (created_at < %(at)s OR (created_at = %(at)s AND id < %(id)s))
+         ORDER BY created_at DESC, id DESC LIMIT 21
+    """,
+    "salvo (detalhe)": "SELECT * FROM public.saved_devotional_details WHERE id = %(id)s AND user_id = %(user)s",
+    "salvar de novo (upsert por user_id, body_hash)": """
+        SELECT id FROM public.saved_devotionals WHERE user_id = %(user)s AND body_hash = %(body)s
+    """,
+    "contagem de salvos": "SELECT count(*) FROM public.saved_devotionals WHERE user_id = %(user)s",
+    "sentimentos recentes (pool)": "SELECT sentimento FROM public.devotionals ORDER BY created_at DESC LIMIT 50",
+    "corpos referenciados (política de leitura e verificação ao salvar)": """
+        SELECT 1 FROM public.devotionals WHERE body_hash = %(body)s AND user_id = %(user)s
+    """,
+    "configurações": "SELECT * FROM public.user_settings WHERE user_id = %(user)s",
+    "totais (get_user_stats)": "SELECT * FROM public.user_stats WHERE user_id = %(user)s",
+    "sequência (get_user_stats)": """
+        SELECT day FROM public.user_activity_days
+         WHERE user_id = %(user)s AND day >= current_date - 1 ORDER BY day DESC LIMIT 1
+    """,
+}
+
+@pytest.fixture(scope="module")
+def seeded_db(migrated_db):
+    import psycopg
+
+    with psycopg.connect(migrated_db, autocommit=True) as conn:
+        _delete_seed(conn)
+        conn.execute(
+            "INSERT INTO auth.users (email) SELECT 'user' || n || '@seed.test' FROM generate_series(1, %s) n",
+            (SEED_USERS,),
+        )
+        conn.execute(f"""
+            -- Um corpo por devocional gerado; o salvo referencia o mesmo corpo
+            CREATE TEMP TABLE seed_bodies AS
+            SELECT user_id, n, texto,
+                   public.devotional_body_hash(texto, ARRAY['Salmos 23:1'], NULL, NULL) AS hash
+              FROM (SELECT p.id AS user_id, n, 'seed:' || p.id || ':' || n || repeat(' texto', 200) AS texto
+                      FROM public.profiles p, generate_series(1, {ROWS_PER_USER}) n
+                     WHERE p.email LIKE '%@seed.test') s;
+            INSERT INTO public.devotional_bodies (hash, texto, versiculos)
+            SELECT hash, texto, ARRAY['Salmos 23:1'] FROM seed_bodies;
+            INSERT INTO public.devotionals (user_id, sentimento, body_hash, created_at)
+            SELECT user_id, 'grato', hash, now() - n * interval '1 day' FROM seed_bodies;
+            INSERT INTO public.saved_devotionals (user_id, sentimento, body_hash, created_at)
+            SELECT user_id, 'grato', hash, now() - n * interval '1 day' FROM seed_bodies;
+            DROP TABLE seed_bodies;
+            INSERT INTO public.subscriptions (user_id, is_active, valid_until)
+            SELECT id, random() < 0.3, now() + interval '30 days' FROM public.profiles WHERE email LIKE '%@seed.test';
+            INSERT INTO public.user_settings (user_id) SELECT id FROM public.profiles WHERE email LIKE '%@seed.test'
+            ON CONFLICT DO NOTHING;
+        """)
+        conn.execute("ANALYZE")
+        user = conn.execute(
+            "SELECT id FROM public.profiles WHERE email LIKE '%@seed.test' ORDER BY email LIMIT 1"
+        ).fetchone()[0]
+        devotional = conn.execute(
+            "SELECT id, created_at, body_hash FROM public.devotionals WHERE user_id = %s ORDER BY created_at DESC LIMIT 1 OFFSET 5",
+            (user,),
+        ).fetchone()
+        yield conn, {"user": user, "id": devotional[0], "at": devotional[1], "body": devotional[2]}
+        _delete_seed(conn)
+
+def _delete_seed(conn):
+    conn.execute("DELETE FROM auth.users WHERE email LIKE '%@seed.test'")
+    # Corpos não são removidos com os usuários (podem ser compartilhados)
+    conn.execute("DELETE FROM public.devotional_bodies WHERE texto LIKE 'seed:%'")
+
+def _seq_scans(plan):
+    found = [plan["Relation Name"]] if plan.get("Node Type") == "Seq Scan" else []
+    for child in plan.get("Plans", []):
+        found.extend(_seq_scans(child))
+    return found
+
+@pytest.mark.parametrize("name", list(HOT_QUERIES))
+def test_hot_queries_use_indexes(seeded_db, name):
+    conn, params = seeded_db
+    plan = conn.execute("EXPLAIN (FORMAT JSON) " + HOT_QUERIES[name], params).fetchone()[0][0]["Plan"]
+
+    assert _seq_scans(plan) == [], f"{name}: varredura sequencial no plano {plan}"
@@ -0,0 +1,77 @@
+import asyncio
+import time
+from unittest.mock import MagicMock
+
+import httpx
+
+from services.repository import SupabaseRepository
+from services.supabase_client import SupabaseClients
+
+POSTGREST_LATENCY = 0.1
+
+def _clients(monkeypatch, requests):
+    monkeypatch.setenv("SUPABASE_URL", "http://supabase.test")
+    monkeypatch.setenv("SUPABASE_KEY", "anon-key")
+
+    # PostgREST falso e lento, servido pelo cliente assíncrono real do Supabase
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        await asyncio.sleep(POSTGREST_LATENCY)
+        return httpx.Response(200, json=[{"user_id": "user-1", "is_active": True, "devotional_count": 3}])
+
+    clients = SupabaseClients()
+    clients._async_http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return clients
+
+def test_independent_reads_run_concurrently(monkeypatch):
+    requests = []
+    clients = _clients(monkeypatch, requests)
+    repository = SupabaseRepository(clients.async_anon)
+
+    async def run():
+        start = time.perf_counter()
+        result = await repository.get_subscription_and_usage("user-1")
+        elapsed = time.perf_counter() - start
+        await clients.aclose()
+        return result, elapsed
+
+    (subscription, usage), elapsed = asyncio.run(run())
+
+    assert subscription["is_active"] is True
+    assert usage["devotional_count"] == 3
+    assert sorted(requests) == ["/rest/v1/subscriptions", "/rest/v1/usages"]
+    assert elapsed < POSTGREST_LATENCY * 1.8
+
+def test_slow_query_does_not_block_event_loop(monkeypatch):
+    clients = _clients(monkeypatch, [])
+    repository = SupabaseRepository(clients.async_anon)
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        profile = await repository.get_profile("user-1")
+        task.cancel()
+        await clients.aclose()
+        return profile, ticks
+
+    profile, ticks = asyncio.run(run())
+
+    assert profile["user_id"] == "user-1"
+    # O loop seguiu atendendo outras tarefas enquanto a consulta aguardava
+    assert ticks >= 5
+
+def test_sync_clients_are_accepted():
+    # Fakes síncronos (como os dos testes de endpoints) também funcionam
+    client = MagicMock()
+    client.table.return_value.select.return_value.eq.return_value.execute.return_value = MagicMock(data=[])
+    repository = SupabaseRepository(lambda: client)
+
+    assert asyncio.run(repository.get_profile("user-1")) is None
+    client.table.assert_called_once_with("profiles")
@@ -0,0 +1,92 @@
+import time
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from chains.devotional_chain import DevotionalChain
+from chains.structured_output import parse_structured_output, repair_json, DevotionalOutput
+
+FIXTURES = sorted((Path(__file__).parent / "fixtures" / "gemini_outputs").iterdir())
+
+@pytest.fixture(scope="module")
+def chain():
+    return DevotionalChain()
+
+def _is_complete(devotional):
+    return (
+        devotional["texto"].strip()
+        and devotional["reflexao"].strip()
+        and devotional["oracao"].strip()
+        and isinstance(devotional["versiculos"], list)
+        and devotional["versiculos"]
+    )
+
+def test_parse_success_rate_and_time_on_fixture_corpus(chain):
+    results = {}
+    timings = []
+    for path in FIXTURES:
+        text = path.read_text(encoding="utf-8")
+        start = time.perf_counter()
+        devotional = chain.extract_structured_data(text, "sentimento")
+        timings.append(time.perf_counter() - start)
+        results[path.name] = bool(_is_complete(devotional))
+
+    success_rate = sum(results.values()) / len(results)
+    mean_ms = 1000 * sum(timings) / len(timings)
+    print(f"\nTaxa de sucesso do parser: {success_rate:.0%} em {len(results)} respostas; tempo médio {mean_ms:.3f} ms")
+
+    assert success_rate == 1.0, [name for name, ok in results.items() if not ok]
+    assert mean_ms < 5
+
+def test_parse_modes_per_fixture():
+    modes = {
+        path.name: parse_structured_output(path.read_text(encoding="utf-8"))[1]
+        for path in FIXTURES
+    }
+
+    assert modes["structured_valid.json"] == "json"
+    assert modes["structured_fenced.txt"] == "json"
+    assert modes["legacy_json.txt"] == "json"
+    assert modes["structured_trailing_comma.txt"] == "repaired"
+    assert modes["structured_raw_newlines.txt"] == "repaired"
+    assert modes["structured_truncated.txt"] == "repaired"
+    assert modes["markdown_sections.txt"] == "failed"
+
+def test_repair_json_closes_truncated_output():
+    output, mode = parse_structured_output('{"devocional": "Deus cuida de nós.", "oracao": "Senhor, obrigado", "aprofundamento": ["Salmos 23:1", "Jo')
+
+    assert mode == "repaired"
+    assert isinstance(output, DevotionalOutput)
+    assert output.oracao == "Senhor, obrigado"
+    assert output.aprofundamento == ["Salmos 23:1"]
+    assert repair_json('{"a": [1, 2,], "b": "x\ny",}') == '{"a": [1, 2], "b": "x\\ny"}'
+
+def test_section_parser_replaces_heuristics(chain):
+    text = (FIXTURES[0].parent / "markdown_sections.txt").read_text(encoding="utf-8")
+    devotional = chain.extract_structured_data(text, "medo")
+
+    assert devotional["reflexao"].startswith("O medo é uma emoção real")
+    assert devotional["reflexao"].endswith("Ele já está lá.")
+    assert devotional["oracao"].startswith("Senhor, nós entregamos a ti os nossos medos.")
+
+def test_structured_mode_requests_json_schema():
+    captured = {}
+
+    class CapturingModel:
+        async def generate_content_async(self, prompt, **kwargs):
+            captured.update(kwargs, prompt=prompt)
+            return type("Response", (), {"text": (FIXTURES[0].parent / "structured_valid.json").read_text(encoding="utf-8")})()
+
+    import asyncio
+    structured = DevotionalChain()
+    structured.model = CapturingModel()
+    structured.structured_output = True
+    devotional = asyncio.run(structured.generate_devotional_uncached("ansioso"))
+
+    config = captured["generation_config"]
+    assert config["response_mime_type"] == "application/json"
+    assert config["response_schema"]["required"]
+    assert "versiculos_chave" in captured["prompt"]
+    assert devotional["reflexao"].startswith("A ansiedade bate à porta")
+    assert "Filipenses 4:6-7" in devotional["versiculos"]
@@ -0,0 +1,40 @@
+from unittest.mock import MagicMock
+
+from services.supabase_client import SupabaseClients
+
+def test_clients_are_created_once_and_share_the_pool(monkeypatch):
+    monkeypatch.setenv("SUPABASE_URL", "http://127.0.0.1:54321")
+    monkeypatch.setenv("SUPABASE_KEY", "anon-key")
+    monkeypatch.setenv("SUPABASE_SERVICE_KEY", "service-key")
+    clients = SupabaseClients(max_connections=5, max_keepalive=2)
+
+    anon, service = clients.anon(), clients.service()
+
+    assert clients.anon() is anon
+    assert clients.service() is service
+    assert anon is not service
+    assert anon.postgrest.session is clients.http is service.postgrest.session
+    assert service.options.headers["apiKey"] == "service-key"
+    # Login e cadastro usam um cliente próprio, sobre o mesmo pool
+    auth_client = clients.auth_client()
+    assert auth_client is not anon
+    assert auth_client.postgrest.session is clients.http
+    # Os clientes assíncronos usam o pool assíncrono
+    async_anon = clients.async_anon()
+    assert clients.async_anon() is async_anon
+    assert async_anon.postgrest.session is clients.async_http is clients.async_service().postgrest.session
+
+    http = clients.http
+    clients.close()
+    assert http.is_closed
+    assert clients.anon() is not anon
+
+def test_override_injects_fake_clients():
+    clients = SupabaseClients()
+    fake = MagicMock()
+
+    with clients.override(anon=fake):
+        assert clients.anon() is fake
+        assert clients.auth_client() is fake
+
+    assert fake not in clients._overrides.values()
@@ -0,0 +1,64 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from services.metrics import metrics
+from services.tokens import create_user_token, decode_access_token, token_revocations
+
+PROFILE = {"id": "test-user-id", "email": "test@example.com", "nome": "Maria", "created_at": "2024-01-01T00:00:00"}
+
+@pytest.fixture
+def claims_mode(supabase_stub, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    monkeypatch.setenv("JWT_EMBED_CLAIMS", "true")
+    metrics.reset()
+    token_revocations.clear()
+    yield supabase_stub
+    token_revocations.clear()
+
+def _profile_reads(supabase_stub):
+    return [call for call in supabase_stub.table.call_args_list if call.args[0] == "profiles"]
+
+def test_claims_token_authorizes_without_database(claims_mode):
+    token = create_user_token(PROFILE, {"is_active": True, "valid_until": "2030-01-01"})
+    payload = decode_access_token(token)
+    assert payload["tier"] == "subscriber" and payload["profile"]["nome"] == "Maria"
+
+    response = TestClient(app).get("/api/user/me", headers={"Authorization": f"Bearer {token}"})
+
+    user = response.json()["user"]
+    assert user["email"] == "test@example.com"
+    assert user["subscription"] == {"is_active": True, "valid_until": "2030-01-01"}
+    assert _profile_reads(claims_mode) == []
+    assert metrics.counter("auth_user_lookups", source="claims") == 1
+
+def test_plan_change_and_old_claims_fall_back_to_database(claims_mode, monkeypatch):
+    token = create_user_token(PROFILE)
+    headers = {"Authorization": f"Bearer {token}"}
+    client = TestClient(app)
+
+    # Depois de uma mudança de plano, as claims antigas são conferidas no banco
+    token_revocations.mark_changed("test-user-id")
+    assert client.get("/api/user/me", headers=headers).json()["authenticated"] is True
+    assert len(_profile_reads(claims_mode)) == 1
+
+    # Claims mais velhas que a idade máxima também
+    fresh = create_user_token(PROFILE)
+    monkeypatch.setenv("JWT_CLAIMS_MAX_AGE_SECONDS", "0")
+    time.sleep(0.01)
+    assert client.get("/api/user/me", headers={"Authorization": f"Bearer {fresh}"}).json()["authenticated"] is True
+    assert metrics.counter("auth_user_lookups", source="database") == 2
+
+def test_logout_revokes_previous_tokens(claims_mode):
+    token = create_user_token(PROFILE)
+    headers = {"Authorization": f"Bearer {token}"}
+    client = TestClient(app)
+
+    assert client.post("/api/auth/logout", headers=headers).json() == {"success": True}
+
+    assert client.get("/api/devotionals", headers=headers).status_code == 401
+    # Um novo login volta a funcionar
+    new_token = create_user_token(PROFILE)
+    assert client.get("/api/devotionals", headers={"Authorization": f"Bearer {new_token}"}).status_code == 200
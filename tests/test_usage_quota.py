@@ -0,0 +1,68 @@
+import threading
+from unittest.mock import patch, AsyncMock
+
+from fastapi.testclient import TestClient
+
+from main import app
+from api.auth import create_access_token
+
+def test_failed_generation_releases_reservation(supabase_stub, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'test-user-id'})}"}
+    failing = AsyncMock(side_effect=RuntimeError("503 Service Unavailable"))
+
+    with patch("api.routes.generate_devotional_async", failing):
+        response = TestClient(app).post("/api/feelings", headers=headers, json={"sentimento": "ansioso"})
+
+    assert response.status_code == 500
+    functions = [call.args[0] for call in supabase_stub.rpc.call_args_list]
+    assert functions == ["reserve_usage", "release_usage"]
+    tables = [call.args[0] for call in supabase_stub.table.call_args_list]
+    assert "devotionals" not in tables
+
+def test_concurrent_reservations_never_exceed_free_quota(db_user, migrated_db):
+    import psycopg
+
+    conn, user_id = db_user
+    free_limit, requests = 5, 20
+    barrier = threading.Barrier(requests)
+    results = []
+
+    def reserve():
+        with psycopg.connect(migrated_db, autocommit=True) as worker:
+            barrier.wait()
+            row = worker.execute(
+                "SELECT allowed, usage_count FROM public.reserve_usage(%s, %s)", (user_id, free_limit)
+            ).fetchone()
+            results.append(row)
+
+    threads = [threading.Thread(target=reserve) for _ in range(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    allowed = sorted(count for ok, count in results if ok)
+    assert allowed == list(range(1, free_limit + 1))
+    assert conn.execute("SELECT public.release_usage(%s)", (user_id,)).fetchone()[0] == free_limit - 1
+
+def test_concurrent_usage_increments_are_not_lost(db_user, migrated_db):
+    import psycopg
+
+    conn, user_id = db_user
+    batches = 10
+    barrier = threading.Barrier(batches)
+
+    def increment():
+        with psycopg.connect(migrated_db, autocommit=True) as worker:
+            barrier.wait()
+            worker.execute("SELECT public.increment_usages(%s::uuid[], %s)", ([user_id, user_id], [2, 1]))
+
+    threads = [threading.Thread(target=increment) for _ in range(batches)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    count = conn.execute("SELECT devotional_count FROM public.usages WHERE user_id = %s", (user_id,)).fetchone()[0]
+    assert count == 3 * batches
@@ -0,0 +1,97 @@
+import asyncio
+from datetime import timedelta
+from unittest.mock import MagicMock
+
+import httpx
+from fastapi.testclient import TestClient
+from supabase import AsyncClientOptions, acreate_client
+
+from main import app
+from api.auth import create_access_token
+from services.devotional_bodies import body_hash
+from services.repository import SupabaseRepository
+
+def _headers():
+    return {"Authorization": f"Bearer {create_access_token({'sub': 'test-user-id'})}"}
+
+def test_stats_come_from_maintained_aggregates(supabase_stub, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    supabase_stub.rpc.return_value.execute.return_value = MagicMock(
+        data=[{"generated_count": 40, "saved_count": 12, "streak": 3}]
+    )
+
+    response = TestClient(app).get("/api/user/stats", headers=_headers())
+
+    assert response.json() == {"devotionalsCount": 12, "streakCount": 3}
+    supabase_stub.rpc.assert_called_with("get_user_stats", {"p_user_id": "test-user-id"})
+    assert "saved_devotionals" not in [call.args[0] for call in supabase_stub.table.call_args_list]
+
+def test_stats_fall_back_to_exact_count(supabase_stub, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    supabase_stub.rpc.side_effect = RuntimeError("function public.get_user_stats does not exist")
+    saved = supabase_stub.table.return_value.select
+    saved.return_value.eq.return_value.execute.return_value = MagicMock(data=[{"id": "test-user-id"}], count=42)
+
+    response = TestClient(app).get("/api/user/stats", headers=_headers())
+
+    assert response.json() == {"devotionalsCount": 42, "streakCount": 0}
+    saved.assert_any_call("id", count="exact", head=True)
+
+def test_exact_count_is_a_head_request():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, headers={"Content-Range": "*/2500"})
+
+    async def run():
+        client = await acreate_client(
+            "http://supabase.test", "anon-key",
+            AsyncClientOptions(httpx_client=httpx.AsyncClient(transport=httpx.MockTransport(handler))),
+        )
+        return await SupabaseRepository(lambda: client).count_saved_devotionals("user-1")
+
+    assert asyncio.run(run()) == 2500
+    assert [request.method for request in requests] == ["HEAD"]
+    assert "count=exact" in requests[0].headers["Prefer"]
+
+def test_triggers_maintain_totals_and_streak(db_user):
+    conn, user_id = db_user
+
+    def stats():
+        return conn.execute(
+            "SELECT generated_count, saved_count, streak FROM public.get_user_stats(%s)", (user_id,)
+        ).fetchone()
+
+    assert stats() == (0, 0, 0)
+
+    body = body_hash({"texto": "..."})
+    conn.execute("INSERT INTO public.devotional_bodies (hash, texto) VALUES (%s, '...') ON CONFLICT DO NOTHING", (body,))
+    for _ in range(3):
+        conn.execute(
+            "INSERT INTO public.devotionals (user_id, sentimento, body_hash) VALUES (%s, 'grato', %s)",
+            (user_id, body),
+        )
+    saved_id = conn.execute(
+        "INSERT INTO public.saved_devotionals (user_id, sentimento, body_hash) VALUES (%s, 'grato', %s) RETURNING id",
+        (user_id, body),
+    ).fetchone()[0]
+    assert stats() == (3, 1, 1)
+
+    # Ontem e anteontem com atividade, um dia de folga e depois um longo histórico antigo
+    today = conn.execute("SELECT public.activity_day(now())").fetchone()[0]
+    old_days = [today - timedelta(days=4 + offset) for offset in range(1000)]
+    for day in [today - timedelta(days=1), today - timedelta(days=2)] + old_days:
+        conn.execute(
+            "INSERT INTO public.user_activity_days (user_id, day, generated_count) VALUES (%s, %s, 1)",
+            (user_id, day),
+        )
+    assert stats()[2] == 3
+
+    # Remover o salvo diminui o total, mas hoje continua contando na sequência
+    conn.execute("DELETE FROM public.saved_devotionals WHERE id = %s", (saved_id,))
+    assert stats() == (3, 0, 3)
+
+    # Sem atividade hoje, a sequência que termina ontem continua valendo
+    conn.execute("DELETE FROM public.user_activity_days WHERE user_id = %s AND day = %s", (user_id, today))
+    assert stats()[2] == 2
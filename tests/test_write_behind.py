@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+from services.write_behind import WriteBehindBuffer
+
+class FakeTable:
+    """Tabela falsa que registra os lotes gravados e simula latência"""
+    def __init__(self, latency=0.0, failures=0):
+        self.latency = latency
+        self.failures = failures
+        self.batches = []
+
+    async def __call__(self, rows):
+        await asyncio.sleep(self.latency)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("PostgREST indisponível")
+        self.batches.append(rows)
+
+def _buffer(usages, devotionals, **kwargs):
+    buffer = WriteBehindBuffer(**kwargs)
+    buffer.register("usages", usages, key="user_id")
+    buffer.register("devotionals", devotionals)
+    return buffer
+
+def test_writes_return_before_the_database_and_are_coalesced():
+    usages, devotionals = FakeTable(latency=0.1), FakeTable(latency=0.1)
+    buffer = _buffer(usages, devotionals, flush_interval=0.05)
+
+    async def run():
+        buffer.start()
+        start = time.perf_counter()
+        for second in range(10):
+            await buffer.add("usages", {"user_id": "user-1", "last_used": f"2024-01-01T00:00:{second:02}"})
+        await buffer.add("usages", {"user_id": "user-2", "last_used": "2024-01-01T00:00:00"})
+        for index in range(3):
+            await buffer.add("devotionals", {"user_id": "user-1", "texto": f"devocional {index}"})
+        elapsed = time.perf_counter() - start
+        await asyncio.sleep(0.3)
+        await buffer.stop()
+        return elapsed
+
+    elapsed = asyncio.run(run())
+
+    assert elapsed < 0.05
+    assert usages.batches == [[
+        {"user_id": "user-1", "last_used": "2024-01-01T00:00:09"},
+        {"user_id": "user-2", "last_used": "2024-01-01T00:00:00"},
+    ]]
+    assert [len(batch) for batch in devotionals.batches] == [3]
+
+def test_size_trigger_flushes_before_the_interval():
+    devotionals = FakeTable()
+    buffer = _buffer(FakeTable(), devotionals, flush_interval=60, max_batch=5)
+
+    async def run():
+        buffer.start()
+        for index in range(12):
+            await buffer.add("devotionals", {"texto": str(index)})
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.05)
+        flushed = [len(batch) for batch in devotionals.batches]
+        await buffer.stop()
+        return flushed
+
+    flushed = asyncio.run(run())
+
+    assert sum(flushed) >= 10 and all(size <= 5 for size in flushed)
+    assert sum(len(batch) for batch in devotionals.batches) == 12
+
+def test_failed_flush_is_retried_without_overwriting_newer_writes():
+    usages = FakeTable(failures=1)
+    buffer = _buffer(usages, FakeTable())
+
+    async def run():
+        buffer.start()
+        await buffer.add("usages", {"user_id": "user-1", "last_used": "antigo"})
+        await buffer.flush()
+        await buffer.add("usages", {"user_id": "user-1", "last_used": "novo"})
+        await buffer.stop()
+
+    asyncio.run(run())
+
+    assert usages.batches == [[{"user_id": "user-1", "last_used": "novo"}]]
+
+def test_without_the_flusher_writes_go_straight_to_the_database():
+    devotionals = FakeTable()
+    buffer = _buffer(FakeTable(), devotionals, enabled=False)
+
+    async def run():
+        buffer.start()
+        await buffer.add("devotionals", {"texto": "a"})
+        return buffer.pending
+
+    assert asyncio.run(run()) == 0
+    assert devotionals.batches == [[{"texto": "a"}]]
+
+def test_flush_waits_for_a_batch_already_being_written():
+    devotionals = FakeTable(latency=0.1)
+    buffer = _buffer(FakeTable(), devotionals, flush_interval=0.01)
+
+    async def run():
+        buffer.start()
+        await buffer.add("devotionals", {"texto": "a"})
+        # O flusher já tirou o lote do buffer, mas ainda não gravou
+        await asyncio.sleep(0.05)
+        state = buffer.pending, buffer.flushing
+        await buffer.flush()
+        written = list(devotionals.batches)
+        await buffer.stop()
+        return state, written
+
+    state, written = asyncio.run(run())
+
+    assert state == (0, True)
+    assert written == [[{"texto": "a"}]]